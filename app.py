@@ -3,6 +3,7 @@ import json
 from graphviz import Digraph
 import pandas as pd
 import warnings
+from lineage_traversal import TraversalStats, traversal_limits, walk
 
 # Ensure page config is the first Streamlit command
 st.set_page_config(layout="wide")
@@ -58,63 +59,67 @@ class Node:
         }
 
 # Function to build the lineage tree from the JSON data
-def build_lineage_tree(field_data):
-    # Top node: The selected field
-    root_node = Node(
-        name=field_data['name'],
-        node_type='Field',
-        formula=field_data.get('formula', ''),
-        lineage_type='Reporting Side Lineage'
-    )
-
-    # Iterate through each upstream column inside upstreamFields
-    for upstream_column in field_data.get('upstreamColumns', []):
-        column_name = upstream_column['name']
-        table_name = ', '.join([table['name'] for table in upstream_column.get('upstreamTables', [])])
-        column_node = Node(
-            name=column_name,
-            node_type='Column',
-            table_name=table_name,
+def build_lineage_tree(field_data, stats=None):
+    nodes = []
+
+    def visit(field_data, parent_node, depth):
+        # Top node: the selected field; nested upstreamFields become its children
+        field_node = Node(
+            name=field_data['name'],
+            node_type='Field',
+            formula=field_data.get('formula', ''),
             lineage_type='Reporting Side Lineage'
         )
-        root_node.add_child(column_node)
-
-        # Process the database lineage for each column
-        db_lineage = upstream_column.get('database_lineage', None)
-        if db_lineage:
-            lineage_node = build_db_lineage(db_lineage, set())
-            if lineage_node:
-                column_node.add_child(lineage_node)
-
-    # Process nested upstreamFields
-    for upstream_field in field_data.get('upstreamFields', []):
-        upstream_field_node = build_lineage_tree(upstream_field)
-        root_node.add_child(upstream_field_node)
-
-    return root_node
-
-# Function to build lineage nodes recursively from dblineage part
-def build_db_lineage(db_lineage, visited):
-    node_id = f"{db_lineage['model']}.{db_lineage['column']}"
-    if node_id in visited:
-        return None
-    visited.add(node_id)
-
-    node = Node(
-        name=db_lineage['column'],
-        node_type='DB Column',
-        table_name=db_lineage.get('model', ''),
-        description=db_lineage.get('column Description', ''),
-        reasoning=db_lineage.get('reasoning', ''),
-        lineage_type='Database Side Lineage'
-    )
-
-    for upstream_model in db_lineage.get('upstream_models', []):
-        upstream_node = build_db_lineage(upstream_model, visited)
-        if upstream_node:
-            node.add_child(upstream_node)
-
-    return node
+        if parent_node is not None:
+            parent_node.add_child(field_node)
+
+        # Iterate through each upstream column inside upstreamFields
+        for upstream_column in field_data.get('upstreamColumns', []):
+            column_name = upstream_column['name']
+            table_name = ', '.join([table['name'] for table in upstream_column.get('upstreamTables', [])])
+            column_node = Node(
+                name=column_name,
+                node_type='Column',
+                table_name=table_name,
+                lineage_type='Reporting Side Lineage'
+            )
+            field_node.add_child(column_node)
+
+            # Process the database lineage for each column
+            db_lineage = upstream_column.get('database_lineage', None)
+            if db_lineage:
+                lineage_node = build_db_lineage(db_lineage, stats)
+                if lineage_node:
+                    column_node.add_child(lineage_node)
+        nodes.append(field_node)
+        return field_node
+
+    walk([field_data], lambda field_data: field_data.get('upstreamFields', []), visit, key=id, stats=stats,
+         **traversal_limits())
+    return nodes[0]
+
+# Function to build lineage nodes from dblineage part; each column appears once
+def build_db_lineage(db_lineage, stats=None):
+    nodes = []
+
+    def visit(db_lineage, parent_node, depth):
+        node = Node(
+            name=db_lineage['column'],
+            node_type='DB Column',
+            table_name=db_lineage.get('model', ''),
+            description=db_lineage.get('column Description', ''),
+            reasoning=db_lineage.get('reasoning', ''),
+            lineage_type='Database Side Lineage'
+        )
+        if parent_node is not None:
+            parent_node.add_child(node)
+        nodes.append(node)
+        return node
+
+    walk([db_lineage], lambda db_lineage: db_lineage.get('upstream_models', []), visit,
+         key=lambda db_lineage: f"{db_lineage['model']}.{db_lineage['column']}", revisit=False, stats=stats,
+         **traversal_limits())
+    return nodes[0]
 
 # Function to create the lineage graph using Graphviz
 def create_graph(node, theme):
@@ -223,7 +228,11 @@ selected_fields = st.sidebar.multiselect('Select Fields', field_names, default=f
 for field in fields:
     if field['name'] in selected_fields:
         with st.expander(f"{field['name']}", expanded=True):
-            selected_node = build_lineage_tree(field)
+            stats = TraversalStats()
+            selected_node = build_lineage_tree(field, stats)
+            if stats.truncated():
+                st.warning(f"Lineage truncated: {stats.cycles_cut} cycles cut, {stats.depth_capped} nodes at the depth "
+                           f"cap, {stats.fanout_capped} upstream links over the fan-out cap")
 
             # Display lineage graph inside the expander
             dot = create_graph(selected_node, theme)
@@ -0,0 +1,182 @@
+import asyncio
+import contextvars
+import os
+import random
+import time
+
+import openai
+
+# Token usage of the call in progress; set per attempt by resolve_all and filled in by the completion function
+CALL_USAGE = contextvars.ContextVar('call_usage', default=None)
+
+# Rough prompt size estimate (about four characters per token) used for the tokens/min budget
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+# Token bucket refilled continuously at rate_per_minute, holding at most capacity tokens
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount=1):
+        # Requests larger than the bucket are clamped so they can still run once the bucket is full
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate_per_second)
+
+# Requests/min and tokens/min budgets shared by every worker
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, estimated_tokens):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+def is_retryable(error):
+    # 429 and 5xx responses, plus connection failures and timeouts, are worth retrying
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, asyncio.TimeoutError)):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+def retry_delay(error, attempt, base_delay=1.0, max_delay=60.0):
+    # Honour Retry-After when the server sends it, otherwise exponential backoff with full jitter
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after) + random.uniform(0, base_delay)
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+# Default completion call: one chat completion against the OpenAI-compatible endpoint.
+# stats, when given, records the latency and output tokens of every successful call.
+def make_openai_complete(model="gpt-4o-mini", max_tokens=1000, temperature=0.5, client=None, response_format=None,
+                         stats=None):
+    if client is None:
+        # Retries are handled by the resolver so the rate limiter sees every attempt
+        client = openai.AsyncOpenAI(api_key=os.getenv('openai_api_key'), base_url=os.getenv('openai_base_url'),
+                                    max_retries=0)
+
+    extra_arguments = {} if response_format is None else {'response_format': response_format}
+
+    async def complete(prompt):
+        start = time.perf_counter()
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **extra_arguments
+        )
+        if stats is not None:
+            stats.record_call(time.perf_counter() - start, response.usage.completion_tokens if response.usage else 0)
+        usage = CALL_USAGE.get()
+        if usage is not None and response.usage:
+            usage.update(prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens)
+        return response.choices[0].message.content.strip()
+
+    complete.model = model
+    complete.max_tokens = max_tokens
+    complete.aclose = client.close
+    return complete
+
+# Resolve every prompt with bounded concurrency, rate limiting and retries; results keep the prompt order.
+# telemetry, when given, gets one event per attempt labelled with labels[index]; on_result, when given, is
+# called with (index, result) as soon as each prompt's final result (answer or exception) is known.
+async def resolve_all(prompts, complete, concurrency=8, requests_per_minute=500, tokens_per_minute=200000,
+                      max_retries=5, base_delay=1.0, telemetry=None, labels=None, mode=None, on_result=None):
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    max_tokens = getattr(complete, 'max_tokens', 0)
+    model = getattr(complete, 'model', None)
+    results = [None] * len(prompts)
+    queue = asyncio.Queue()
+    for index, prompt in enumerate(prompts):
+        queue.put_nowait((index, prompt))
+    queued_at = time.perf_counter()
+
+    def record(index, attempt, ready_at, started_at, usage, error=None):
+        if telemetry is None:
+            return
+        telemetry.record(
+            labels[index] if labels is not None else str(index), model, mode=mode,
+            latency=time.perf_counter() - started_at, queue_wait=started_at - ready_at,
+            prompt_tokens=usage.get('prompt_tokens', 0), completion_tokens=usage.get('completion_tokens', 0),
+            attempt=attempt, status='ok' if error is None else 'error',
+            error=None if error is None else f"{type(error).__name__}: {error}",
+        )
+
+    async def worker():
+        while True:
+            try:
+                index, prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            # Queue wait covers the time spent queued plus the rate limiter wait before the call
+            ready_at = queued_at
+            for attempt in range(max_retries + 1):
+                await limiter.acquire(estimate_tokens(prompt) + max_tokens)
+                usage = {}
+                CALL_USAGE.set(usage)
+                started_at = time.perf_counter()
+                try:
+                    results[index] = await complete(prompt)
+                    record(index, attempt, ready_at, started_at, usage)
+                    break
+                except Exception as error:
+                    record(index, attempt, ready_at, started_at, usage, error)
+                    ready_at = time.perf_counter()
+                    if attempt == max_retries or not is_retryable(error):
+                        # Failed prompts are returned as the exception so the caller can skip them
+                        results[index] = error
+                        break
+                    await asyncio.sleep(retry_delay(error, attempt, base_delay))
+            if on_result is not None:
+                on_result(index, results[index])
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(prompts))))))
+    return results
+
+# Synchronous entry point configured from the environment
+def resolve_prompts(prompts, complete=None, telemetry=None, labels=None, mode=None, on_result=None):
+    if complete is None:
+        complete = make_openai_complete()
+
+    async def run():
+        try:
+            return await resolve_all(
+                prompts,
+                complete,
+                concurrency=int(os.getenv('llm_concurrency', '8')),
+                requests_per_minute=int(os.getenv('llm_requests_per_minute', '500')),
+                tokens_per_minute=int(os.getenv('llm_tokens_per_minute', '200000')),
+                max_retries=int(os.getenv('llm_max_retries', '5')),
+                telemetry=telemetry,
+                labels=labels,
+                mode=mode,
+                on_result=on_result,
+            )
+        finally:
+            # Close the HTTP client inside this event loop; it can't be closed once asyncio.run() returns
+            if hasattr(complete, 'aclose'):
+                await complete.aclose()
+
+    return asyncio.run(run())
@@ -0,0 +1,624 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Synthetic dbt artifacts shaped like manifest.json / catalog.json
+def make_synthetic_project(model_count, columns_per_model=20, refs_per_model=3, seed=0):
+    rng = random.Random(seed)
+    nodes = {}
+    catalog_nodes = {}
+    for i in range(model_count):
+        node_key = f"model.bench_project.model_{i}"
+        columns = [f"COLUMN_{j}" for j in range(columns_per_model)]
+        upstream = rng.sample(range(i), min(i, refs_per_model)) if i else []
+
+        nodes[node_key] = {
+            'resource_type': 'model',
+            'name': f"model_{i}",
+            'raw_code': f"select * from {{{{ ref('model_{upstream[0]}') }}}}" if upstream else "select 1 as column_0",
+            'refs': [{'name': f"model_{u}", 'package': None, 'version': None} for u in upstream],
+            'columns': {column.lower(): {'name': column.lower(), 'description': f"Description of {column}"} for column in columns},
+            'checksum': {'name': 'sha256', 'checksum': f"{i:064x}"},
+        }
+        catalog_nodes[node_key] = {
+            'metadata': {'database': 'BENCH', 'schema': 'PUBLIC', 'name': f"MODEL_{i}"},
+            'columns': {column: {'type': 'TEXT', 'index': j + 1, 'name': column, 'comment': None} for j, column in enumerate(columns)},
+        }
+    return nodes, catalog_nodes
+
+# Time a callable, returning (seconds, result)
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# Benchmark: manifest/catalog join scales linearly with project size
+def bench_manifest_join(sizes):
+    from read_manifest_catalog import build_dataframe_from_manifest
+
+    print(f"{'models':>8} {'rows':>9} {'seconds':>9} {'us/row':>8}")
+    for size in sizes:
+        nodes, catalog_nodes = make_synthetic_project(size)
+        elapsed, df = timed(build_dataframe_from_manifest, nodes, catalog_nodes)
+        print(f"{size:>8} {len(df):>9} {elapsed:>9.3f} {elapsed / len(df) * 1e6:>8.2f}")
+
+# Time a callable under tracemalloc, returning (seconds, peak MB, result)
+def traced(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+# Write a synthetic manifest padded with the bulky sections the pipeline never reads
+def write_synthetic_manifest(path, model_count, padding_bytes=20000):
+    nodes, _ = make_synthetic_project(model_count)
+    for node_info in nodes.values():
+        node_info['compiled_code'] = 'x' * padding_bytes
+    macros = {f"macro.bench_project.macro_{i}": {'macro_sql': 'x' * padding_bytes} for i in range(model_count)}
+    with open(path, 'w') as file:
+        json.dump({'metadata': {}, 'nodes': nodes, 'macros': macros, 'docs': {}}, file)
+
+# Benchmark: full json.load versus the streaming node reader
+def bench_manifest_memory(manifest_path, model_count):
+    from read_manifest_catalog import load_manifest
+
+    def load_full(path):
+        with open(path, 'r') as file:
+            return json.load(file).get('nodes', {})
+
+    def consume_stream(path):
+        return sum(1 for _ in load_manifest(path))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if manifest_path is None:
+            manifest_path = os.path.join(tmp_dir, 'manifest.json')
+            write_synthetic_manifest(manifest_path, model_count)
+
+        size_mb = os.path.getsize(manifest_path) / 1024 / 1024
+        print(f"manifest: {manifest_path} ({size_mb:.1f} MB)")
+        for label, func in (('json.load', load_full), ('streaming', consume_stream)):
+            elapsed, peak, _ = traced(func, manifest_path)
+            print(f"{label:>10}: {elapsed:7.3f}s  peak {peak:8.1f} MB")
+
+# Benchmark: rows/sec of each offline load strategy on a synthetic lineage frame
+def bench_load_sinks(model_count):
+    from lineage_sinks import LocalFileSink, SQLiteSink, timed_load
+    from read_manifest_catalog import build_dataframe_from_manifest
+
+    nodes, catalog_nodes = make_synthetic_project(model_count)
+    df = build_dataframe_from_manifest(nodes, catalog_nodes)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sinks = [
+            SQLiteSink(os.path.join(tmp_dir, 'column_lineage.db')),
+            LocalFileSink(os.path.join(tmp_dir, 'csv')),
+            LocalFileSink(os.path.join(tmp_dir, 'csv_chunked'), chunk_rows=10000),
+        ]
+        for sink in sinks:
+            timed_load(sink, 'replace', df)
+            sink.close()
+
+# Benchmark: memory and CSV volume of the denormalized versus normalized layouts
+def bench_normalized_layout(model_count, columns_per_model):
+    from normalized_lineage import build_normalized_tables
+    from read_manifest_catalog import build_dataframe_from_manifest
+
+    nodes, catalog_nodes = make_synthetic_project(model_count, columns_per_model=columns_per_model)
+    for node_info in nodes.values():
+        node_info['raw_code'] = node_info['raw_code'] + '\n' + '    -- transformation logic\n' * 100
+
+    def layout_size(frames):
+        memory = sum(frame.memory_usage(deep=True).sum() for frame in frames) / 1024 / 1024
+        csv_bytes = sum(len(frame.to_csv(index=False).encode('utf-8')) for frame in frames) / 1024 / 1024
+        return memory, csv_bytes
+
+    denormalized = build_dataframe_from_manifest(nodes, catalog_nodes)
+    normalized = build_normalized_tables(nodes, catalog_nodes)
+    for label, frames in (('denormalized', [denormalized]), ('normalized', list(normalized.values()))):
+        memory, csv_bytes = layout_size(frames)
+        print(f"{label:>13}: {memory:8.1f} MB in memory, {csv_bytes:8.1f} MB as CSV")
+
+# Benchmark: streamed dict path (per-row dicts) versus streamed typed slotted records; whole-file parses for scale
+def bench_records(model_count):
+    from lineage_records import (build_lineage_rows, load_catalog_records, load_json, load_manifest_records,
+                                 orjson, rows_to_dataframe)
+    from read_manifest_catalog import build_dataframe_from_manifest, load_catalog, load_manifest
+
+    def load_stdlib(path):
+        with open(path, 'r') as file:
+            return json.load(file)['nodes']
+
+    def dict_path(manifest_path, catalog_path):
+        return build_dataframe_from_manifest(load_manifest(manifest_path), load_catalog(catalog_path))
+
+    def records_path(manifest_path, catalog_path):
+        return rows_to_dataframe(build_lineage_rows(load_manifest_records(manifest_path),
+                                                    load_catalog_records(catalog_path)))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        nodes, catalog_nodes = make_synthetic_project(model_count)
+        manifest_path = os.path.join(tmp_dir, 'manifest.json')
+        catalog_path = os.path.join(tmp_dir, 'catalog.json')
+        with open(manifest_path, 'w') as file:
+            json.dump({'nodes': nodes}, file)
+        with open(catalog_path, 'w') as file:
+            json.dump({'nodes': catalog_nodes}, file)
+        del nodes, catalog_nodes
+
+        print(f"{model_count} models, JSON backend: {'orjson' if orjson else 'json (stdlib fallback)'}")
+        # Wall time is measured untraced; tracemalloc slows allocation-heavy code
+        comparisons = (
+            ('dict parse', load_stdlib, (manifest_path,)),
+            ('fast parse', load_json, (manifest_path,)),
+            ('dict build', dict_path, (manifest_path, catalog_path)),
+            ('records build', records_path, (manifest_path, catalog_path)),
+        )
+        for label, func, args in comparisons:
+            elapsed, _ = timed(func, *args)
+            _, peak, _ = traced(func, *args)
+            print(f"{label:>14}: {elapsed:7.3f}s  peak {peak:8.1f} MB")
+
+# Benchmark: LLM resolution throughput against the local fake completion server
+def bench_llm_throughput(prompt_count, concurrency_levels, latency, error_rate):
+    import openai
+    from async_resolver import make_openai_complete, resolve_all
+    from fake_llm_server import FakeCompletionServer
+    from llm_telemetry import LLMTelemetry
+
+    prompts = [f"Model: model_{i % 50}\n\nColumn Name: column_{i}\n\n" + 'x' * 2000 for i in range(prompt_count)]
+
+    async def run(concurrency):
+        server = await FakeCompletionServer(latency=latency, error_rate=error_rate).start()
+        client = openai.AsyncOpenAI(api_key='fake', base_url=server.base_url, max_retries=0)
+        complete = make_openai_complete(client=client)
+        telemetry = LLMTelemetry()
+        start = time.perf_counter()
+        results = await resolve_all(prompts, complete, concurrency=concurrency, requests_per_minute=60000,
+                                    tokens_per_minute=100000000, base_delay=0.01, telemetry=telemetry)
+        elapsed = time.perf_counter() - start
+        await client.close()
+        await server.stop()
+        failures = sum(isinstance(result, Exception) for result in results)
+        in_order = all(f"[column_{i}]" in result for i, result in enumerate(results) if isinstance(result, str))
+        print(f"concurrency {concurrency:>4}: {prompt_count / elapsed:8.1f} prompts/s, {server.requests} requests "
+              f"({server.errors} injected errors), {failures} failed, ordered={in_order}")
+        telemetry.report(telemetry.summary())
+
+    for concurrency in concurrency_levels:
+        asyncio.run(run(concurrency))
+
+# Benchmark: per-column versus per-model LLM requests on the lineage CSV, via the fake server
+def bench_llm_batching(csv_path, latency):
+    import pandas as pd
+    from fake_llm_server import start_in_thread
+    import gen_column_lineage
+
+    records = pd.read_csv(csv_path)
+    records = records[records['REFERENCE'].notna()]
+
+    for batch_mode in ('column', 'model'):
+        server = start_in_thread(latency=latency)
+        # Static resolution and the response cache would hide the LLM requests being compared
+        os.environ.update({'openai_base_url': server.base_url, 'openai_api_key': 'fake',
+                           'llm_concurrency': '8', 'llm_batch_mode': batch_mode,
+                           'static_lineage': 'false', 'llm_cache': 'false'})
+        elapsed, results = timed(gen_column_lineage.resolve_lineage, records)
+        resolved = sum(1 for result in results if not isinstance(result, Exception) and result[1])
+        print(f"{batch_mode:>7} mode: {len(records)} columns, {server.requests:4d} requests, "
+              f"{server.prompt_tokens:8d} prompt tokens, {server.completion_tokens:6d} completion tokens, "
+              f"{elapsed:6.2f}s, {resolved} resolved")
+
+# Benchmark: prompt tokens of a mart joining wide staging models, before and after reference pruning
+def bench_prompt_budget(ref_count, columns_per_ref, selected_columns, budgets):
+    from read_manifest_catalog import format_reference
+    import gen_column_lineage
+
+    rng = random.Random(0)
+    column_names = [[f"attr_{rng.getrandbits(24):06x}" for _ in range(columns_per_ref)] for _ in range(ref_count)]
+    reference = format_reference(
+        (f"stg_model_{r}", column_name.upper(), f"Description of {column_name} of staging model {r}, from the source")
+        for r in range(ref_count) for column_name in column_names[r]
+    )
+    selected = [(r, column_names[r][c]) for r in range(ref_count) for c in range(selected_columns // ref_count)]
+    sql = (f"select {', '.join(f'stg_model_{r}.{column_name}' for r, column_name in selected)}\n"
+           f"from {{{{ ref('stg_model_0') }}}} as stg_model_0\n"
+           + ''.join(f"join {{{{ ref('stg_model_{r}') }}}} as stg_model_{r} using (id)\n"
+                     for r in range(1, ref_count)))
+
+    for budget in budgets:
+        os.environ.update({'llm_prompt_token_budget': str(budget), 'llm_prune_reference': 'true'})
+        tokens_before = tokens_after = 0
+        start = time.perf_counter()
+        for r, column_name in selected:
+            _, before, after = gen_column_lineage.build_budgeted_lineage_prompt(
+                'model.bench_project.mart', column_name.upper(), reference, sql)
+            tokens_before += before
+            tokens_after += after
+        elapsed = time.perf_counter() - start
+        print(f"budget {budget:>6}: {len(selected)} prompts, {tokens_before:8d} -> {tokens_after:7d} prompt tokens "
+              f"({tokens_after / tokens_before:.1%}), {elapsed * 1000 / len(selected):.2f} ms/prompt")
+
+# Benchmark: legacy free-text answers versus structured JSON answers with a strict validator
+def bench_response_format(csv_path, latency, malformed_rate):
+    import pandas as pd
+    from fake_llm_server import start_in_thread
+    import gen_column_lineage
+
+    records = pd.read_csv(csv_path)
+    records = records[records['REFERENCE'].notna()]
+
+    for response_format in ('text', 'json'):
+        server = start_in_thread(latency=latency, malformed_rate=malformed_rate)
+        os.environ.update({'openai_base_url': server.base_url, 'openai_api_key': 'fake', 'llm_concurrency': '8',
+                           'llm_batch_mode': 'column', 'llm_response_format': response_format,
+                           'static_lineage': 'false', 'llm_cache': 'false'})
+        elapsed, results = timed(gen_column_lineage.resolve_lineage, records)
+        usable = sum(1 for result in results if not isinstance(result, Exception) and any(result[:2]))
+        print(f"{response_format:>5}: {len(records)} columns, {server.requests} requests, "
+              f"{server.completion_tokens} completion tokens, {elapsed:.2f}s, {usable} usable answers")
+
+# Synthetic column lineage shaped like the iterate_lineage input: layers of models whose columns map to
+# one or two columns of models in the layer below
+def make_synthetic_lineage(column_count, layers=10, columns_per_model=20, seed=0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    models_per_layer = max(1, column_count // (layers * columns_per_model))
+    rows = []
+    for layer in range(layers):
+        for m in range(models_per_layer):
+            for c in range(columns_per_model):
+                upstream_tables, upstream_columns = None, None
+                if layer:
+                    upstream = [(f"model_{layer - 1}_{rng.randrange(models_per_layer)}",
+                                 f"column_{rng.randrange(columns_per_model)}") for _ in range(rng.randint(1, 2))]
+                    upstream_tables = ', '.join(table for table, _ in upstream)
+                    upstream_columns = ', '.join(f"{table}.{column}" for table, column in upstream)
+                rows.append({'NAME': f"model_{layer}_{m}", 'COLUMN_NAME': f"column_{c}",
+                             'COLUMN_DESCRIPTION': f"Column {c} of model {layer}_{m}", 'REASONING': 'one to one mapping',
+                             'UPSTREAM_TABLE': upstream_tables, 'UPSTREAM_COLUMN': upstream_columns})
+    return pd.DataFrame(rows)
+
+# The pre-index hierarchy builder: boolean-mask scans of the whole frame at every visited node
+def naive_build_hierarchy(df, model_name, column_name):
+    from iterate_lineage import extract_column_name
+
+    model_name, column_name = model_name.lower().strip(), column_name.lower().strip()
+    node = {"model": model_name, "column": column_name, "column Description": "", "reasoning": "",
+            "upstream_models": []}
+    mask = (df['NAME'] == model_name) & (df['COLUMN_NAME'] == column_name)
+    current_row = df[mask]
+    if current_row.empty:
+        node["column Description"], node["reasoning"] = "Description not available", "Reasoning not available"
+        return node
+    node["column Description"] = df.loc[mask, 'COLUMN_DESCRIPTION'].values[0]
+    node["reasoning"] = df.loc[mask, 'REASONING'].values[0]
+    for upstream_table, upstream_column in zip(str(current_row['UPSTREAM_TABLE'].values[0]).split(','),
+                                               str(current_row['UPSTREAM_COLUMN'].values[0]).split(',')):
+        node["upstream_models"].append(naive_build_hierarchy(df, upstream_table.strip(),
+                                                             extract_column_name(upstream_column.strip())))
+    return node
+
+# Benchmark: indexed, memoized hierarchy build versus per-node mask scans (extrapolated from a sample of roots)
+def bench_hierarchy(column_count, sample_size):
+    from iterate_lineage import build_full_hierarchy
+
+    df = make_synthetic_lineage(column_count)
+    elapsed, hierarchy = timed(build_full_hierarchy, df)
+    print(f"indexed: {len(df)} columns in {elapsed:.2f}s")
+
+    sample = random.Random(1).sample(range(len(df)), min(sample_size, len(df)))
+    naive_elapsed, naive = timed(lambda: [naive_build_hierarchy(df, df['NAME'].iat[position], df['COLUMN_NAME'].iat[position])
+                                          for position in sample])
+    estimate = naive_elapsed / len(sample) * len(df)
+    matches = all(json.dumps(tree) == json.dumps(hierarchy[position]) for tree, position in zip(naive, sample))
+    print(f"naive:   {len(sample)} columns in {naive_elapsed:.2f}s, ~{estimate:.0f}s estimated for all {len(df)} "
+          f"({estimate / elapsed:.0f}x slower), same trees={matches}")
+
+# Benchmark: nested lineage.json versus the deduplicated node/edge file, build and write time and file size
+def bench_lineage_output(csv_path, column_count):
+    from iterate_lineage import build_full_hierarchy, read_csv_data
+    from lineage_graph import LineageGraph, build_lineage_graph, write_lineage_graph
+
+    df = make_synthetic_lineage(column_count) if column_count else read_csv_data(csv_path)
+    with tempfile.TemporaryDirectory() as directory:
+        tree_path = os.path.join(directory, 'lineage.json')
+        graph_path = os.path.join(directory, 'lineage_graph.json')
+
+        def write_tree():
+            with open(tree_path, 'w') as file:
+                json.dump(build_full_hierarchy(df), file, indent=4)
+
+        tree_seconds, _ = timed(write_tree)
+        graph_seconds, _ = timed(lambda: write_lineage_graph(build_lineage_graph(df), graph_path))
+        tree_size, graph_size = os.path.getsize(tree_path), os.path.getsize(graph_path)
+        load_seconds, graph = timed(LineageGraph.load, graph_path)
+        root = graph.nodes[graph.roots[-1]]
+        root_seconds, _ = timed(graph.hierarchy, root[0], root[1])
+
+    print(f"{len(df)} lineage rows")
+    print(f"nested tree: {tree_size / 1024:10.1f} KiB, written in {tree_seconds:.3f}s")
+    print(f"node/edge:   {graph_size / 1024:10.1f} KiB, written in {graph_seconds:.3f}s "
+          f"({tree_size / graph_size:.1f}x smaller)")
+    print(f"loaded in {load_seconds:.3f}s, one root materialized in {root_seconds * 1000:.2f} ms")
+
+# Benchmark: peak memory of dumping the whole lineage.json list versus streaming one root per JSON line
+def bench_lineage_stream(column_count, memo_entries):
+    from iterate_lineage import build_full_hierarchy, iter_full_hierarchy, write_hierarchy_jsonl
+
+    df = make_synthetic_lineage(column_count)
+    with tempfile.TemporaryDirectory() as directory:
+        tree_path = os.path.join(directory, 'lineage.json')
+        jsonl_path = os.path.join(directory, 'lineage.jsonl')
+
+        def write_tree():
+            with open(tree_path, 'w') as file:
+                json.dump(build_full_hierarchy(df), file, indent=4)
+
+        tree_seconds, tree_peak, _ = traced(write_tree)
+        stream_seconds, stream_peak, count = traced(
+            lambda: write_hierarchy_jsonl(iter_full_hierarchy(df, memo_entries=memo_entries), jsonl_path))
+        tree_size, jsonl_size = os.path.getsize(tree_path), os.path.getsize(jsonl_path)
+
+    print(f"{len(df)} lineage rows")
+    print(f"lineage.json:  {tree_seconds:7.2f}s, peak {tree_peak:8.1f} MiB, {tree_size / 1024 / 1024:8.1f} MiB on disk")
+    print(f"lineage.jsonl: {stream_seconds:7.2f}s, peak {stream_peak:8.1f} MiB, {jsonl_size / 1024 / 1024:8.1f} MiB "
+          f"on disk ({count} lines, at most {memo_entries} memo entries)")
+
+# Benchmark: transitive downstream queries from the downstream index versus scanning every upstream tree
+def bench_downstream(column_count, query_count, scan_count):
+    from downstream_index import DownstreamIndex
+    from iterate_lineage import build_full_hierarchy, build_lineage_index
+
+    df = make_synthetic_lineage(column_count)
+    build_seconds, index = timed(lambda: DownstreamIndex.build(build_lineage_index(df)))
+    with tempfile.TemporaryDirectory() as directory:
+        index_path = os.path.join(directory, 'downstream_index.json')
+        save_seconds, _ = timed(index.save, index_path)
+        load_seconds, index = timed(DownstreamIndex.load, index_path)
+    print(f"index: {len(index.nodes)} nodes built in {build_seconds:.2f}s, saved in {save_seconds:.2f}s, "
+          f"loaded in {load_seconds:.2f}s")
+
+    # Sources from the bottom layer have the largest downstream sets
+    sources = [f"model_0_{i % (column_count // 200)}.column_{i % 20}" for i in range(query_count)]
+    query_seconds, results = timed(lambda: [index.downstream(source) for source in sources])
+    print(f"index: {query_count} queries, {query_seconds / query_count * 1000:.2f} ms/query, "
+          f"{sum(len(result) for result in results) / query_count:.0f} downstream nodes on average")
+
+    # Baseline: every column whose expanded upstream tree contains the source
+    hierarchy = build_full_hierarchy(df)
+
+    def scan(source):
+        model_name, column_name = source.split('.')
+        affected = set()
+        for tree in hierarchy:
+            stack = list(tree['upstream_models'])
+            while stack:
+                node = stack.pop()
+                if node['model'] == model_name and node['column'] == column_name:
+                    affected.add(f"{tree['model']}.{tree['column']}")
+                    break
+                stack.extend(node['upstream_models'])
+        return affected
+
+    scan_seconds, scanned = timed(lambda: [scan(source) for source in sources[:scan_count]])
+    matches = all(scanned_set == {name for name, _, _ in result} for scanned_set, result in zip(scanned, results))
+    print(f"tree scan: {scan_count} queries, {scan_seconds / scan_count * 1000:.0f} ms/query "
+          f"({scan_seconds / scan_count / (query_seconds / query_count):.0f}x slower), same results={matches}")
+
+# Benchmark: columnar CSR store size, memory-mapped load and batched reachability against a dict-of-lists walk
+def bench_lineage_store(column_count, source_count):
+    import numpy as np
+    from lineage_store import LineageStore
+
+    # Same layered shape as make_synthetic_lineage, generated as edges to keep a million columns cheap
+    rng = random.Random(0)
+    layers, columns_per_model = 10, 20
+    models_per_layer = max(1, column_count // (layers * columns_per_model))
+    edges = []
+    for layer in range(1, layers):
+        for m in range(models_per_layer):
+            for c in range(columns_per_model):
+                for _ in range(rng.randint(1, 2)):
+                    edges.append((f"model_{layer}_{m}.column_{c}".encode(),
+                                  f"model_{layer - 1}_{rng.randrange(models_per_layer)}.column_{rng.randrange(columns_per_model)}".encode()))
+
+    build_seconds, peak, store = traced(LineageStore.from_edges, edges)
+    with tempfile.TemporaryDirectory() as directory:
+        save_seconds, _ = timed(store.save, directory)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        load_seconds, store = timed(LineageStore.load, directory)
+        print(f"store: {len(store)} nodes, {len(store.up_indices)} edges, built in {build_seconds:.2f}s "
+              f"(peak {peak:.0f} MB), {size / 1024 / 1024:.1f} MB on disk, saved in {save_seconds:.2f}s, "
+              f"mmap load in {load_seconds * 1000:.1f} ms")
+
+        top_layer = [f"model_{layers - 1}_{m}.column_{m % columns_per_model}" for m in range(source_count)]
+        sources = store.node_ids(top_layer)
+        batch_seconds, batched = timed(store.reachable_batch, sources)
+        single_seconds, single = timed(lambda: [store.reachable([source]) for source in sources])
+
+    # Baseline: per-source walk over a dict of upstream lists
+    upstream = {}
+    for downstream_name, upstream_name in edges:
+        upstream.setdefault(downstream_name, []).append(upstream_name)
+
+    def walk_upstream(name):
+        seen, stack = set(), [name]
+        while stack:
+            for upstream_name in upstream.get(stack.pop(), []):
+                if upstream_name not in seen:
+                    seen.add(upstream_name)
+                    stack.append(upstream_name)
+        return seen
+
+    dict_seconds, walked = timed(lambda: [walk_upstream(name.encode()) for name in top_layer])
+    matches = all(set(store.names[result]) == expected and np.array_equal(result, other)
+                  for result, other, expected in zip(batched, single, walked))
+    print(f"{source_count} sources: batched BFS {batch_seconds * 1000:.0f} ms, one BFS per source "
+          f"{single_seconds * 1000:.0f} ms, dict walk {dict_seconds * 1000:.0f} ms, same results={matches}")
+
+# Benchmark: reachability index checks, root sources and incremental updates versus naive upstream DFS
+def bench_reachability(column_count, query_count, change_count):
+    from reachability_index import ReachabilityIndex
+
+    rng = random.Random(0)
+    layers, columns_per_model = 10, 20
+    models_per_layer = max(1, column_count // (layers * columns_per_model))
+
+    def random_upstream(layer):
+        return [f"model_{layer - 1}_{rng.randrange(models_per_layer)}.column_{rng.randrange(columns_per_model)}"
+                for _ in range(rng.randint(1, 2))] if layer else []
+
+    edges = {f"model_{layer}_{m}.column_{c}": random_upstream(layer)
+             for layer in range(layers) for m in range(models_per_layer) for c in range(columns_per_model)}
+    names = list(edges)
+
+    def dfs(name):
+        seen, stack = set(), [name]
+        while stack:
+            for upstream_name in edges.get(stack.pop(), []):
+                if upstream_name not in seen:
+                    seen.add(upstream_name)
+                    stack.append(upstream_name)
+        return seen
+
+    build_seconds, index = timed(ReachabilityIndex.build, edges)
+    print(f"build: {len(names)} columns in {build_seconds:.2f}s")
+
+    pairs = [(rng.choice(names), rng.choice(names)) for _ in range(query_count)]
+    check_seconds, checks = timed(lambda: [index.is_ancestor(ancestor, column) for ancestor, column in pairs])
+    naive_seconds, naive_checks = timed(lambda: [ancestor in dfs(column) for ancestor, column in pairs])
+    print(f"is_ancestor: {check_seconds / query_count * 1e6:.2f} us/check, naive DFS "
+          f"{naive_seconds / query_count * 1e6:.1f} us/check, same={checks == naive_checks}")
+
+    columns = [rng.choice(names) for _ in range(query_count)]
+    roots_seconds, roots = timed(lambda: [index.root_sources(column) for column in columns])
+    naive_seconds, naive_roots = timed(lambda: [{name for name in dfs(column) if not edges.get(name)} for column in columns])
+    print(f"root_sources: {roots_seconds / query_count * 1e6:.2f} us/column, naive DFS "
+          f"{naive_seconds / query_count * 1e6:.1f} us/column, same={roots == naive_roots}")
+
+    # Re-resolve a few mid-graph columns and apply just those edges
+    changed = {}
+    for _ in range(change_count):
+        layer = rng.randrange(1, layers)
+        changed[f"model_{layer}_{rng.randrange(models_per_layer)}.column_{rng.randrange(columns_per_model)}"] = \
+            random_upstream(layer)
+    edges.update(changed)
+    update_seconds, recomputed = timed(index.update, changed)
+    rebuild_seconds, _ = timed(ReachabilityIndex.build, edges)
+    sample = rng.sample(names, min(200, len(names)))
+    matches = all(index.ancestors_of(column) == dfs(column) for column in sample)
+    print(f"update: {len(changed)} changed columns, {recomputed} recomputed in {update_seconds * 1000:.0f} ms, "
+          f"full rebuild {rebuild_seconds:.2f}s, matches DFS={matches}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Performance benchmarks for the lineage pipeline')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    join_parser = subparsers.add_parser('manifest-join', help='manifest/catalog join scaling')
+    join_parser.add_argument('--sizes', type=int, nargs='+', default=[500, 1000, 2000, 4000, 8000])
+
+    memory_parser = subparsers.add_parser('manifest-memory', help='peak memory of manifest loading')
+    memory_parser.add_argument('--manifest', default=None, help='manifest.json to load (default: synthetic)')
+    memory_parser.add_argument('--models', type=int, default=2000)
+
+    sinks_parser = subparsers.add_parser('load-sinks', help='rows/sec of the offline load sinks')
+    sinks_parser.add_argument('--models', type=int, default=2000)
+
+    layout_parser = subparsers.add_parser('normalized-layout', help='denormalized vs normalized storage volume')
+    layout_parser.add_argument('--models', type=int, default=500)
+    layout_parser.add_argument('--columns', type=int, default=150)
+
+    records_parser = subparsers.add_parser('records', help='dict path vs slotted records and fast JSON')
+    records_parser.add_argument('--models', type=int, default=3000)
+
+    llm_parser = subparsers.add_parser('llm-throughput', help='async resolver against a fake completion server')
+    llm_parser.add_argument('--prompts', type=int, default=400)
+    llm_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    llm_parser.add_argument('--latency', type=float, default=0.05)
+    llm_parser.add_argument('--error-rate', type=float, default=0.05)
+
+    batching_parser = subparsers.add_parser('llm-batching', help='per-column vs per-model LLM requests')
+    batching_parser.add_argument('--csv', default='dbt_manifest_extracted_data_with_lineage.csv')
+    batching_parser.add_argument('--latency', type=float, default=0.2)
+
+    budget_parser = subparsers.add_parser('prompt-budget', help='prompt tokens before/after reference pruning')
+    budget_parser.add_argument('--refs', type=int, default=5)
+    budget_parser.add_argument('--columns', type=int, default=200)
+    budget_parser.add_argument('--selected', type=int, default=40)
+    budget_parser.add_argument('--budgets', type=int, nargs='+', default=[100000, 4000, 1000])
+
+    format_parser = subparsers.add_parser('response-format', help='free-text vs structured JSON LLM answers')
+    format_parser.add_argument('--csv', default='dbt_manifest_extracted_data_with_lineage.csv')
+    format_parser.add_argument('--latency', type=float, default=0.05)
+    format_parser.add_argument('--malformed-rate', type=float, default=0.1)
+
+    hierarchy_parser = subparsers.add_parser('hierarchy', help='indexed vs mask-scan lineage hierarchy build')
+    hierarchy_parser.add_argument('--columns', type=int, default=50000)
+    hierarchy_parser.add_argument('--sample', type=int, default=20)
+
+    output_parser = subparsers.add_parser('lineage-output', help='nested lineage.json vs node/edge graph file')
+    output_parser.add_argument('--csv', default='dbt_manifest_extracted_data_with_lineage.csv')
+    output_parser.add_argument('--columns', type=int, default=0, help='synthetic lineage columns instead of --csv')
+
+    stream_parser = subparsers.add_parser('lineage-stream', help='lineage.json dump vs streamed JSON Lines memory')
+    stream_parser.add_argument('--columns', type=int, default=5000)
+    stream_parser.add_argument('--memo-entries', type=int, default=1000)
+
+    downstream_parser = subparsers.add_parser('downstream', help='downstream index queries vs upstream tree scans')
+    downstream_parser.add_argument('--columns', type=int, default=100000)
+    downstream_parser.add_argument('--queries', type=int, default=200)
+    downstream_parser.add_argument('--scans', type=int, default=3)
+
+    store_parser = subparsers.add_parser('lineage-store', help='CSR graph store size, load time and reachability')
+    store_parser.add_argument('--columns', type=int, default=1000000)
+    store_parser.add_argument('--sources', type=int, default=256)
+
+    reachability_parser = subparsers.add_parser('reachability', help='reachability index vs naive DFS')
+    reachability_parser.add_argument('--columns', type=int, default=100000)
+    reachability_parser.add_argument('--queries', type=int, default=2000)
+    reachability_parser.add_argument('--changes', type=int, default=100)
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'manifest-join':
+        bench_manifest_join(args.sizes)
+    elif args.benchmark == 'manifest-memory':
+        bench_manifest_memory(args.manifest, args.models)
+    elif args.benchmark == 'load-sinks':
+        bench_load_sinks(args.models)
+    elif args.benchmark == 'normalized-layout':
+        bench_normalized_layout(args.models, args.columns)
+    elif args.benchmark == 'records':
+        bench_records(args.models)
+    elif args.benchmark == 'llm-throughput':
+        bench_llm_throughput(args.prompts, args.concurrency, args.latency, args.error_rate)
+    elif args.benchmark == 'llm-batching':
+        bench_llm_batching(args.csv, args.latency)
+    elif args.benchmark == 'prompt-budget':
+        bench_prompt_budget(args.refs, args.columns, args.selected, args.budgets)
+    elif args.benchmark == 'response-format':
+        bench_response_format(args.csv, args.latency, args.malformed_rate)
+    elif args.benchmark == 'hierarchy':
+        bench_hierarchy(args.columns, args.sample)
+    elif args.benchmark == 'lineage-output':
+        bench_lineage_output(args.csv, args.columns)
+    elif args.benchmark == 'lineage-stream':
+        bench_lineage_stream(args.columns, args.memo_entries)
+    elif args.benchmark == 'downstream':
+        bench_downstream(args.columns, args.queries, args.scans)
+    elif args.benchmark == 'lineage-store':
+        bench_lineage_store(args.columns, args.sources)
+    elif args.benchmark == 'reachability':
+        bench_reachability(args.columns, args.queries, args.changes)
+
+if __name__ == "__main__":
+    main()
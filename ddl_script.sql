@@ -13,6 +13,7 @@ create or replace TABLE COLUMN_LINEAGE (
 	NAME VARCHAR(16777216),
 	SQL VARCHAR(16777216),
 	REFERENCE VARCHAR(16777216),
+	SQL_HASH VARCHAR(32),
 	constraint UNIQUE_COLUMN unique (UNIQUE_KEY)
 );
 
@@ -30,8 +31,58 @@ create or replace TABLE COLUMN_LINEAGE_GENAI (
 	NAME VARCHAR(16777216),
 	SQL VARCHAR(16777216),
 	REFERENCE VARCHAR(16777216),
+	SQL_HASH VARCHAR(32),
 	UPSTREAM_TABLE VARCHAR(16777216),
 	UPSTREAM_COLUMN VARCHAR(16777216),
 	REASONING VARCHAR(16777216),
 	constraint UNIQUE_COLUMN unique (UNIQUE_KEY)
-);
\ No newline at end of file
+);
+
+
+
+/* Normalized layout: SQL and references stored once per model (normalized_lineage.py) */
+
+create or replace TABLE COLUMN_LINEAGE_MODEL (
+	TABLE_NAME VARCHAR(16777216),
+	DATABASE VARCHAR(16777216),
+	SCHEMA VARCHAR(16777216),
+	RESOURCE_TYPE VARCHAR(16777216),
+	NAME VARCHAR(16777216),
+	SQL VARCHAR(16777216),
+	SQL_HASH VARCHAR(32),
+	CHECKSUM VARCHAR(64),
+	constraint UNIQUE_MODEL unique (TABLE_NAME)
+);
+
+create or replace TABLE COLUMN_LINEAGE_COLUMN (
+	UNIQUE_KEY VARCHAR(16777216),
+	TABLE_NAME VARCHAR(16777216),
+	COLUMN_NAME VARCHAR(16777216),
+	COLUMN_DESCRIPTION VARCHAR(16777216),
+	constraint UNIQUE_LINEAGE_COLUMN unique (UNIQUE_KEY)
+);
+
+create or replace TABLE COLUMN_LINEAGE_UPSTREAM (
+	UPSTREAM_KEY VARCHAR(16777216),
+	TABLE_NAME VARCHAR(16777216),
+	ORDINAL NUMBER,
+	REF_NAME VARCHAR(16777216),
+	REF_COLUMN VARCHAR(16777216),
+	REF_DESCRIPTION VARCHAR(16777216),
+	constraint UNIQUE_UPSTREAM unique (UPSTREAM_KEY)
+);
+
+/* Reassembles the COLUMN_LINEAGE row layout on demand */
+create or replace VIEW COLUMN_LINEAGE_V as
+with model_references as (
+	select TABLE_NAME,
+	       listagg(REF_NAME || '.' || REF_COLUMN || ': ' || coalesce(REF_DESCRIPTION, ''), ', ')
+	           within group (order by ORDINAL) as REFERENCE
+	from COLUMN_LINEAGE_UPSTREAM
+	group by TABLE_NAME
+)
+select c.UNIQUE_KEY, m.DATABASE, m.SCHEMA, c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_DESCRIPTION,
+       m.RESOURCE_TYPE, m.NAME, m.SQL, coalesce(r.REFERENCE, '') as REFERENCE, m.SQL_HASH
+from COLUMN_LINEAGE_COLUMN c
+left join COLUMN_LINEAGE_MODEL m on m.TABLE_NAME = c.TABLE_NAME
+left join model_references r on r.TABLE_NAME = c.TABLE_NAME;
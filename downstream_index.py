@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import time
+
+from iterate_lineage import build_lineage_index, column_node, read_csv_data
+from lineage_traversal import TraversalStats, walk
+
+# Downstream (impact) index: every lineage node with its direct consumers, so "what breaks if this column
+# changes" is a walk over the consumers instead of a scan of every upstream tree.
+#
+# Nodes are dbt columns ("model.column", as in lineage.json) and, from the stitched Tableau output,
+# Tableau fields, calculations and sheets:
+#   field:<workbook>/<datasource>/<field>, calculation:<workbook>/<datasource>/<calculation>,
+#   sheet:<workbook>/<dashboard>/<sheet>
+#   nodes: node names, a node id being its position
+#   kinds: 'column', 'field', 'calculation' or 'sheet' per node
+#   consumers: per node id, the ids of its direct consumers
+
+INDEX_FORMAT = 'downstream-index'
+INDEX_VERSION = 1
+
+class DownstreamIndex:
+    def __init__(self, nodes=None, kinds=None, consumers=None):
+        self.nodes = nodes or []
+        self.kinds = kinds or []
+        self.consumers = consumers or []
+        self.node_ids = {name: node_id for node_id, name in enumerate(self.nodes)}
+        # Dotted suffix of a column node ("table.column", "schema.table.column", ...) -> column node ids
+        self.column_suffixes = {}
+        for node_id, name in enumerate(self.nodes):
+            if self.kinds[node_id] == 'column':
+                self._add_suffixes(name, node_id)
+
+    def _add_suffixes(self, name, node_id):
+        dot = name.find('.')
+        while dot >= 0:
+            self.column_suffixes.setdefault(name[dot + 1:], []).append(node_id)
+            dot = name.find('.', dot + 1)
+
+    def node_id(self, name, kind):
+        if name not in self.node_ids:
+            self.node_ids[name] = len(self.nodes)
+            self.nodes.append(name)
+            self.kinds.append(kind)
+            self.consumers.append([])
+            if kind == 'column':
+                self._add_suffixes(name, self.node_ids[name])
+        return self.node_ids[name]
+
+    def add_edge(self, upstream_name, upstream_kind, consumer_name, consumer_kind):
+        upstream_id = self.node_id(upstream_name, upstream_kind)
+        consumer_id = self.node_id(consumer_name, consumer_kind)
+        if consumer_id not in self.consumers[upstream_id]:
+            self.consumers[upstream_id].append(consumer_id)
+
+    # dbt column -> column edges from a build_lineage_index index
+    def add_lineage(self, lineage_index):
+        for (model_name, column_name), (_, _, upstream) in lineage_index.items():
+            consumer = column_node(model_name, column_name)
+            for upstream_model, upstream_column in upstream:
+                upstream_name = column_node(upstream_model, upstream_column)
+                if consumer and upstream_name:
+                    self.add_edge(upstream_name, 'column', consumer, 'column')
+
+    # Tableau edges from combined_lineage.json: column -> field, nested field -> calculation, field -> sheet
+    def add_tableau(self, combined_lineage):
+        for workbook in combined_lineage.get('workbooks', []):
+            workbook_name = workbook['name'].strip()
+            for dashboard in workbook.get('dashboards', []):
+                for datasource in dashboard.get('upstreamDatasources', []):
+                    scope = f"{workbook_name}/{datasource['name'].strip()}"
+                    for sheet in datasource.get('sheets', []):
+                        sheet_name = f"sheet:{workbook_name}/{dashboard['name'].strip()}/{sheet['name'].strip()}"
+                        self._add_fields(sheet.get('upstreamFields', []), scope, sheet_name)
+
+    def _add_fields(self, fields, scope, sheet_name):
+        def field_node(field):
+            kind = 'calculation' if field.get('formula') else 'field'
+            return f"{kind}:{scope}/{field['name'].strip()}", kind
+
+        def visit(field, consumer, depth):
+            name, kind = field_node(field)
+            self.add_edge(name, kind, *consumer)
+            for upstream_column in field.get('upstreamColumns', []):
+                # The stitched database lineage names the dbt column; otherwise fall back to the Tableau table
+                db_lineage = upstream_column.get('database_lineage')
+                if db_lineage:
+                    upstream_name = column_node(db_lineage['model'], db_lineage['column'])
+                    if upstream_name:
+                        self.add_edge(upstream_name, 'column', name, kind)
+                else:
+                    for upstream_table in upstream_column.get('upstreamTables', []):
+                        upstream_name = column_node(upstream_table['name'], upstream_column['name'])
+                        if upstream_name:
+                            self.add_edge(upstream_name, 'column', name, kind)
+            return (name, kind)
+
+        walk(fields, lambda field: field.get('upstreamFields', []), visit, key=lambda field: field_node(field)[0],
+             parent=(sheet_name, 'sheet'))
+
+    @classmethod
+    def build(cls, lineage_index, combined_lineage=None):
+        index = cls()
+        index.add_lineage(lineage_index)
+        if combined_lineage is not None:
+            index.add_tableau(combined_lineage)
+        return index
+
+    def save(self, file_path):
+        with open(file_path, 'w') as file:
+            json.dump({'format': INDEX_FORMAT, 'version': INDEX_VERSION, 'nodes': self.nodes, 'kinds': self.kinds,
+                       'consumers': self.consumers}, file, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+        if data.get('format') != INDEX_FORMAT or data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Not a {INDEX_FORMAT} v{INDEX_VERSION} file")
+        return cls(data['nodes'], data['kinds'], data['consumers'])
+
+    # Node ids for a name: an exact node name, or "table.column" matching a schema-qualified source column
+    def resolve(self, name):
+        name = name.strip()
+        for candidate in (name, name.lower()):
+            if candidate in self.node_ids:
+                return [self.node_ids[candidate]]
+        return list(self.column_suffixes.get(name.lower(), []))
+
+    def direct_consumers(self, name):
+        return [(self.nodes[consumer_id], self.kinds[consumer_id])
+                for node_id in self.resolve(name) for consumer_id in self.consumers[node_id]]
+
+    # Transitive downstream set as (name, kind, depth), breadth-first: each node is reported once, at its
+    # shortest distance from the sources, so max_depth keeps exactly the nodes within that many hops
+    def downstream(self, name, max_depth=None, stats=None):
+        if stats is None:
+            stats = TraversalStats()
+        frontier = list(dict.fromkeys(self.resolve(name)))
+        seen = set(frontier)
+        stats.nodes_visited += len(frontier)
+        found = []
+        depth = 0
+        while frontier:
+            if max_depth is not None and depth >= max_depth:
+                stats.depth_capped += sum(1 for node_id in frontier if self.consumers[node_id])
+                break
+            depth += 1
+            next_frontier = []
+            for node_id in frontier:
+                for consumer_id in self.consumers[node_id]:
+                    if consumer_id not in seen:
+                        seen.add(consumer_id)
+                        next_frontier.append(consumer_id)
+                        found.append((self.nodes[consumer_id], self.kinds[consumer_id], depth))
+            stats.nodes_visited += len(next_frontier)
+            frontier = next_frontier
+        return found
+
+# Build the index from the lineage CSV and, when it exists, the stitched Tableau lineage
+def build_downstream_index(csv_path='dbt_manifest_extracted_data_with_lineage.csv',
+                           combined_path='combined_lineage.json', df=None):
+    lineage_index = build_lineage_index(read_csv_data(csv_path) if df is None else df)
+    combined_lineage = None
+    if combined_path and os.path.exists(combined_path):
+        with open(combined_path, 'r') as file:
+            combined_lineage = json.load(file)
+    return DownstreamIndex.build(lineage_index, combined_lineage)
+
+def main():
+    parser = argparse.ArgumentParser(description='Downstream impact analysis over column and Tableau lineage')
+    parser.add_argument('--index', default=os.getenv('downstream_index_path', 'downstream_index.json'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='build the index from the lineage CSV and Tableau output')
+    build_parser.add_argument('--csv', default='dbt_manifest_extracted_data_with_lineage.csv')
+    build_parser.add_argument('--combined', default='combined_lineage.json')
+
+    query_parser = subparsers.add_parser('query', help='list everything downstream of a column')
+    query_parser.add_argument('name', help='"model.column", "table.column" of a source, or a Tableau node name')
+    query_parser.add_argument('--direct', action='store_true', help='direct consumers only')
+    query_parser.add_argument('--max-depth', type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        index = build_downstream_index(args.csv, args.combined)
+        index.save(args.index)
+        print(f"Downstream index with {len(index.nodes)} nodes written to {args.index} "
+              f"in {time.perf_counter() - start:.2f}s")
+        return
+
+    index = DownstreamIndex.load(args.index)
+    if not index.resolve(args.name):
+        parser.exit(1, f"No lineage node named {args.name}\n")
+    start = time.perf_counter()
+    if args.direct:
+        results = [(name, kind, 1) for name, kind in index.direct_consumers(args.name)]
+    else:
+        results = index.downstream(args.name, args.max_depth)
+    elapsed = time.perf_counter() - start
+    for name, kind, depth in results:
+        print(f"{'  ' * (depth - 1)}{name} ({kind})")
+    print(f"{len(results)} downstream nodes in {elapsed * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+# Minimal OpenAI-compatible /v1/chat/completions server for exercising the resolver offline.
+# It answers in the lineage response format after a configurable latency and fails a share of
+# requests with 429 or 500 so retries and backoff can be observed.
+
+def fake_lineage_answer(prompt):
+    # Batched prompts list their columns under "Column Names:"; answer one line per column
+    batch_match = re.search(r"Column Names:\n((?:- .*\n?)+)", prompt)
+    if batch_match:
+        column_names = [line[2:].strip() for line in batch_match.group(1).splitlines() if line.startswith('- ')]
+        return '\n'.join(
+            f"Column: {column_name} | Upstream Column(s): [{column_name.lower()}] | "
+            f"Upstream Table(s): [upstream_model] | Reasoning: one to one mapping."
+            for column_name in column_names
+        )
+
+    column_match = re.search(r"Column Name: (.*)", prompt)
+    column_name = column_match.group(1).strip() if column_match else 'unknown'
+    return (f"Upstream Column(s): [{column_name.lower()}], Upstream Table(s): [upstream_model], "
+            f"Reasoning: one to one mapping.")
+
+def fake_json_lineage_answer(prompt):
+    column_match = re.search(r"Column Name: (.*)", prompt)
+    column_name = column_match.group(1).strip() if column_match else 'unknown'
+    return json.dumps({'upstream': [{'table': 'upstream_model', 'column': column_name.lower()}],
+                       'reasoning': 'one to one mapping'})
+
+class FakeCompletionServer:
+    def __init__(self, latency=0.05, error_rate=0.0, answer=fake_lineage_answer, host='127.0.0.1', port=0,
+                 malformed_rate=0.0, json_answer=fake_json_lineage_answer):
+        self.latency = latency
+        self.error_rate = error_rate
+        # Share of successful answers cut off mid-way, as a model hitting max_tokens would return them
+        self.malformed_rate = malformed_rate
+        self.answer = answer
+        self.json_answer = json_answer
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, payload = await self._respond(json.loads(body or b'{}'))
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\ncontent-type: application/json\r\ncontent-length: {len(data)}\r\n"
+                    f"retry-after: 0\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            self.errors += 1
+            status = random.choice(['429 Too Many Requests', '500 Internal Server Error'])
+            return status, {'error': {'message': 'injected failure', 'type': 'fake_error'}}
+
+        prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+        # Requests with a response_format get the structured answer
+        content = self.json_answer(prompt) if request.get('response_format') else self.answer(prompt)
+        if random.random() < self.malformed_rate:
+            content = content[:len(content) // 2]
+        self.prompt_tokens += len(prompt) // 4
+        self.completion_tokens += len(content) // 4
+        return '200 OK', {
+            'id': f"chatcmpl-fake-{self.requests}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': len(prompt) // 4,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': len(prompt) // 4 + len(content) // 4,
+            },
+        }
+
+# Run a server on a background event loop, for callers that drive their own asyncio.run()
+def start_in_thread(**kwargs):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(FakeCompletionServer(**kwargs).start(), loop).result()
+
+async def serve_forever(latency, error_rate, port):
+    server = await FakeCompletionServer(latency=latency, error_rate=error_rate, port=port).start()
+    print(f"Fake completion server listening on {server.base_url}")
+    await asyncio.Event().wait()
+
+def main():
+    parser = argparse.ArgumentParser(description='Local fake OpenAI chat completion server')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per completion')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests failing with 429/500')
+    args = parser.parse_args()
+    asyncio.run(serve_forever(args.latency, args.error_rate, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
-import hashlib
+import argparse
+import re
 import pandas as pd
 import snowflake.connector
 import openai
 import os
+import time
+from async_resolver import estimate_tokens, make_openai_complete, resolve_prompts
+from lineage_cache import cache_key, open_cache
+from llm_telemetry import close_telemetry, get_telemetry
+from lineage_invalidation import column_sets, downstream_models, find_invalidated_columns, load_model_graph
+from reachability_index import ReachabilityIndex, lineage_edges
+from run_journal import RunJournal
+from prompt_budget import ReferenceIndex, fit_reference
+from structured_output import (JSON_MAX_TOKENS, JSON_RESPONSE_INSTRUCTIONS, RESPONSE_FORMAT, ResponseStats,
+                               parse_json_lineage)
+from lineage_sinks import (COLUMN_LINEAGE_COLUMNS, COLUMN_LINEAGE_GENAI_COLUMNS, BatchedWriter, get_sink,
+                           use_configured_context)
+from static_lineage import load_schema, resolve_records
 from dotenv import load_dotenv
 
 
@@ -26,22 +40,186 @@ def connect_to_snowflake():
     return conn
 
 # Step 2: Load Data from Snowflake
-def load_data_from_snowflake(conn):
-    query_lineage = "SELECT * FROM COLUMN_LINEAGE"
-    query_lineage_genai = "SELECT * FROM COLUMN_LINEAGE_GENAI"
+# Column rows are read from COLUMN_LINEAGE, or from the COLUMN_LINEAGE_V view when read_manifest_catalog
+# loads the normalized layout (storage_layout=normalized) instead
+def lineage_source_table():
+    return 'COLUMN_LINEAGE_V' if os.getenv('storage_layout', 'denormalized') == 'normalized' else 'COLUMN_LINEAGE'
+
+# Keys of column rows that are missing from COLUMN_LINEAGE_GENAI or whose SQL hash changed.
+# Rows written before SQL_HASH existed fall back to hashing the SQL in Snowflake.
+CHANGED_KEYS_CTE = """
+WITH changed AS (
+    SELECT l.UNIQUE_KEY, IFF(g.UNIQUE_KEY IS NULL, 'new', 'changed') AS CHANGE_TYPE
+    FROM {source} l
+    LEFT JOIN COLUMN_LINEAGE_GENAI g ON g.UNIQUE_KEY = l.UNIQUE_KEY
+    WHERE l.REFERENCE IS NOT NULL
+      AND (g.UNIQUE_KEY IS NULL
+           OR COALESCE(l.SQL_HASH, MD5(NULLIF(l.SQL, '')), '') <> COALESCE(g.SQL_HASH, MD5(NULLIF(g.SQL, '')), ''))
+)
+"""
+
+# Any row in the column table; an empty one (e.g. a load that failed after its TRUNCATE) can't tell
+# which columns were dropped
+SOURCE_HAS_ROWS_QUERY = "SELECT 1 FROM {source} LIMIT 1"
+
+# Resolved rows whose model no longer has the column (dropped or renamed)
+REMOVED_COLUMNS_QUERY = """
+SELECT g.UNIQUE_KEY, g.TABLE_NAME, g.COLUMN_NAME
+FROM COLUMN_LINEAGE_GENAI g
+WHERE NOT EXISTS (
+    SELECT 1 FROM {source} l
+    WHERE l.TABLE_NAME = g.TABLE_NAME AND LOWER(l.COLUMN_NAME) = LOWER(g.COLUMN_NAME)
+)
+"""
+
+# The given resolved rows, unless their column has come back upstream since they were found
+DELETE_DROPPED_COLUMNS = """
+DELETE FROM COLUMN_LINEAGE_GENAI
+WHERE UNIQUE_KEY IN ({keys})
+  AND NOT EXISTS (
+    SELECT 1 FROM {source} l
+    WHERE l.TABLE_NAME = COLUMN_LINEAGE_GENAI.TABLE_NAME
+      AND LOWER(l.COLUMN_NAME) = LOWER(COLUMN_LINEAGE_GENAI.COLUMN_NAME)
+)
+"""
+
+# Fetch a query result as a DataFrame, through Arrow batches when the pandas extras are installed
+def fetch_dataframe(cursor, query, params=None):
+    cursor.execute(query, params)
+    try:
+        return cursor.fetch_pandas_all()
+    except (snowflake.connector.errors.NotSupportedError, snowflake.connector.errors.ProgrammingError):
+        return pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+
+# Resolved rows (UNIQUE_KEY, TABLE_NAME, COLUMN_NAME) whose column no longer exists upstream. Nothing is
+# reported while the column table is empty, since every resolved row would look dropped.
+def find_removed_columns(cursor):
+    source = lineage_source_table()
+    cursor.execute(SOURCE_HAS_ROWS_QUERY.format(source=source))
+    if cursor.fetchone() is None:
+        print(f"WARNING: {source} is empty; skipping dropped-column detection")
+        return pd.DataFrame(columns=['UNIQUE_KEY', 'TABLE_NAME', 'COLUMN_NAME'])
+    return fetch_dataframe(cursor, REMOVED_COLUMNS_QUERY.format(source=source))
+
+# Keys of resolved rows made stale by the removed columns, with the reason for each. Only the resolved rows
+# of the models directly downstream of them come back from Snowflake. The model graph comes from
+# manifest.json; without one, invalidation is skipped.
+def find_upstream_invalidations(cursor, removed):
+    if removed.empty:
+        return {}
+    manifest_path = os.getenv('manifest_path', 'manifest.json')
+    if not os.path.exists(manifest_path):
+        print(f"WARNING: {manifest_path} not found; skipping upstream invalidation")
+        return {}
+    removed_columns = column_sets(zip(removed['TABLE_NAME'], removed['COLUMN_NAME']))
+
+    graph = load_model_graph(manifest_path)
+    downstream = downstream_models(graph)
+    downstream_tables = sorted({table_name for upstream_key in removed_columns
+                                for table_name in downstream.get(upstream_key, [])})
+    if not downstream_tables:
+        return {}
+    resolved = fetch_where_in(cursor, "SELECT UNIQUE_KEY, TABLE_NAME, UPSTREAM_TABLE, UPSTREAM_COLUMN "
+                                      "FROM COLUMN_LINEAGE_GENAI", 'TABLE_NAME', downstream_tables)
+    return find_invalidated_columns(
+        graph,
+        removed_columns,
+        zip(resolved['UNIQUE_KEY'], resolved['TABLE_NAME'], resolved['UPSTREAM_TABLE'], resolved['UPSTREAM_COLUMN']),
+    )
+
+# Rows of query whose column is one of values, a bounded IN list at a time
+def fetch_where_in(cursor, query, column, values, batch_size=1000):
+    values = list(values)
+    frames = [
+        fetch_dataframe(cursor, f"{query} WHERE {column} IN "
+                                f"({', '.join(['%s'] * len(values[start:start + batch_size]))})",
+                        values[start:start + batch_size])
+        for start in range(0, len(values), batch_size)
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+# Full column rows for the given keys
+def fetch_rows_by_key(cursor, unique_keys):
+    return fetch_where_in(cursor, f"SELECT * FROM {lineage_source_table()}", 'UNIQUE_KEY', unique_keys)
+
+# Delete the resolved rows find_removed_columns reported, a bounded IN list at a time. Runs after the
+# write-back, so a run stopped earlier still finds the removed columns (and the rows they invalidate) the
+# next time.
+def delete_dropped_columns(conn, unique_keys, batch_size=1000):
+    unique_keys = list(unique_keys)
+    if not unique_keys:
+        return 0
+    cursor = conn.cursor()
+    use_configured_context(cursor)
+    deleted = 0
+    for start in range(0, len(unique_keys), batch_size):
+        keys = unique_keys[start:start + batch_size]
+        cursor.execute(DELETE_DROPPED_COLUMNS.format(keys=', '.join(['%s'] * len(keys)),
+                                                     source=lineage_source_table()), keys)
+        deleted += cursor.rowcount
+    conn.commit()
+    cursor.close()
+    print(f"Deleted lineage of {deleted} dropped columns")
+    return deleted
 
-    df_lineage = pd.read_sql(query_lineage, conn)
-    df_lineage_genai = pd.read_sql(query_lineage_genai, conn)
+def load_data_from_snowflake(conn):
+    cursor = conn.cursor()
+    start = time.perf_counter()
+
+    # Diff entirely in Snowflake: only keys come back
+    source = lineage_source_table()
+    changed_keys = CHANGED_KEYS_CTE.format(source=source)
+    df_keys = fetch_dataframe(cursor, changed_keys + "SELECT UNIQUE_KEY, CHANGE_TYPE FROM changed")
+    diff_seconds = time.perf_counter() - start
+
+    # Fetch full rows only for the keys that need resolving
+    if df_keys.empty:
+        df_lineage = pd.DataFrame(columns=[column.upper() for column in COLUMN_LINEAGE_COLUMNS] + ['CHANGE_TYPE'])
+    else:
+        df_lineage = fetch_dataframe(cursor, changed_keys + f"""
+        SELECT l.*, changed.CHANGE_TYPE
+        FROM {source} l
+        JOIN changed ON changed.UNIQUE_KEY = l.UNIQUE_KEY
+        """)
+
+    # Rows whose own SQL is unchanged but whose lineage points at columns an upstream model no longer has
+    removed = find_removed_columns(cursor)
+    if os.getenv('upstream_invalidation', 'true').lower() not in ('0', 'false', 'no'):
+        invalidated = find_upstream_invalidations(cursor, removed)
+        for unique_key in df_keys['UNIQUE_KEY']:
+            invalidated.pop(unique_key, None)
+        for unique_key, reason in invalidated.items():
+            print(f"Invalidated {unique_key}: {reason}")
+        if invalidated:
+            df_upstream = fetch_rows_by_key(cursor, invalidated).assign(CHANGE_TYPE='upstream')
+            df_lineage = pd.concat([df_lineage, df_upstream[df_upstream['REFERENCE'].notna()]], ignore_index=True)
+        print(f"Upstream invalidation: {len(invalidated)} columns")
+    cursor.close()
 
-    # Filter out rows where reference column is null
-    df_lineage = df_lineage[df_lineage['REFERENCE'].notna()]
+    transferred_bytes = (df_keys.memory_usage(deep=True).sum() + df_lineage.memory_usage(deep=True).sum())
+    print(f"Change detection: {len(df_keys)} keys in {diff_seconds:.2f}s, "
+          f"fetched {len(df_lineage)} rows ({transferred_bytes / 1024:.1f} KiB) in "
+          f"{time.perf_counter() - start:.2f}s")
 
-    return df_lineage, df_lineage_genai
+    new_records = df_lineage[df_lineage['CHANGE_TYPE'] == 'new']
+    changed_records = df_lineage[df_lineage['CHANGE_TYPE'] != 'new']
+    return new_records, changed_records, list(removed['UNIQUE_KEY'])
 
 # Step 3: Send Prompt to OpenAI for Lineage Information
-def get_column_lineage_from_openai(table_name, column_name, reference, sql):
+LLM_MODEL = "gpt-4o-mini"
+
+# Bump when a prompt template changes so cached answers from the old prompt are not reused
+PROMPT_VERSION = 2
+
+# Legacy free-text answer format, scraped by parse_openai_response
+TEXT_RESPONSE_INSTRUCTIONS = (
+    "Your response should adhere to the following format:\n"
+    "Response Format should be like this: Upstream Column(s): [list the most likely upstream Column(s)], Upstream Table(s): [Table related to Upstream column], Reasoning: [Short one-liner transformation rule which is applied on this column, if no transformation then its a one to one mapping.]"
+)
+
+def build_lineage_prompt(table_name, column_name, reference, sql, response_instructions=TEXT_RESPONSE_INSTRUCTIONS):
     # Construct the prompt for OpenAI
-    prompt = (
+    return (
         f"Analyze the following column and determine its most likely upstream column(s) based on the provided information. "
         f"You must parse the SQL code and use your reasoning to find the primary source table for the column of interest.\n\n"
         f"Model: {table_name}\n\n"
@@ -54,13 +232,65 @@ def get_column_lineage_from_openai(table_name, column_name, reference, sql):
         f"- If the same column name appears in multiple upstream tables, determine the true source by examining which table it was originally selected from or joined on.\n"
         f"- If the column is not calculated, it should have a single source table. Use this knowledge to deduce the correct lineage.\n"
         f"- If a column is present in multiple upstream tables, consider typical naming conventions, data transformations, and table relationships to identify the most likely source.\n\n"
-        f"Your response should adhere to the following format:\n"
-        f"Response Format should be like this: Upstream Column(s): [list the most likely upstream Column(s)], Upstream Table(s): [Table related to Upstream column], Reasoning: [Short one-liner transformation rule which is applied on this column, if no transformation then its a one to one mapping.]"
+        f"{response_instructions}"
     )
 
+_reference_index = None
+
+# Structured reference columns from manifest.json / catalog.json, loaded once; None when they aren't there
+def get_reference_index():
+    global _reference_index
+    if _reference_index is None:
+        manifest_path = os.getenv('manifest_path', 'manifest.json')
+        catalog_path = os.getenv('catalog_path', 'catalog.json')
+        exists = os.path.exists(manifest_path) and os.path.exists(catalog_path)
+        _reference_index = ReferenceIndex(manifest_path, catalog_path) if exists else False
+    return _reference_index or None
+
+# Token budget single-column prompts are fitted to; None when llm_prune_reference=false sends them whole
+def prompt_token_budget():
+    if os.getenv('llm_prune_reference', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    return int(os.getenv('llm_prompt_token_budget', '4000'))
+
+# Single-column prompt fitted to the token budget; returns (prompt, tokens before, tokens after)
+def build_budgeted_lineage_prompt(table_name, column_name, reference, sql,
+                                  response_instructions=TEXT_RESPONSE_INSTRUCTIONS):
+    token_budget = prompt_token_budget()
+    if token_budget is None:
+        prompt = build_lineage_prompt(table_name, column_name, reference, sql, response_instructions)
+        return prompt, estimate_tokens(prompt), estimate_tokens(prompt)
+    reference_index = get_reference_index()
+    return fit_reference(
+        lambda fitted_reference, fitted_sql: build_lineage_prompt(table_name, column_name, fitted_reference,
+                                                                  fitted_sql, response_instructions),
+        reference, sql, column_name, token_budget,
+        reference_index.columns(table_name, reference) if reference_index is not None else None
+    )
+
+# One chat completion, recorded in the run's LLM telemetry (failed calls included)
+def create_completion(label, mode, attempt=0, **kwargs):
+    telemetry = get_telemetry()
+    start = time.perf_counter()
+    try:
+        response = openai.chat.completions.create(model=LLM_MODEL, **kwargs)
+    except Exception as error:
+        telemetry.record(label, LLM_MODEL, latency=time.perf_counter() - start, attempt=attempt, status='error',
+                         error=f"{type(error).__name__}: {error}", mode=mode)
+        raise
+    telemetry.record(label, LLM_MODEL, latency=time.perf_counter() - start, attempt=attempt, mode=mode,
+                     prompt_tokens=response.usage.prompt_tokens if response.usage else 0,
+                     completion_tokens=response.usage.completion_tokens if response.usage else 0)
+    return response
+
+def get_column_lineage_from_openai(table_name, column_name, reference, sql, stats=None):
+    prompt, tokens_before, tokens_after = build_budgeted_lineage_prompt(table_name, column_name, reference, sql)
+    print(f"Prompt tokens for {table_name}.{column_name}: {tokens_before} -> {tokens_after}")
+
     # Send the prompt to OpenAI
-    response = openai.chat.completions.create(
-        model="gpt-4o-mini",
+    start = time.perf_counter()
+    response = create_completion(
+        f"{table_name}.{column_name}", 'text',
         messages=[
             {"role": "user", "content": prompt}
         ],
@@ -68,96 +298,400 @@ def get_column_lineage_from_openai(table_name, column_name, reference, sql):
         temperature=0.5
     )
 
+    if stats is not None:
+        stats.record_call(time.perf_counter() - start, response.usage.completion_tokens if response.usage else 0)
+
     response_text = response.choices[0].message.content.strip()
     print(f"Response received from LLM:\n{response_text}\n")  # Print the response from the LLM
 
     return response_text
 
-# Step 4: Process and Insert/Update Records
-def process_and_update_records(conn, df_lineage, df_lineage_genai):
-
-    # Get environment variables
-    warehouse = os.getenv('warehouse')
-    database = os.getenv('database')
-    schema = os.getenv('schema')
-
-    cursor = conn.cursor()
-    # Use environment variables in SQL commands
-    cursor.execute(f"USE WAREHOUSE {warehouse};")  # Explicitly set the warehouse
-    cursor.execute(f"USE DATABASE {database};")
-    cursor.execute(f"USE SCHEMA {schema};")
-
-
-
-    # Set index for df_lineage_genai
-    df_lineage_genai = df_lineage_genai.set_index('UNIQUE_KEY', drop=False)
-
-    df_lineage = df_lineage.set_index('UNIQUE_KEY', drop=False)
-
-    # Identify records to insert (UNIQUE_KEY not present in df_lineage_genai)
-    new_records = df_lineage[~df_lineage['UNIQUE_KEY'].isin(df_lineage_genai.index)]
-
-    # Compute MD5 hash of the SQL column for df_lineage before using it
-    df_lineage['SQL_MD5'] = df_lineage['SQL'].apply(
-      lambda x: hashlib.md5(x.encode()).hexdigest() if pd.notnull(x) else ''
+# Structured mode: a JSON answer checked by a strict validator, re-requested once if malformed
+def get_column_lineage_json(table_name, column_name, reference, sql, stats):
+    prompt, tokens_before, tokens_after = build_budgeted_lineage_prompt(table_name, column_name, reference, sql,
+                                                                        JSON_RESPONSE_INSTRUCTIONS)
+    print(f"Prompt tokens for {table_name}.{column_name}: {tokens_before} -> {tokens_after}")
+    for attempt in range(2):
+        start = time.perf_counter()
+        response = create_completion(
+            f"{table_name}.{column_name}", 'json', attempt,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=JSON_MAX_TOKENS,
+            temperature=0.5,
+            response_format=RESPONSE_FORMAT
+        )
+        stats.record_call(time.perf_counter() - start, response.usage.completion_tokens if response.usage else 0)
+        lineage = parse_json_response(response.choices[0].message.content, stats)
+        if not isinstance(lineage, ValueError) or attempt:
+            return lineage
+        stats.retries += 1
+
+def parse_json_response(response, stats):
+    try:
+        return parse_json_lineage(response)
+    except ValueError as error:
+        stats.parse_failures += 1
+        return error
+
+# Batched mode: one request covers many columns of the same model
+def build_model_lineage_prompt(table_name, column_names, reference, sql):
+    column_list = '\n'.join(f"- {column_name}" for column_name in column_names)
+    return (
+        f"Analyze the following columns and determine the most likely upstream column(s) of each one based on the provided information. "
+        f"You must parse the SQL code and use your reasoning to find the primary source table for every column of interest.\n\n"
+        f"Model: {table_name}\n\n"
+        f"Column Names:\n{column_list}\n\n"
+        f"Upstream Models and their columns: {reference}\n\n"
+        f"SQL Code used to build the table:\n{sql}\n\n"
+        f"Important Instructions:\n"
+        f"- Carefully parse the SQL code to determine which table each column of interest is sourced from.\n"
+        f"- Focus on identifying the primary source table by analyzing the joins, where clauses, and select statements.\n"
+        f"- If the same column name appears in multiple upstream tables, determine the true source by examining which table it was originally selected from or joined on.\n"
+        f"- If a column is not calculated, it should have a single source table. Use this knowledge to deduce the correct lineage.\n"
+        f"- If a column is present in multiple upstream tables, consider typical naming conventions, data transformations, and table relationships to identify the most likely source.\n\n"
+        f"Your response should adhere to the following format, with exactly one line per column and nothing else:\n"
+        f"Column: [column name] | Upstream Column(s): [list the most likely upstream Column(s)] | Upstream Table(s): [Table related to Upstream column] | Reasoning: [Short one-liner transformation rule which is applied on this column, if no transformation then its a one to one mapping.]"
     )
 
-    df_lineage_genai['SQL_MD5'] = df_lineage_genai['SQL'].apply(
-      lambda x: hashlib.md5(x.encode()).hexdigest() if pd.notnull(x) else ''
+# Output tokens reserved per column in a batched response
+BATCH_OUTPUT_TOKENS_PER_COLUMN = 80
+
+# Split a model's columns into requests that fit the context budget
+def chunk_columns(table_name, column_names, reference, sql, context_tokens, max_columns):
+    base_tokens = estimate_tokens(build_model_lineage_prompt(table_name, [], reference, sql))
+    chunks = []
+    current = []
+    current_tokens = base_tokens
+    for column_name in column_names:
+        column_tokens = estimate_tokens(f"- {column_name}\n") + BATCH_OUTPUT_TOKENS_PER_COLUMN
+        if current and (current_tokens + column_tokens > context_tokens or len(current) >= max_columns):
+            chunks.append(current)
+            current = []
+            current_tokens = base_tokens
+        current.append(column_name)
+        current_tokens += column_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+# Map a batched response back to {lowercase column name: (upstream_tables, upstream_columns, reasoning)}
+def parse_batched_response(response):
+    results = {}
+    for line in re.split(r"(?im)^\s*Column:\s*", response):
+        if '|' not in line:
+            continue
+        column_name, _, rest = line.partition('|')
+        column_name = column_name.strip().strip('[]').strip()
+        # Reuse the single-column parser on this column's segment
+        results[column_name.lower()] = parse_openai_response(rest.replace('|', ','))
+    return results
+
+def get_model_lineage_from_openai(prompt, column_count, label=None):
+    response = create_completion(
+        label, 'model',
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=min(16000, column_count * BATCH_OUTPUT_TOKENS_PER_COLUMN * 2),
+        temperature=0.5
     )
+    response_text = response.choices[0].message.content.strip()
+    print(f"Response received from LLM for {column_count} columns:\n{response_text}\n")
+    return response_text
 
-    # Ensure both UNIQUE_KEY columns are strings for consistent comparison
-    df_lineage['UNIQUE_KEY'] = df_lineage['UNIQUE_KEY'].astype(str)
-    df_lineage_genai['UNIQUE_KEY'] = df_lineage_genai['UNIQUE_KEY'].astype(str)
+# Call on_result for a subset of records with positions mapped back to the full record list
+def remap_positions(on_result, positions):
+    if on_result is None:
+        return None
+    return lambda position, result: on_result(positions[position], result)
+
+_static_schema = None
+
+# sqlglot schema from catalog.json for the static resolver, loaded once and shared by every write-back batch
+def get_static_schema():
+    global _static_schema
+    if _static_schema is None:
+        _static_schema = load_schema(os.getenv('catalog_path', 'catalog.json'))
+    return _static_schema
+
+# Resolve one (upstream_tables, upstream_columns, reasoning) per record, in record order.
+# on_result, when given, is called with (record position, result) as soon as each result is known.
+def resolve_lineage(records, on_result=None):
+    if os.getenv('static_lineage', 'true').lower() in ('0', 'false', 'no') or records.empty:
+        return resolve_lineage_llm(records, on_result)
+
+    # Fast path: trace columns through the SQL with sqlglot, catalog.json supplying the schema
+    static_results, static_seconds = resolve_records(records, get_static_schema())
+    unresolved = [position for position, result in enumerate(static_results) if result is None]
+    if on_result is not None:
+        for position, result in enumerate(static_results):
+            if result is not None:
+                on_result(position, result)
+
+    # Only the columns the parser couldn't resolve go to the LLM
+    llm_start = time.perf_counter()
+    llm_results = resolve_lineage_llm(records.iloc[unresolved], remap_positions(on_result, unresolved)) \
+        if unresolved else []
+    llm_seconds = time.perf_counter() - llm_start
+    for position, result in zip(unresolved, llm_results):
+        static_results[position] = result
+
+    static_count = len(records) - len(unresolved)
+    print(f"Lineage for {len(records)} columns: {static_count} static in {static_seconds:.2f}s, "
+          f"{len(unresolved)} LLM in {llm_seconds:.2f}s")
+    return static_results
+
+# LLM path behind the response cache: only cache misses are sent to the API
+def resolve_lineage_llm(records, on_result=None):
+    if records.empty:
+        return request_lineage_from_llm(records, on_result)
+    cache = open_cache()
+    # API calls are stamped with the cache status; hits are recorded below
+    telemetry = get_telemetry()
+    telemetry.cache_status = 'off' if cache is None else 'bypass' if cache.bypass else 'miss'
+    if cache is None:
+        return request_lineage_from_llm(records, on_result)
 
-    # Now you can proceed with identifying records to update
-    common_keys = df_lineage['UNIQUE_KEY'][
-      df_lineage['UNIQUE_KEY'].isin(df_lineage_genai.index)
-    ]
-    changed_records = df_lineage.loc[
-        common_keys[
-            df_lineage.loc[common_keys, 'SQL_MD5']
-            != df_lineage_genai.loc[common_keys, 'SQL_MD5']
-        ]
-    ]
+    try:
+        prompt_version = (f"{os.getenv('llm_batch_mode', 'column')}-{os.getenv('llm_response_format', 'text')}"
+                          f"-v{PROMPT_VERSION}")
+        # The budget decides how much of the reference and SQL the prompt kept, so it is part of the key
+        token_budget = prompt_token_budget()
+        keys = [cache_key(prompt_version, row['TABLE_NAME'], row['SQL'], row['COLUMN_NAME'], row['REFERENCE'],
+                          LLM_MODEL, token_budget)
+                for index, row in records.iterrows()]
+        results = cache.get_many(keys)
+        missed = [position for position, result in enumerate(results) if result is None]
+
+        telemetry.record_cache_hits([label for label, result in zip(column_labels(records), results)
+                                     if result is not None], LLM_MODEL)
+
+        if on_result is not None:
+            for position, result in enumerate(results):
+                if result is not None:
+                    on_result(position, result)
+
+        # Each answer is cached as it arrives, so an interrupted run keeps everything it paid for
+        def store(position, result):
+            results[position] = result
+            # Failed requests are not cached so the next run retries them
+            if not isinstance(result, Exception):
+                cache.put_many([(keys[position], result)])
+            if on_result is not None:
+                on_result(position, result)
+
+        if missed:
+            request_lineage_from_llm(records.iloc[missed], remap_positions(store, missed))
+
+        print(f"LLM cache: {cache.hits} hits, {cache.misses} misses")
+        return results
+    finally:
+        cache.close()
+
+# Telemetry labels for single-column requests
+def column_labels(records):
+    return [f"{table_name}.{column_name}" for table_name, column_name in zip(records['TABLE_NAME'], records['COLUMN_NAME'])]
+
+# Batched requests only have the free-text answer format, so JSON answers need single-column requests
+def check_llm_settings():
+    if os.getenv('llm_batch_mode', 'column') == 'model' and os.getenv('llm_response_format', 'text') == 'json':
+        raise ValueError("llm_response_format=json is not supported with llm_batch_mode=model; "
+                         "use llm_batch_mode=column or llm_response_format=text")
+
+def request_lineage_from_llm(records, on_result=None):
+    check_llm_settings()
+    if os.getenv('llm_batch_mode', 'column') == 'model':
+        return resolve_lineage_batched(records, on_result)
+    if os.getenv('llm_response_format', 'text') == 'json':
+        return request_json_lineage_from_llm(records, on_result)
+
+    stats = ResponseStats('text')
+    concurrency = int(os.getenv('llm_concurrency', '1'))
+    results = [None] * len(records)
+
+    def finish(position, response):
+        results[position] = response if isinstance(response, Exception) else parse_openai_response(response)
+        if on_result is not None:
+            on_result(position, results[position])
+
+    if concurrency <= 1:
+        for position, (index, row) in enumerate(records.iterrows()):
+            finish(position, get_column_lineage_from_openai(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCE'],
+                                                            row['SQL'], stats))
+    else:
+        # Concurrent path: rate-limited asyncio workers with retries (see async_resolver.py)
+        budgeted = [build_budgeted_lineage_prompt(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCE'], row['SQL'])
+                    for index, row in records.iterrows()]
+        print(f"Prompt tokens before/after pruning: {sum(before for _, before, _ in budgeted)} -> "
+              f"{sum(after for _, _, after in budgeted)}")
+        resolve_prompts([prompt for prompt, _, _ in budgeted], make_openai_complete(model=LLM_MODEL, stats=stats),
+                        telemetry=get_telemetry(), labels=column_labels(records), mode='text', on_result=finish)
+
+    # The regex parser never fails loudly; an answer with neither upstream field is a parse failure
+    stats.parse_failures = sum(1 for result in results if not isinstance(result, Exception) and not any(result[:2]))
+    stats.report()
+    return results
+
+def request_json_lineage_from_llm(records, on_result=None):
+    stats = ResponseStats('json')
+    concurrency = int(os.getenv('llm_concurrency', '1'))
+    if concurrency <= 1:
+        results = []
+        for position, (index, row) in enumerate(records.iterrows()):
+            results.append(get_column_lineage_json(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCE'], row['SQL'],
+                                                   stats))
+            if on_result is not None:
+                on_result(position, results[-1])
+        stats.report()
+        return results
+
+    budgeted = [build_budgeted_lineage_prompt(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCE'], row['SQL'],
+                                              JSON_RESPONSE_INSTRUCTIONS)
+                for index, row in records.iterrows()]
+    print(f"Prompt tokens before/after pruning: {sum(before for _, before, _ in budgeted)} -> "
+          f"{sum(after for _, _, after in budgeted)}")
+    prompts = [prompt for prompt, _, _ in budgeted]
+    labels = column_labels(records)
+    results = [None] * len(prompts)
+    pending = list(range(len(prompts)))
+    # One cheap retry for answers that fail validation
+    for attempt in range(2):
+        malformed = []
+
+        def finish(pending_position, response, pending=pending, attempt=attempt):
+            position = pending[pending_position]
+            results[position] = response if isinstance(response, Exception) else parse_json_response(response, stats)
+            if isinstance(results[position], ValueError) and not attempt:
+                malformed.append(position)
+            elif on_result is not None:
+                on_result(position, results[position])
+
+        resolve_prompts([prompts[position] for position in pending], make_openai_complete(
+            model=LLM_MODEL, max_tokens=JSON_MAX_TOKENS, response_format=RESPONSE_FORMAT, stats=stats),
+            telemetry=get_telemetry(), labels=[labels[position] for position in pending], mode='json',
+            on_result=finish)
+        if not malformed:
+            break
+        malformed.sort()
+        stats.retries += len(malformed)
+        pending = malformed
+
+    stats.report()
+    return results
+
+def resolve_lineage_batched(records, on_result=None):
+    context_tokens = int(os.getenv('llm_context_tokens', '100000'))
+    max_columns = int(os.getenv('llm_max_columns_per_request', '60'))
+    concurrency = int(os.getenv('llm_concurrency', '1'))
+
+    # Build one prompt per model chunk, remembering which record positions it covers
+    prompts = []
+    labels = []
+    positions = []
+    column_counts = []
+    records = records.reset_index(drop=True)
+    for table_name, group in records.groupby('TABLE_NAME', sort=False):
+        first = group.iloc[0]
+        positions_by_column = {}
+        for position, column_name in zip(group.index, group['COLUMN_NAME']):
+            positions_by_column.setdefault(column_name, []).append(position)
+        for chunk in chunk_columns(table_name, list(positions_by_column), first['REFERENCE'], first['SQL'],
+                                   context_tokens, max_columns):
+            prompts.append(build_model_lineage_prompt(table_name, chunk, first['REFERENCE'], first['SQL']))
+            labels.append(f"{table_name}[{len(chunk)} columns]")
+            positions.append({column_name: positions_by_column[column_name] for column_name in chunk})
+            column_counts.append(len(chunk))
+
+    results = [None] * len(records)
+
+    # Columns of a chunk are reported as soon as its answer arrives
+    def finish(chunk, response):
+        parsed = {} if isinstance(response, Exception) else parse_batched_response(response)
+        for column_name, column_positions in positions[chunk].items():
+            result = response if isinstance(response, Exception) else parsed.get(column_name.lower())
+            for position in column_positions:
+                results[position] = result
+                if result is not None and on_result is not None:
+                    on_result(position, result)
+
+    if concurrency <= 1:
+        for chunk, (prompt, column_count, label) in enumerate(zip(prompts, column_counts, labels)):
+            finish(chunk, get_model_lineage_from_openai(prompt, column_count, label))
+    else:
+        resolve_prompts(prompts, make_openai_complete(
+            model=LLM_MODEL,
+            max_tokens=min(16000, max(column_counts, default=1) * BATCH_OUTPUT_TOKENS_PER_COLUMN * 2)),
+            telemetry=get_telemetry(), labels=labels, mode='model', on_result=finish)
+
+    # Columns the batched answer left out fall back to a single-column request
+    for position, result in enumerate(results):
+        if result is None:
+            row = records.iloc[position]
+            results[position] = parse_openai_response(
+                get_column_lineage_from_openai(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCE'], row['SQL']))
+            if on_result is not None:
+                on_result(position, results[position])
+
+    return results
+
+# Split records into batches of about batch_rows rows without splitting a model across batches
+def model_batches(records, batch_rows):
+    batch = []
+    batch_size = 0
+    for table_name, group in records.groupby('TABLE_NAME', sort=False):
+        batch.append(group)
+        batch_size += len(group)
+        if batch_size >= batch_rows:
+            yield pd.concat(batch)
+            batch = []
+            batch_size = 0
+    if batch:
+        yield pd.concat(batch)
 
-    # Process new records
-    for index, row in new_records.iterrows():
-        response = get_column_lineage_from_openai(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCE'], row['SQL'])
-        # Parse response and prepare data for insertion
-        upstream_tables, upstream_columns, reasoning = parse_openai_response(response)
-
-        # Insert new record with additional OpenAI information
-        insert_query = """
-        INSERT INTO COLUMN_LINEAGE_GENAI (UNIQUE_KEY, DATABASE, SCHEMA, TABLE_NAME, COLUMN_NAME, COLUMN_DESCRIPTION,
-                                          RESOURCE_TYPE, NAME, SQL, REFERENCE, UPSTREAM_TABLE, UPSTREAM_COLUMN, REASONING)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        data_to_insert = (row['UNIQUE_KEY'], row['DATABASE'], row['SCHEMA'], row['TABLE_NAME'], row['COLUMN_NAME'],
-                          row['COLUMN_DESCRIPTION'], row['RESOURCE_TYPE'], row['NAME'], row['SQL'], row['REFERENCE'],
-                          upstream_tables, upstream_columns, reasoning)
-        cursor.execute(insert_query, data_to_insert)
-        conn.commit()
-
-
-
-    # Process changed records
-    for index, row in changed_records.iterrows():
-        response = get_column_lineage_from_openai(row['TABLE_NAME'], row['COLUMN_NAME'], row['REFERENCE'], row['SQL'])
-        # Parse response and prepare data for update
-        upstream_tables, upstream_columns, reasoning = parse_openai_response(response)
-
-        # Update the existing record with new OpenAI information
-        update_query = """
-        UPDATE COLUMN_LINEAGE_GENAI
-        SET COLUMN_DESCRIPTION = %s, RESOURCE_TYPE = %s, NAME = %s, SQL = %s, REFERENCE = %s,
-            UPSTREAM_TABLE = %s, UPSTREAM_COLUMN = %s, REASONING = %s
-        WHERE UNIQUE_KEY = %s
-        """
-        data_to_update = (row['COLUMN_DESCRIPTION'], row['RESOURCE_TYPE'], row['NAME'], row['SQL'], row['REFERENCE'],
-                          upstream_tables, upstream_columns, reasoning, row['UNIQUE_KEY'])
-        cursor.execute(update_query, data_to_update)
-        conn.commit()
+# Step 4: Process and Insert/Update Records
+# dropped_keys are the resolved rows of removed columns, deleted once the write-back is done
+def process_and_update_records(conn, pending_records, journal=None, dropped_keys=()):
+    # New and changed records are written the same way: MERGE inserts the new keys and updates the rest
+    batch_rows = int(os.getenv('writeback_batch_rows', '500'))
+    if journal is None:
+        batches = enumerate(model_batches(pending_records, batch_rows))
+    else:
+        # The plan is recorded once; a resumed run continues with the batches it never finished
+        if not journal.is_planned():
+            journal.plan(model_batches(pending_records, batch_rows))
+        batches = journal.batches(pending_records)
+
+    # The write-back defaults to Snowflake on its own: the ingestion load_sink setting doesn't apply here, since
+    # the dropped-column delete and the CSV export below read COLUMN_LINEAGE_GENAI in Snowflake
+    sink = get_sink(conn, load_sink=os.getenv('writeback_sink', 'insert'), table='COLUMN_LINEAGE_GENAI',
+                    columns=[column.upper() for column in COLUMN_LINEAGE_GENAI_COLUMNS], key_column='UNIQUE_KEY')
+    on_flush = None if journal is None else (lambda df: journal.complete(df['UNIQUE_KEY']))
+    with BatchedWriter(sink, batch_rows, on_flush) as writer:
+        # Resolve a batch of whole models at a time (statically where sqlglot can trace the column, otherwise
+        # with the LLM). Each row goes to the writer as soon as its lineage is known, so an interrupted run
+        # has already buffered (and the LLM cache has stored) everything resolved before it.
+        for batch_no, batch in batches:
+            if journal is not None:
+                journal.start_batch(batch_no)
+            rows = [row for index, row in batch.iterrows()]
+
+            def write(position, lineage, rows=rows):
+                row = rows[position]
+                if isinstance(lineage, Exception):
+                    print(f"Skipping {row['UNIQUE_KEY']}: {lineage}")
+                    return
+                upstream_tables, upstream_columns, reasoning = lineage
+                writer.add([row[column.upper()] for column in COLUMN_LINEAGE_COLUMNS]
+                           + [upstream_tables, upstream_columns, reasoning])
+
+            resolve_lineage(batch, write)
+            writer.flush()
+            if journal is not None:
+                journal.report_progress()
+    sink.close()
+    delete_dropped_columns(conn, dropped_keys)
 
     # Query to fetch data from the Snowflake table
     query = "SELECT * FROM column_lineage_genai;"
@@ -168,10 +702,23 @@ def process_and_update_records(conn, df_lineage, df_lineage_genai):
     # Save DataFrame to CSV
     output_file_path = 'dbt_manifest_extracted_data_with_lineage.csv'
     df.to_csv(output_file_path, index=False, encoding='utf-8-sig')
-
-    cursor.close()
-
-import re
+    update_reachability_index(df)
+
+# Bring the reachability index in line with COLUMN_LINEAGE_GENAI; only the columns whose lineage changed
+# (and their descendants) are recomputed
+def update_reachability_index(df):
+    index_path = os.getenv('reachability_index_path', 'lineage_reachability.pickle')
+    if not index_path:
+        return
+    edges = lineage_edges(df)
+    if os.path.exists(index_path):
+        index = ReachabilityIndex.load(index_path)
+        recomputed = index.sync(edges)
+    else:
+        index = ReachabilityIndex.build(edges)
+        recomputed = len(index.names)
+    index.save(index_path)
+    print(f"Reachability index: {recomputed} of {len(index.names)} columns recomputed")
 
 def parse_openai_response(response):
     # Initialize variables to store the extracted values
@@ -205,18 +752,44 @@ def parse_openai_response(response):
 
 # Main Function to Execute the Process
 def main():
+    parser = argparse.ArgumentParser(description='Resolve column lineage for new and changed COLUMN_LINEAGE rows')
+    parser.add_argument('--resume', metavar='RUN_ID', help='continue a stopped run from its journal')
+    args = parser.parse_args()
+    check_llm_settings()
+
     # Connect to Snowflake
     conn = connect_to_snowflake()
 
-    # Load data from Snowflake
-    df_lineage, df_lineage_genai = load_data_from_snowflake(conn)
+    journal = RunJournal(os.getenv('run_journal_path', 'lineage_runs.sqlite'), args.resume)
+    if args.resume:
+        # Skip the diff: fetch exactly the keys the stopped run never wrote back
+        print(f"Resuming run {journal.run_id}, in-flight batches: {journal.in_flight_batches()}")
+        cursor = conn.cursor()
+        use_configured_context(cursor)
+        pending_keys = journal.pending_keys()
+        pending_records = fetch_rows_by_key(cursor, pending_keys) if pending_keys else pd.DataFrame(
+            columns=[column.upper() for column in COLUMN_LINEAGE_COLUMNS])
+        cursor.close()
+        # Dropped columns are left for the next full run, which finds them again
+        dropped_keys = []
+    else:
+        # Load only the new and changed records from Snowflake
+        new_records, changed_records, dropped_keys = load_data_from_snowflake(conn)
+        pending_records = pd.concat([new_records, changed_records])
+        print(f"Run ID: {journal.run_id}")
 
     # Filter for specific tables (for testing purposes)
     #selected_tables = ['model.jaffle_shop.customers']  # Replace with actual table names for testing
-    #df_lineage = df_lineage[df_lineage['TABLE_NAME'].isin(selected_tables)]
+    #pending_records = pending_records[pending_records['TABLE_NAME'].isin(selected_tables)]
 
     # Process and update records
-    process_and_update_records(conn, df_lineage, df_lineage_genai)
+    try:
+        process_and_update_records(conn, pending_records, journal, dropped_keys)
+    finally:
+        # Percentile summary of the LLM calls, also written for Prometheus when configured
+        close_telemetry()
+    journal.finish()
+    journal.close()
 
     # Close Snowflake connection
     conn.close()
@@ -1,5 +1,6 @@
 import json
 import math
+from lineage_traversal import TraversalStats, traversal_limits, walk
 
 # Load combined_lineage data
 def load_data(file_path):
@@ -31,28 +32,29 @@ def create_node(node_list, name, parent_id, node_type, table=None, formula=None,
     })
     return node_id
 
-# Recursively process database lineage
-def process_database_lineage(lineage, parent_id, node_list):
-    model_name = lineage['model']
-    column_name = lineage['column']
-    column_description = clean_value(lineage.get('column Description', None))
-    reasoning = clean_value(lineage.get('reasoning', None))
-    
-    # Create the node for this column, type is Database
-    db_node_id = create_node(
-        node_list, 
-        column_name,  # Store only the column name in the "name" field
-        parent_id, 
-        node_type="Database", 
-        table=model_name,
-        column_description=column_description,
-        reasoning=reasoning
-    )
-    
-    # Process upstream models recursively
-    upstream_models = lineage.get('upstream_models', [])
-    for upstream_model in upstream_models:
-        process_database_lineage(upstream_model, db_node_id, node_list)
+# Process database lineage depth-first, one node per column in the nested upstream_models
+def process_database_lineage(lineage, parent_id, node_list, stats=None):
+    def visit(lineage, parent_id, depth):
+        model_name = lineage['model']
+        column_name = lineage['column']
+        column_description = clean_value(lineage.get('column Description', None))
+        reasoning = clean_value(lineage.get('reasoning', None))
+
+        # Create the node for this column, type is Database
+        return create_node(
+            node_list,
+            column_name,  # Store only the column name in the "name" field
+            parent_id,
+            node_type="Database",
+            table=model_name,
+            column_description=column_description,
+            reasoning=reasoning
+        )
+
+    # Upstream models become child nodes; a column repeated on its own path is cut
+    walk([lineage], lambda lineage: lineage.get('upstream_models', []), visit,
+         key=lambda lineage: (lineage['model'], lineage['column']), parent=parent_id, stats=stats,
+         **traversal_limits())
 
 
 # Recursively process upstream fields
@@ -79,7 +81,7 @@ def handle_upstream_fields(fields, parent_id, node_list):
             
             # If there is database lineage, process it recursively
             if 'database_lineage' in column:
-                process_database_lineage(column['database_lineage'], column_id, node_list)
+                process_database_lineage(column['database_lineage'], column_id, node_list, traversal_stats)
         
         # Process nested upstream fields if present
         if 'upstreamFields' in field:
@@ -113,7 +115,9 @@ def generate_nodes(workbooks):
 data = load_data('combined_lineage.json')
 
 # Generate nodes
+traversal_stats = TraversalStats()
 nodes = generate_nodes(data['workbooks'])
+traversal_stats.report('Database lineage traversal')
 
 # Output the nodes to a file for GoJS visualization
 with open('transformed_lineage.json', 'w') as f:
@@ -1,4 +1,8 @@
+import gzip
+import json
+import os
 import pandas as pd
+from lineage_traversal import PRUNE, TraversalStats, traversal_limits, walk
 
 # Function to read data from the CSV file
 def read_csv_data(file_path):
@@ -16,77 +20,151 @@ def extract_column_name(column_name):
     # Extract the part after the dot, if it exists
     return column_name.split('.')[-1].strip()
 
-# Recursive function to build JSON hierarchy for a given table and column
-def build_hierarchy(df, model_name, column_name):
-    # Convert input model name and column name to lowercase for consistency
-    model_name = model_name.lower().strip()
-    column_name = column_name.lower().strip()
-
-    # Initialize the base structure for the current node
-    base_structure = {
-        "model": model_name,
-        "column": column_name,
-        "column Description": "",
-        "reasoning": "",  # New field for reasoning
-        "upstream_models": []
-    }
-
-    # Safely extract the description and reasoning for the current model and column
-    try:
-        base_structure["column Description"] = df.loc[
-            (df['NAME'] == model_name) & (df['COLUMN_NAME'] == column_name), 'COLUMN_DESCRIPTION'
-        ].values[0]
-    except IndexError:
-        base_structure["column Description"] = "Description not available"
-
-    try:
-        base_structure["reasoning"] = df.loc[
-            (df['NAME'] == model_name) & (df['COLUMN_NAME'] == column_name), 'REASONING'
-        ].values[0]
-    except IndexError:
-        base_structure["reasoning"] = "Reasoning not available"
-
-    # Get the row corresponding to the current model and column
-    current_row = df[(df['NAME'] == model_name) & (df['COLUMN_NAME'] == column_name)]
-
-    if current_row.empty:
-        # If no data is found, return the base structure without upstream models
+# Index the lineage rows once: (model, column) -> (description, reasoning, upstream (model, column) pairs).
+# Like the original mask lookups, the first row of a duplicated (model, column) pair wins.
+def build_lineage_index(df):
+    index = {}
+    for model_name, column_name, description, reasoning, upstream_tables, upstream_columns in zip(
+            df['NAME'], df['COLUMN_NAME'], df['COLUMN_DESCRIPTION'], df['REASONING'],
+            df['UPSTREAM_TABLE'], df['UPSTREAM_COLUMN']):
+        if (model_name, column_name) in index:
+            continue
+        # Adjacency list of the node, normalized the same way build_hierarchy normalizes its arguments
+        index[(model_name, column_name)] = (description, reasoning, upstream_keys(upstream_tables, upstream_columns))
+    return index
+
+# A lineage value as text, '' for NULL: pd.read_sql leaves None in object columns and read_csv leaves NaN,
+# which str() would turn into "none" / "nan" columns
+def field_value(value):
+    return '' if value is None or pd.isna(value) else str(value)
+
+# A column's node name ("model.column", lowercase) in the downstream index, lineage store and reachability
+# index; None when the model or column is missing
+def column_node(model_name, column_name):
+    model_name, column_name = field_value(model_name).lower().strip(), field_value(column_name).lower().strip()
+    if not model_name or not column_name or (model_name, column_name) == ('nan', 'nan'):
+        return None
+    return f"{model_name}.{column_name}"
+
+# Pair each upstream column with its table. UPSTREAM_TABLE may list a table per column or each table once,
+# so a column qualified as "table.column" names its own table; otherwise it takes the table at its position,
+# or the last listed table when there are fewer tables than columns. NULL or empty columns have no upstream,
+# and a NULL table leaves an unqualified column's model empty.
+def upstream_keys(upstream_tables, upstream_columns):
+    tables = field_value(upstream_tables).split(',')
+    keys = []
+    for position, upstream_column in enumerate(field_value(upstream_columns).split(',')):
+        upstream_column = upstream_column.strip()
+        if not upstream_column:
+            continue
+        if '.' in upstream_column:
+            upstream_table = upstream_column.rpartition('.')[0]
+        else:
+            upstream_table = tables[min(position, len(tables) - 1)]
+        keys.append((upstream_table.strip().lower(), extract_column_name(upstream_column).lower().strip()))
+    return keys
+
+# Build the JSON hierarchy of each (model, column) key in one walk over the lineage index.
+# Subtrees are memoized by (model, column) as (structure, height), so a shared upstream subtree is built once
+# and reused. Only subtrees that no cycle or depth cap cut are memoized: those are the same wherever the
+# column is reached, so the output doesn't depend on the order of the walk. A memoized subtree is reused
+# only where it fits under the depth cap; deeper down it is rebuilt and cut like any other.
+def build_hierarchies(index, keys, memo, stats=None):
+    root = {"upstream_models": []}
+    limits = traversal_limits()
+    max_depth = limits['max_depth']
+    # id(structure) -> height of the structure's subtree, for the structures of this walk
+    heights = {}
+
+    def upstream(key):
+        row = index.get(key)
+        return row[2] if row is not None else []
+
+    def visit(key, parent, depth):
+        if key in memo:
+            structure, height = memo[key]
+            if max_depth is None or depth + height <= max_depth:
+                heights[id(structure)] = height
+                parent["upstream_models"].append(structure)
+                return PRUNE
+
+        # Initialize the base structure for the current node
+        base_structure = {
+            "model": key[0],
+            "column": key[1],
+            "column Description": "",
+            "reasoning": "",  # New field for reasoning
+            "upstream_models": []
+        }
+        row = index.get(key)
+        if row is None:
+            # If no data is found, the node has no upstream models
+            base_structure["column Description"] = "Description not available"
+            base_structure["reasoning"] = "Reasoning not available"
+        else:
+            base_structure["column Description"], base_structure["reasoning"], _ = row
+
+        parent["upstream_models"].append(base_structure)
         return base_structure
 
-    # Extract the upstream tables and columns
-    upstream_tables = str(current_row['UPSTREAM_TABLE'].values[0]).split(',')
-    upstream_columns = str(current_row['UPSTREAM_COLUMN'].values[0]).split(',')
-
-    # Iterate over each upstream table and column pair
-    for upstream_table, upstream_column in zip(upstream_tables, upstream_columns):
-        upstream_table = upstream_table.strip()
-        # Extract only the column name after the dot
-        upstream_column_name = extract_column_name(upstream_column.strip())
+    def leave(key, structure, depth, cut):
+        height = max((heights[id(upstream_structure)] + 1 for upstream_structure in structure["upstream_models"]),
+                     default=0)
+        heights[id(structure)] = height
+        if not cut:
+            memo[key] = (structure, height)
 
-        # Build hierarchy for upstream
-        upstream_hierarchy = build_hierarchy(df, upstream_table, upstream_column_name)
-        if upstream_hierarchy:
-            base_structure["upstream_models"].append(upstream_hierarchy)
+    walk(keys, upstream, visit, parent=root, stats=stats, leave=leave, **limits)
+    return root["upstream_models"]
 
-    return base_structure
+# Function to build JSON hierarchy for a given table and column
+def build_hierarchy(df, model_name, column_name, index=None, memo=None, stats=None):
+    if index is None:
+        index = build_lineage_index(df)
+    # Convert input model name and column name to lowercase for consistency
+    key = (model_name.lower().strip(), column_name.lower().strip())
+    return build_hierarchies(index, [key], {} if memo is None else memo, stats)[0]
 
 # Function to build the entire JSON hierarchy for all columns in the DataFrame
-def build_full_hierarchy(df):
-    # Initialize an empty dictionary to store the full hierarchy
-    full_hierarchy = []
-
-    # Iterate through all unique tables and columns in the DataFrame
-    for index, row in df.iterrows():
-        model_name = row['NAME']
-        column_name = extract_column_name(row['COLUMN_NAME'])
-
-        # Build the hierarchy for each model and column
-        hierarchy = build_hierarchy(df, model_name, column_name)
-
-        # Append the hierarchy to the full list
-        full_hierarchy.append(hierarchy)
-
-    return full_hierarchy
+def build_full_hierarchy(df, stats=None):
+    # The index and the memoized subtrees are shared by every row
+    keys = [(model_name.lower().strip(), extract_column_name(column_name).lower().strip())
+            for model_name, column_name in zip(df['NAME'], df['COLUMN_NAME'])]
+    return build_hierarchies(build_lineage_index(df), keys, {}, stats)
+
+# Streaming variant of build_full_hierarchy: yields one root hierarchy at a time, in row order. memo_entries
+# caps the number of memoized (model, column) subtrees, not their bytes. Every node below a memoized subtree
+# is memoized too and shared rather than copied, so each entry adds about one node's dict, and memory stays
+# bounded by the lineage index plus memo_entries nodes, whatever the project size.
+def iter_full_hierarchy(df, stats=None, memo_entries=100000):
+    index = build_lineage_index(df)
+    memo = {}
+    for model_name, column_name in zip(df['NAME'], df['COLUMN_NAME']):
+        # Dropping the memo only costs rebuilding subtrees; the output is the same
+        if memo_entries is not None and len(memo) > memo_entries:
+            memo.clear()
+        key = (model_name.lower().strip(), extract_column_name(column_name).lower().strip())
+        yield build_hierarchies(index, [key], memo, stats)[0]
+
+# Write hierarchies as JSON Lines, one compact root per line; gzip-compressed when the path ends in .gz
+def write_hierarchy_jsonl(hierarchies, file_path):
+    count = 0
+    with (gzip.open(file_path, 'wt', encoding='utf-8') if file_path.endswith('.gz')
+          else open(file_path, 'w', encoding='utf-8')) as f:
+        for hierarchy in hierarchies:
+            f.write(json.dumps(hierarchy, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    return count
+
+# Columnar graph store shared with stitch_json (see lineage_store.py). Saved after the lineage output and
+# tagged with its digest, so stitch_json can tell when that output has been rewritten since.
+def save_lineage_store(df, lineage_path):
+    store_path = os.getenv('lineage_store_path', 'lineage_store')
+    if store_path:
+        from lineage_store import build_lineage_store
+        build_lineage_store(df=df).save(store_path, source_path=lineage_path)
+        print(f'Lineage store created: {store_path}')
 
 # Main Function to Execute the Process
 def main():
@@ -94,8 +172,40 @@ def main():
     file_path = 'dbt_manifest_extracted_data_with_lineage.csv'  # Replace with your file path
     df = read_csv_data(file_path)
 
+    # Downstream impact index (see downstream_index.py), with the Tableau consumers of the last stitched output.
+    # Off by default: combined_lineage.json predates this run, so its Tableau edges may be stale; set
+    # downstream_index=true to rebuild here, or run downstream_index.py build after stitching.
+    if os.getenv('downstream_index', 'false').lower() in ('1', 'true', 'yes'):
+        index_path = os.getenv('downstream_index_path', 'downstream_index.json')
+        from downstream_index import build_downstream_index
+        build_downstream_index(combined_path=os.getenv('combined_lineage_path', 'combined_lineage.json'),
+                               df=df).save(index_path)
+        print(f'Downstream index created: {index_path}')
+
+    # lineage_output_format=graph writes the deduplicated node/edge file instead (see lineage_graph.py)
+    if os.getenv('lineage_output_format', 'tree') == 'graph':
+        from lineage_graph import build_lineage_graph, write_lineage_graph
+        graph_path = os.getenv('lineage_graph_path', 'lineage_graph.json')
+        write_lineage_graph(build_lineage_graph(df), graph_path)
+        print(f'JSON file created: {graph_path}')
+        save_lineage_store(df, graph_path)
+        return
+
+    # lineage_output_format=jsonl streams one root per line (lineage_jsonl_path, gzip when it ends in .gz)
+    if os.getenv('lineage_output_format', 'tree') == 'jsonl':
+        jsonl_path = os.getenv('lineage_jsonl_path', 'lineage.jsonl')
+        stats = TraversalStats()
+        count = write_hierarchy_jsonl(
+            iter_full_hierarchy(df, stats, int(os.getenv('lineage_stream_memo_entries', '100000'))), jsonl_path)
+        stats.report('Lineage traversal')
+        print(f'JSON Lines file created: {jsonl_path} ({count} columns)')
+        save_lineage_store(df, jsonl_path)
+        return
+
     # Build the full JSON hierarchy for all columns
-    full_hierarchy = build_full_hierarchy(df)
+    stats = TraversalStats()
+    full_hierarchy = build_full_hierarchy(df, stats)
+    stats.report('Lineage traversal')
 
     # Save the JSON hierarchy to a file
     import json
@@ -103,6 +213,7 @@ def main():
         json.dump(full_hierarchy, f, indent=4)
 
     print('JSON file created: lineage.json')
+    save_lineage_store(df, 'lineage.json')
 
 # Run the main function
 if __name__ == "__main__":
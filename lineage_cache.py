@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# On-disk cache of LLM lineage answers, keyed by everything that determines the answer, so reruns,
+# crashed runs and models reverted to earlier SQL are served without calling the API again.
+
+def normalize_sql(sql):
+    # Whitespace-only edits produce the same prompt semantics, so they share a cache entry
+    return ' '.join((sql or '').split())
+
+# prompt_budget is the token budget the prompt was fitted to (None when prompts are sent whole): an answer
+# to a prompt truncated under a small budget isn't reused once the budget is raised
+def cache_key(prompt_version, table_name, sql, column_name, reference, llm_model, prompt_budget=None):
+    payload = json.dumps([prompt_version, table_name, normalize_sql(sql), column_name, reference or '', llm_model,
+                          prompt_budget])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class LineageCache:
+    def __init__(self, path='llm_lineage_cache.sqlite', max_entries=100000, max_age_days=90, bypass=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS lineage_cache (cache_key TEXT PRIMARY KEY, upstream_table TEXT, "
+            "upstream_column TEXT, reasoning TEXT, created_at REAL, used_at REAL)"
+        )
+
+    # Cached (upstream_tables, upstream_columns, reasoning) for each key, or None on a miss
+    def get_many(self, keys):
+        if self.bypass:
+            self.misses += len(keys)
+            return [None] * len(keys)
+
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT cache_key, upstream_table, upstream_column, reasoning FROM lineage_cache "
+                f"WHERE cache_key IN ({', '.join(['?'] * len(batch))})", batch
+            )
+            for key, upstream_table, upstream_column, reasoning in rows:
+                found[key] = (upstream_table, upstream_column, reasoning)
+
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE lineage_cache SET used_at = ? WHERE cache_key = ?",
+                                  [(now, key) for key in found])
+            self.conn.commit()
+
+        results = [found.get(key) for key in keys]
+        hits = sum(result is not None for result in results)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return results
+
+    def put_many(self, items):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT INTO lineage_cache (cache_key, upstream_table, upstream_column, reasoning, created_at, used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(cache_key) DO UPDATE SET upstream_table = excluded.upstream_table, "
+            "upstream_column = excluded.upstream_column, reasoning = excluded.reasoning, "
+            "created_at = excluded.created_at, used_at = excluded.used_at",
+            [(key, *lineage, now, now) for key, lineage in items]
+        )
+        self.conn.commit()
+
+    # Drop entries unused for longer than max_age_days, then the least recently used beyond max_entries
+    def evict(self):
+        expired = self.conn.execute("DELETE FROM lineage_cache WHERE used_at < ?",
+                                    (time.time() - self.max_age_seconds,)).rowcount
+        overflow = self.conn.execute(
+            "DELETE FROM lineage_cache WHERE cache_key IN (SELECT cache_key FROM lineage_cache "
+            "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        ).rowcount
+        self.conn.commit()
+        return expired + overflow
+
+    def close(self):
+        self.evict()
+        self.conn.close()
+
+# Cache configured from the environment; None when llm_cache=false
+def open_cache():
+    if os.getenv('llm_cache', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    return LineageCache(
+        path=os.getenv('llm_cache_path', 'llm_lineage_cache.sqlite'),
+        max_entries=int(os.getenv('llm_cache_max_entries', '100000')),
+        max_age_days=float(os.getenv('llm_cache_max_age_days', '90')),
+        bypass=os.getenv('llm_cache_bypass', 'false').lower() in ('1', 'true', 'yes'),
+    )
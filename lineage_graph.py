@@ -0,0 +1,132 @@
+import json
+
+from iterate_lineage import build_lineage_index, extract_column_name
+from lineage_traversal import PRUNE, traversal_limits, walk
+
+# Normalized lineage output: every (model, column) is stored once in a node table and every lineage step
+# once in an edge table, instead of copying each shared upstream chain into every root that reaches it.
+#
+#   nodes: [model, column, description] for a column with a lineage row, [model, column] for one without
+#   edges: [downstream node id, upstream node id, reasoning], in the row's upstream order
+#   roots: node ids of the lineage rows, in row order (the top-level entries of lineage.json)
+#
+# A node id is the node's position in the node table.
+
+GRAPH_FORMAT = 'lineage-graph'
+GRAPH_VERSION = 1
+
+# Build the node and edge tables from a lineage frame read by iterate_lineage.read_csv_data
+def build_lineage_graph(df):
+    index = build_lineage_index(df)
+    node_ids = {}
+    nodes = []
+    edges = []
+
+    def node_id(key):
+        if key not in node_ids:
+            node_ids[key] = len(nodes)
+            row = index.get(key)
+            nodes.append([key[0], key[1]] if row is None else [key[0], key[1], row[0]])
+            pending.append(key)
+        return node_ids[key]
+
+    pending = []
+    roots = [node_id((model_name.lower().strip(), extract_column_name(column_name).lower().strip()))
+             for model_name, column_name in zip(df['NAME'], df['COLUMN_NAME'])]
+    # Every reachable node is added once; cycles simply become edges back to an existing node
+    while pending:
+        key = pending.pop()
+        row = index.get(key)
+        if row is None:
+            continue
+        downstream_id = node_ids[key]
+        for upstream_key in row[2]:
+            edges.append([downstream_id, node_id(upstream_key), row[1]])
+
+    return {'format': GRAPH_FORMAT, 'version': GRAPH_VERSION, 'nodes': nodes, 'edges': edges, 'roots': roots}
+
+# Compact JSON: no indentation or spaces; NaN descriptions round-trip like they do in lineage.json
+def write_lineage_graph(graph, file_path):
+    with open(file_path, 'w') as file:
+        json.dump(graph, file, separators=(',', ':'))
+
+class LineageGraph:
+    def __init__(self, graph):
+        if graph.get('format') != GRAPH_FORMAT or graph.get('version') != GRAPH_VERSION:
+            raise ValueError(f"Not a {GRAPH_FORMAT} v{GRAPH_VERSION} file")
+        self.nodes = graph['nodes']
+        self.roots = graph['roots']
+        self.node_ids = {(node[0], node[1]): node_id for node_id, node in enumerate(self.nodes)}
+        # Adjacency: node id -> [(upstream node id, reasoning)], in edge order
+        self.upstream = {}
+        for downstream_id, upstream_id, reasoning in graph['edges']:
+            self.upstream.setdefault(downstream_id, []).append((upstream_id, reasoning))
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'r') as file:
+            return cls(json.load(file))
+
+    # Materialize the legacy nested lineage.json entry of one column
+    def hierarchy(self, model_name, column_name, stats=None):
+        key = (model_name.lower().strip(), column_name.lower().strip())
+        if key not in self.node_ids:
+            return self._missing_node(key)
+        return self._materialize([self.node_ids[key]], {}, stats)[0]
+
+    # Materialize the whole legacy lineage.json list; shared subtrees are built once
+    def full_hierarchy(self, stats=None):
+        return self._materialize(self.roots, {}, stats)
+
+    def _missing_node(self, key):
+        return {
+            "model": key[0],
+            "column": key[1],
+            "column Description": "Description not available",
+            "reasoning": "Reasoning not available",
+            "upstream_models": []
+        }
+
+    # Same shape, memoization and cycle handling as iterate_lineage.build_hierarchies: only subtrees that no
+    # cycle or depth cap cut are memoized, as (structure, height), so the output doesn't depend on walk order
+    def _materialize(self, node_ids, memo, stats):
+        root = {"upstream_models": []}
+        limits = traversal_limits()
+        max_depth = limits['max_depth']
+        heights = {}
+
+        def upstream(node_id):
+            return [upstream_id for upstream_id, _ in self.upstream.get(node_id, [])]
+
+        def visit(node_id, parent, depth):
+            if node_id in memo:
+                structure, height = memo[node_id]
+                if max_depth is None or depth + height <= max_depth:
+                    heights[id(structure)] = height
+                    parent["upstream_models"].append(structure)
+                    return PRUNE
+            node = self.nodes[node_id]
+            if len(node) == 2:
+                structure = self._missing_node((node[0], node[1]))
+            else:
+                edges = self.upstream.get(node_id, [])
+                structure = {
+                    "model": node[0],
+                    "column": node[1],
+                    "column Description": node[2],
+                    # Every edge out of a node carries that node's reasoning
+                    "reasoning": edges[0][1] if edges else "Reasoning not available",
+                    "upstream_models": []
+                }
+            parent["upstream_models"].append(structure)
+            return structure
+
+        def leave(node_id, structure, depth, cut):
+            height = max((heights[id(upstream_structure)] + 1 for upstream_structure in structure["upstream_models"]),
+                         default=0)
+            heights[id(structure)] = height
+            if not cut:
+                memo[node_id] = (structure, height)
+
+        walk(node_ids, upstream, visit, parent=root, stats=stats, leave=leave, **limits)
+        return root["upstream_models"]
@@ -0,0 +1,80 @@
+from read_manifest_catalog import load_manifest
+
+# Dependency-graph-driven invalidation: when a model loses or renames columns, the downstream columns
+# whose resolved lineage points at those columns are re-resolved even though their own SQL is unchanged.
+
+# {model node key: [upstream model node keys]} from the manifest refs
+def build_model_graph(nodes):
+    graph = {}
+    node_items = nodes.items() if isinstance(nodes, dict) else nodes
+    for node_key, node_info in node_items:
+        upstream = []
+        for ref in node_info.get('refs', []):
+            ref_name = ref.get('name', '')
+            if ref_name:
+                # Same package resolution as build_reference_columns
+                ref_package = ref.get('package') or node_info.get('package_name') or node_key.split('.')[1]
+                upstream.append(f"model.{ref_package}.{ref_name}")
+        graph[node_key] = upstream
+    return graph
+
+def load_model_graph(manifest_path):
+    return build_model_graph(load_manifest(manifest_path))
+
+def downstream_models(graph):
+    downstream = {}
+    for node_key, upstream in graph.items():
+        for upstream_key in upstream:
+            downstream.setdefault(upstream_key, []).append(node_key)
+    return downstream
+
+# {table_name: set of lowercase column names} from (TABLE_NAME, COLUMN_NAME) pairs
+def column_sets(pairs):
+    columns = {}
+    for table_name, column_name in pairs:
+        columns.setdefault(table_name, set()).add(column_name.lower())
+    return columns
+
+# Split resolved UPSTREAM_TABLE / UPSTREAM_COLUMN fields into lowercase (table, column) pairs
+def upstream_pairs(upstream_tables, upstream_columns):
+    # Unresolved rows come back as None (or NaN once they have been through pandas)
+    upstream_tables = upstream_tables if isinstance(upstream_tables, str) else ''
+    upstream_columns = upstream_columns if isinstance(upstream_columns, str) else ''
+    tables = [table.strip().lower() for table in upstream_tables.split(',') if table.strip()]
+    pairs = []
+    for position, column in enumerate(column for column in upstream_columns.split(',') if column.strip()):
+        column = column.strip().lower()
+        if '.' in column:
+            table, _, column = column.rpartition('.')
+        elif len(tables) == 1:
+            table = tables[0]
+        else:
+            table = tables[position] if position < len(tables) else ''
+        pairs.append((table, column))
+    return pairs
+
+# Work out which resolved rows are stale; returns {unique_key: reason}.
+# removed_columns is {table_name: set of lowercase column names} the model no longer has, and resolved_rows
+# are (UNIQUE_KEY, TABLE_NAME, UPSTREAM_TABLE, UPSTREAM_COLUMN) tuples from COLUMN_LINEAGE_GENAI (only the
+# rows of downstream models are needed).
+def find_invalidated_columns(graph, removed_columns, resolved_rows):
+    rows_by_table = {}
+    for unique_key, table_name, upstream_tables, upstream_columns in resolved_rows:
+        rows_by_table.setdefault(table_name, []).append(
+            (unique_key, upstream_pairs(upstream_tables, upstream_columns))
+        )
+
+    downstream = downstream_models(graph)
+    invalidated = {}
+    # Check the direct downstream models of every model that lost columns. A downstream model that loses
+    # columns in turn (a select * over the changed model, say) is itself in removed_columns, so the
+    # invalidation carries on down the graph.
+    for upstream_key, removed in removed_columns.items():
+        upstream_name = upstream_key.split('.')[-1].lower()
+        for downstream_key in downstream.get(upstream_key, []):
+            for unique_key, pairs in rows_by_table.get(downstream_key, []):
+                stale = sorted({column for table, column in pairs if table == upstream_name and column in removed})
+                if stale and unique_key not in invalidated:
+                    invalidated[unique_key] = (f"upstream {upstream_key} no longer has column(s) "
+                                               f"{', '.join(stale)}")
+    return invalidated
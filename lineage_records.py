@@ -0,0 +1,159 @@
+import json
+import sys
+from operator import attrgetter
+
+import pandas as pd
+from read_manifest_catalog import CATALOG_NODE_FIELDS, MANIFEST_NODE_FIELDS, format_reference, sql_hash, stream_nodes
+
+# orjson decodes several times faster than the stdlib; fall back to json when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Whole-file decode: the entire document is held in memory, unlike the streamed records below
+def load_json(file_path):
+    with open(file_path, 'rb') as file:
+        if orjson is not None:
+            return orjson.loads(file.read())
+        return json.load(file)
+
+def _intern(value):
+    return sys.intern(value) if value else ''
+
+# A manifest node reduced to the fields the pipeline reads
+class ManifestNode:
+    __slots__ = ('node_key', 'resource_type', 'name', 'package_name', 'raw_code', 'refs', 'column_descriptions',
+                 'checksum')
+
+    def __init__(self, node_key, resource_type, name, package_name, raw_code, refs, column_descriptions, checksum):
+        self.node_key = node_key
+        self.resource_type = resource_type
+        self.name = name
+        self.package_name = package_name
+        self.raw_code = raw_code
+        self.refs = refs  # tuple of (ref_name, ref_package)
+        self.column_descriptions = column_descriptions  # lowercase column name -> description
+        self.checksum = checksum
+
+    @classmethod
+    def from_dict(cls, node_key, node_info):
+        return cls(
+            _intern(node_key),
+            _intern(node_info.get('resource_type', '')),
+            _intern(node_info.get('name', '')),
+            _intern(node_info.get('package_name') or ''),
+            node_info.get('raw_code', ''),
+            tuple((_intern(ref.get('name', '')), ref.get('package')) for ref in node_info.get('refs', [])),
+            {_intern(column_key.lower()): column_info.get('description', '')
+             for column_key, column_info in node_info.get('columns', {}).items()},
+            (node_info.get('checksum') or {}).get('checksum', ''),
+        )
+
+# One column of a catalog node
+class CatalogColumn:
+    __slots__ = ('table_name', 'column_name', 'database', 'schema', 'description')
+
+    def __init__(self, table_name, column_name, database, schema, description):
+        self.table_name = table_name
+        self.column_name = column_name
+        self.database = database
+        self.schema = schema
+        self.description = description
+
+# One COLUMN_LINEAGE row; field order matches the DataFrame built by read_manifest_catalog
+class LineageRow:
+    __slots__ = ('unique_key', 'database', 'schema', 'table_name', 'column_name', 'resource_type', 'name', 'sql',
+                 'sql_hash', 'reference', 'column_description', 'checksum')
+
+    def __init__(self, unique_key, database, schema, table_name, column_name):
+        self.unique_key = unique_key
+        self.database = database
+        self.schema = schema
+        self.table_name = table_name
+        self.column_name = column_name
+        self.resource_type = ''
+        self.name = ''
+        self.sql = ''
+        self.sql_hash = ''
+        self.reference = ''
+        self.column_description = ''
+        self.checksum = ''
+
+def manifest_records(nodes):
+    node_items = nodes.items() if isinstance(nodes, dict) else nodes
+    return [ManifestNode.from_dict(node_key, node_info) for node_key, node_info in node_items]
+
+# Catalog node id -> list of CatalogColumn, in catalog order
+def catalog_records(catalog_nodes):
+    columns_by_table = {}
+    node_items = catalog_nodes.items() if isinstance(catalog_nodes, dict) else catalog_nodes
+    for node_key, node_info in node_items:
+        metadata = node_info.get('metadata', {})
+        table_name = _intern(node_key)
+        database = _intern(metadata.get('database', ''))
+        schema = _intern(metadata.get('schema', ''))
+        columns_by_table[table_name] = [
+            CatalogColumn(table_name, _intern(column_name), database, schema, column_info.get('description', ''))
+            for column_name, column_info in node_info.get('columns', {}).items()
+        ]
+    return columns_by_table
+
+# Build records from manifest.json / catalog.json as the nodes stream out of ijson, so memory stays bounded
+# by the records rather than the decoded documents
+def load_manifest_records(file_path):
+    return manifest_records(stream_nodes(file_path, MANIFEST_NODE_FIELDS))
+
+def load_catalog_records(file_path):
+    return catalog_records(stream_nodes(file_path, CATALOG_NODE_FIELDS))
+
+def build_reference_from_records(node, columns_by_table):
+    reference_columns = []
+    for ref_name, ref_package in node.refs:
+        if ref_name:
+            package_name = ref_package or node.package_name or node.node_key.split('.')[1]
+            for column in columns_by_table.get(f"model.{package_name}.{ref_name}", ()):
+                reference_columns.append((ref_name, column.column_name, column.description))
+    return format_reference(reference_columns)
+
+# Same join as build_dataframe_from_manifest, on typed records
+def build_lineage_rows(manifest_nodes, columns_by_table):
+    rows = []
+    rows_by_table = {}
+    for table_name, columns in columns_by_table.items():
+        table_rows = rows_by_table.setdefault(table_name.lower(), [])
+        for column in columns:
+            row = LineageRow(f"{column.database}.{column.schema}.{table_name}.{column.column_name}",
+                             column.database, column.schema, table_name, column.column_name)
+            rows.append(row)
+            table_rows.append(row)
+
+    for node in manifest_nodes:
+        table_rows = rows_by_table.get(node.node_key.lower())
+        if not table_rows:
+            continue
+
+        reference = build_reference_from_records(node, columns_by_table)
+        hashed_sql = sql_hash(node.raw_code)
+        for row in table_rows:
+            row.resource_type = node.resource_type
+            row.name = node.name
+            row.sql = node.raw_code
+            row.sql_hash = hashed_sql
+            row.checksum = node.checksum
+            column_description = node.column_descriptions.get(row.column_name.lower())
+            if column_description is not None:
+                row.column_description = column_description
+            row.reference = reference
+
+    return rows
+
+# Build the DataFrame from plain tuples instead of one dict per row
+def rows_to_dataframe(rows):
+    return pd.DataFrame.from_records(list(map(attrgetter(*LineageRow.__slots__), rows)),
+                                     columns=list(LineageRow.__slots__))
+
+def build_lineage_dataframe_from_records(manifest_path, catalog_path):
+    manifest_nodes = load_manifest_records(manifest_path)
+    columns_by_table = load_catalog_records(catalog_path)
+    return rows_to_dataframe(build_lineage_rows(manifest_nodes, columns_by_table))
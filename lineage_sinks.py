@@ -0,0 +1,355 @@
+import glob
+import gzip
+import io
+import os
+import pandas as pd
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# Columns loaded into COLUMN_LINEAGE, in insert order
+COLUMN_LINEAGE_COLUMNS = ['unique_key', 'database', 'schema', 'table_name', 'column_name',
+                          'column_description', 'resource_type', 'name', 'sql', 'reference', 'sql_hash']
+
+# COLUMN_LINEAGE_GENAI adds the resolved lineage fields
+COLUMN_LINEAGE_GENAI_COLUMNS = COLUMN_LINEAGE_COLUMNS + ['upstream_table', 'upstream_column', 'reasoning']
+
+def use_configured_context(cursor):
+    # Get environment variables
+    warehouse = os.getenv('warehouse')
+    database = os.getenv('database')
+    schema = os.getenv('schema')
+
+    # Use environment variables in SQL commands
+    cursor.execute(f"USE WAREHOUSE {warehouse};")  # Explicitly set the warehouse
+    cursor.execute(f"USE DATABASE {database};")
+    cursor.execute(f"USE SCHEMA {schema};")
+
+# Frame rows as lists with every missing value (NaN/None/NaT) as None, so each sink writes it as NULL
+def null_rows(df):
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+# One CSV record for COPY INTO: every value is quoted, so an empty string loads as '' like it does through
+# INSERT, while None is an unquoted empty field, which EMPTY_FIELD_AS_NULL loads as NULL. csv.writer can't
+# make that distinction before Python 3.12's QUOTE_NOTNULL, so the fields are encoded here.
+def csv_line(row):
+    return ','.join('' if value is None else '"' + str(value).replace('"', '""') + '"' for value in row) + '\n'
+
+# Write the frame as gzip-compressed CSV (or Parquet) chunks and return their paths
+def write_chunks(df, directory, columns, chunk_rows=100000, file_format='csv'):
+    paths = []
+    for chunk_number, start in enumerate(range(0, len(df), chunk_rows)):
+        chunk = df[columns].iloc[start:start + chunk_rows]
+        if file_format == 'parquet':
+            path = os.path.join(directory, f"chunk_{chunk_number:05d}.parquet")
+            chunk.to_parquet(path, index=False, compression='snappy')
+        else:
+            path = os.path.join(directory, f"chunk_{chunk_number:05d}.csv.gz")
+            rows = null_rows(chunk)
+            buffer = io.StringIO()
+            buffer.writelines(csv_line(row) for row in rows)
+            # Fast compression level: the chunk is only in transit to the stage
+            with open(path, 'wb') as file:
+                file.write(gzip.compress(buffer.getvalue().encode('utf-8'), compresslevel=1))
+        paths.append(path)
+    return paths
+
+# Base class for COLUMN_LINEAGE-style targets: a full reload or a keyed upsert/delete delta
+class LineageSink:
+    name = 'sink'
+
+    def __init__(self, table='COLUMN_LINEAGE', columns=COLUMN_LINEAGE_COLUMNS, key_column='unique_key'):
+        self.table = table
+        self.columns = list(columns)
+        self.key_column = key_column
+
+    def replace(self, df):
+        raise NotImplementedError
+
+    def apply_delta(self, upserts, delete_keys):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+# Row-at-a-time executemany into Snowflake (the original load path)
+class SnowflakeInsertSink(LineageSink):
+    name = 'snowflake-insert'
+
+    def __init__(self, conn, **kwargs):
+        super().__init__(**kwargs)
+        self.conn = conn
+
+    def _placeholders(self):
+        return ', '.join(['%s'] * len(self.columns))
+
+    def _stage_table(self):
+        return f"{self.table}_DELTA"
+
+    def _create_stage(self, cursor):
+        # Temporary staging table with the target's columns plus a delete flag
+        column_ddl = ', '.join(f"{column.upper()} VARCHAR" for column in self.columns)
+        cursor.execute(f"CREATE OR REPLACE TEMPORARY TABLE {self._stage_table()} ({column_ddl}, IS_DELETED BOOLEAN)")
+
+    def _fill_stage(self, cursor, upserts, delete_keys):
+        rows_to_stage = [row + [False] for row in null_rows(upserts[self.columns])]
+        key_position = self.columns.index(self.key_column)
+        for key in delete_keys:
+            tombstone = [None] * len(self.columns) + [True]
+            tombstone[key_position] = key
+            rows_to_stage.append(tombstone)
+
+        column_list = ', '.join(column.upper() for column in self.columns)
+        cursor.executemany(
+            f"INSERT INTO {self._stage_table()} ({column_list}, IS_DELETED) VALUES ({self._placeholders()}, %s)",
+            rows_to_stage
+        )
+        return len(rows_to_stage)
+
+    def _merge_stage(self, cursor):
+        key = self.key_column.upper()
+        others = [column.upper() for column in self.columns if column != self.key_column]
+        all_columns = [column.upper() for column in self.columns]
+        cursor.execute(f"""
+        MERGE INTO {self.table} AS target
+        USING {self._stage_table()} AS delta
+            ON target.{key} = delta.{key}
+        WHEN MATCHED AND delta.IS_DELETED THEN DELETE
+        WHEN MATCHED THEN UPDATE SET {', '.join(f"{column} = delta.{column}" for column in others)}
+        WHEN NOT MATCHED AND NOT delta.IS_DELETED THEN INSERT ({', '.join(all_columns)})
+            VALUES ({', '.join(f"delta.{column}" for column in all_columns)})
+        """)
+
+    def replace(self, df):
+        cursor = self.conn.cursor()
+        use_configured_context(cursor)
+
+        # Truncate the table before inserting
+        cursor.execute(f"TRUNCATE TABLE {self.table};")
+
+        # Convert DataFrame to list of tuples for insertion
+        cursor.executemany(
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({self._placeholders()})",
+            null_rows(df[self.columns])
+        )
+        self.conn.commit()
+        cursor.close()
+        return len(df)
+
+    def apply_delta(self, upserts, delete_keys):
+        # Stage only the changed rows plus tombstones for removed keys, then apply them with one MERGE
+        if upserts.empty and not delete_keys:
+            return 0
+
+        cursor = self.conn.cursor()
+        use_configured_context(cursor)
+        self._create_stage(cursor)
+        rows_staged = self._fill_stage(cursor, upserts, delete_keys)
+        self._merge_stage(cursor)
+        self.conn.commit()
+        cursor.close()
+        return rows_staged
+
+# Bulk load: compressed chunks are PUT to the table stage and loaded with COPY INTO
+class SnowflakeCopySink(SnowflakeInsertSink):
+    name = 'snowflake-copy'
+
+    def __init__(self, conn, chunk_rows=100000, file_format='csv', **kwargs):
+        super().__init__(conn, **kwargs)
+        self.chunk_rows = chunk_rows
+        self.file_format = file_format
+
+    def _file_format_clause(self):
+        if self.file_format == 'parquet':
+            return "FILE_FORMAT = (TYPE = PARQUET) MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE"
+        return ("FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '\"' EMPTY_FIELD_AS_NULL = TRUE "
+                "COMPRESSION = GZIP)")
+
+    def _copy_into(self, cursor, df, target_table):
+        # Each load gets its own path in the user stage so concurrent or failed loads never mix files
+        stage = f"@~/lineage_load/{target_table}/{uuid.uuid4().hex}"
+        column_list = ', '.join(column.upper() for column in df.columns)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for path in write_chunks(df, tmp_dir, list(df.columns), self.chunk_rows, self.file_format):
+                cursor.execute(f"PUT 'file://{path}' {stage} AUTO_COMPRESS = FALSE OVERWRITE = TRUE")
+        if self.file_format == 'parquet':
+            cursor.execute(f"COPY INTO {target_table} FROM {stage} {self._file_format_clause()} PURGE = TRUE")
+        else:
+            cursor.execute(f"COPY INTO {target_table} ({column_list}) FROM {stage} {self._file_format_clause()} PURGE = TRUE")
+
+    def replace(self, df):
+        cursor = self.conn.cursor()
+        use_configured_context(cursor)
+        cursor.execute(f"TRUNCATE TABLE {self.table};")
+        self._copy_into(cursor, df[self.columns], self.table)
+        self.conn.commit()
+        cursor.close()
+        return len(df)
+
+    def apply_delta(self, upserts, delete_keys):
+        if upserts.empty and not delete_keys:
+            return 0
+
+        staged = upserts[self.columns].assign(is_deleted=False)
+        if delete_keys:
+            tombstones = pd.DataFrame({self.key_column: list(delete_keys), 'is_deleted': True})
+            staged = pd.concat([staged, tombstones.reindex(columns=staged.columns)], ignore_index=True)
+        staged.columns = [column.upper() for column in staged.columns]
+
+        cursor = self.conn.cursor()
+        use_configured_context(cursor)
+        self._create_stage(cursor)
+        self._copy_into(cursor, staged, self._stage_table())
+        self._merge_stage(cursor)
+        self.conn.commit()
+        cursor.close()
+        return len(staged)
+
+# Offline stand-in for the staged files: writes the compressed chunks a COPY INTO would load
+class LocalFileSink(LineageSink):
+    name = 'local-files'
+
+    def __init__(self, directory, chunk_rows=100000, file_format='csv', **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.file_format = file_format
+
+    def replace(self, df):
+        table_directory = os.path.join(self.directory, self.table)
+        shutil.rmtree(table_directory, ignore_errors=True)
+        os.makedirs(table_directory)
+        write_chunks(df, table_directory, self.columns, self.chunk_rows, self.file_format)
+        return len(df)
+
+    def apply_delta(self, upserts, delete_keys):
+        # Each delta is written as its own numbered batch directory next to the full load
+        batch_number = len(glob.glob(os.path.join(self.directory, f"{self.table}_delta_*")))
+        batch_directory = os.path.join(self.directory, f"{self.table}_delta_{batch_number:05d}")
+        os.makedirs(batch_directory)
+        write_chunks(upserts, batch_directory, self.columns, self.chunk_rows, self.file_format)
+        with open(os.path.join(batch_directory, 'deleted_keys.txt'), 'w') as file:
+            file.writelines(f"{key}\n" for key in delete_keys)
+        return len(upserts) + len(delete_keys)
+
+# Offline stand-in for Snowflake: a SQLite table with the same columns and upsert semantics
+class SQLiteSink(LineageSink):
+    name = 'sqlite'
+
+    def __init__(self, path=':memory:', **kwargs):
+        super().__init__(**kwargs)
+        self.conn = sqlite3.connect(path)
+        column_ddl = ', '.join(
+            f"{column} TEXT PRIMARY KEY" if column == self.key_column else f"{column} TEXT" for column in self.columns
+        )
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({column_ddl})")
+
+    def _placeholders(self):
+        return ', '.join(['?'] * len(self.columns))
+
+    def replace(self, df):
+        self.conn.execute(f"DELETE FROM {self.table}")
+        self.conn.executemany(
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({self._placeholders()})",
+            null_rows(df[self.columns])
+        )
+        self.conn.commit()
+        return len(df)
+
+    def apply_delta(self, upserts, delete_keys):
+        others = [column for column in self.columns if column != self.key_column]
+        self.conn.executemany(
+            f"DELETE FROM {self.table} WHERE {self.key_column} = ?", [(key,) for key in delete_keys]
+        )
+        self.conn.executemany(
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({self._placeholders()}) "
+            f"ON CONFLICT({self.key_column}) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in others)}",
+            null_rows(upserts[self.columns])
+        )
+        self.conn.commit()
+        return len(upserts) + len(delete_keys)
+
+    def close(self):
+        self.conn.close()
+
+# Pick the sink configured by the load_sink environment variable (or the name passed in)
+def get_sink(conn=None, load_sink=None, **kwargs):
+    load_sink = load_sink or os.getenv('load_sink', 'insert')
+    if load_sink == 'copy':
+        return SnowflakeCopySink(conn, file_format=os.getenv('load_file_format', 'csv'), **kwargs)
+    if load_sink == 'sqlite':
+        return SQLiteSink(os.getenv('sqlite_path', 'column_lineage.db'), **kwargs)
+    if load_sink == 'files':
+        return LocalFileSink(os.getenv('load_directory', 'column_lineage_load'), **kwargs)
+    return SnowflakeInsertSink(conn, **kwargs)
+
+# Run a sink operation and report its throughput
+def timed_load(sink, operation, *args):
+    start = time.perf_counter()
+    rows = getattr(sink, operation)(*args)
+    elapsed = time.perf_counter() - start
+    rows_per_second = rows / elapsed if elapsed > 0 else float('inf')
+    print(f"{sink.name} {operation}: {rows} rows in {elapsed:.2f}s ({rows_per_second:,.0f} rows/s)")
+    return rows
+
+# Buffers upserts and writes them to a sink in batches (one staging table + MERGE per flush on Snowflake).
+# Used as a context manager so whatever is buffered is still flushed when the run is interrupted.
+class BatchedWriter:
+    def __init__(self, sink, batch_rows=500, on_flush=None):
+        self.sink = sink
+        self.batch_rows = batch_rows
+        # Called with each flushed frame once the sink has committed it
+        self.on_flush = on_flush
+        self.buffer = []
+        self.rows_written = 0
+        self.flushes = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, row):
+        with self.lock:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.batch_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        start = time.perf_counter()
+        df = pd.DataFrame(self.buffer, columns=self.sink.columns)
+        rows = self.sink.apply_delta(df, [])
+        self.seconds += time.perf_counter() - start
+        self.rows_written += rows
+        self.flushes += 1
+        self.buffer = []
+        if self.on_flush is not None:
+            self.on_flush(df)
+
+    def report(self):
+        rows_per_second = self.rows_written / self.seconds if self.seconds > 0 else float('inf')
+        print(f"{self.sink.name} write-back: {self.rows_written} rows in {self.flushes} flushes, "
+              f"{self.seconds:.2f}s ({rows_per_second:,.0f} rows/s)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Runs on KeyboardInterrupt too, so resolved rows are still written; a flush failing while another
+        # exception is propagating is reported instead of replacing that exception
+        if exc_type is None:
+            self.flush()
+        else:
+            try:
+                self.flush()
+            except Exception as error:
+                print(f"{self.sink.name} write-back: {len(self.buffer)} buffered rows not written "
+                      f"({type(error).__name__}: {error})")
+        self.report()
+        return False
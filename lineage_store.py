@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from iterate_lineage import build_lineage_index, column_node, read_csv_data
+
+# Columnar lineage graph store: integer node ids, CSR adjacency arrays for the upstream and downstream
+# directions and a string table of node names, saved as .npy files that load memory-mapped. A million-column
+# warehouse takes tens of MB on disk and loads in milliseconds, so the scripts can share one graph without
+# re-parsing lineage.json.
+#
+#   names.npy         node names ("model.column", lowercase UTF-8), sorted; a node id is its position
+#   up_indptr.npy     upstream CSR offsets: the upstream ids of node i are up_indices[up_indptr[i]:up_indptr[i + 1]]
+#   up_indices.npy    upstream node ids, in the lineage row's upstream order
+#   down_indptr.npy   downstream CSR offsets
+#   down_indices.npy  downstream node ids
+#   store.json        format, version and counts, plus the sha256 of the lineage output the store was built with
+
+STORE_FORMAT = 'lineage-store'
+STORE_VERSION = 1
+ARRAYS = ('names', 'up_indptr', 'up_indices', 'down_indptr', 'down_indices')
+
+# sha256 of a file, read in 1 MB chunks
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# CSR offsets and indices of the edges grouped by source node, keeping the edge order within a node
+def build_csr(sources, targets, node_count):
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32)
+
+# Neighbours of every node in frontier, concatenated
+def gather(indptr, indices, frontier):
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int32), counts
+    # Position of each neighbour in indices: its node's start plus its offset within the node
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    return indices[offsets], counts
+
+class LineageStore:
+    def __init__(self, names, up_indptr, up_indices, down_indptr, down_indices):
+        self.names = names
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.down_indptr = down_indptr
+        self.down_indices = down_indices
+
+    def __len__(self):
+        return len(self.names)
+
+    # Build from (downstream name, upstream name) edges; node_names adds nodes that have no edges
+    @classmethod
+    def from_edges(cls, edges, node_names=()):
+        downstream_names, upstream_names = zip(*edges) if edges else ((), ())
+        all_names = downstream_names + upstream_names + tuple(node_names)
+        names = np.unique(np.array(all_names, dtype=np.bytes_)) if all_names else np.empty(0, dtype='S1')
+        downstream = np.searchsorted(names, np.array(downstream_names, dtype=np.bytes_)).astype(np.int32)
+        upstream = np.searchsorted(names, np.array(upstream_names, dtype=np.bytes_)).astype(np.int32)
+        up_indptr, up_indices = build_csr(downstream, upstream, len(names))
+        down_indptr, down_indices = build_csr(upstream, downstream, len(names))
+        return cls(names, up_indptr, up_indices, down_indptr, down_indices)
+
+    # Build from an iterate_lineage.build_lineage_index index
+    @classmethod
+    def from_lineage_index(cls, lineage_index):
+        edges = []
+        node_names = []
+        for (model_name, column_name), (_, _, upstream) in lineage_index.items():
+            downstream_name = column_node(model_name, column_name)
+            # Every lineage row is a node, so a column without upstream lineage can still be looked up
+            if downstream_name:
+                node_names.append(downstream_name.encode())
+            for upstream_model, upstream_column in upstream:
+                upstream_name = column_node(upstream_model, upstream_column)
+                if downstream_name and upstream_name:
+                    edges.append((downstream_name.encode(), upstream_name.encode()))
+        return cls.from_edges(edges, node_names)
+
+    # source_path names the lineage output built from the same rows; its digest lets readers of that file
+    # tell whether the store still describes it
+    def save(self, directory, source_path=None):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'store.json'), 'w') as file:
+            json.dump({'format': STORE_FORMAT, 'version': STORE_VERSION, 'nodes': len(self.names),
+                       'edges': len(self.up_indices),
+                       'source_sha256': file_digest(source_path) if source_path else None}, file)
+
+    @staticmethod
+    def read_meta(directory):
+        with open(os.path.join(directory, 'store.json'), 'r') as file:
+            meta = json.load(file)
+        if meta.get('format') != STORE_FORMAT or meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Not a {STORE_FORMAT} v{STORE_VERSION} directory")
+        return meta
+
+    # Arrays are memory-mapped read-only by default, so loading doesn't read the files
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        cls.read_meta(directory)
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS))
+
+    # The store, or None when it wasn't saved with source_path as it is now (rewritten since, or never recorded)
+    @classmethod
+    def load_for_source(cls, directory, source_path, mmap_mode='r'):
+        if cls.read_meta(directory).get('source_sha256') != file_digest(source_path):
+            return None
+        return cls.load(directory, mmap_mode)
+
+    # Node ids of "model.column" names; -1 for names not in the store
+    def node_ids(self, names):
+        keys = np.array([name.lower().strip().encode() for name in names], dtype=np.bytes_)
+        if not len(self.names):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.names, keys), len(self.names) - 1)
+        return np.where(self.names[positions] == keys, positions, -1)
+
+    def node_id(self, name):
+        return int(self.node_ids([name])[0])
+
+    def node_names(self, node_ids):
+        return [name.decode() for name in self.names[np.asarray(node_ids, dtype=np.int64)]]
+
+    def _adjacency(self, direction):
+        if direction == 'upstream':
+            return self.up_indptr, self.up_indices
+        if direction == 'downstream':
+            return self.down_indptr, self.down_indices
+        raise ValueError(f"direction must be 'upstream' or 'downstream', not {direction!r}")
+
+    # Multi-source BFS; returns (node ids, hop distances) of every reached node, sources at distance 0.
+    # Only the visited part of the graph is touched, so a query costs O(reached) on a million-node store.
+    def bfs(self, sources, direction='upstream', max_depth=None):
+        indptr, indices = self._adjacency(direction)
+        # np.zeros pages memory in lazily; a node's entry is its distance + 1 once it is reached
+        distance = np.zeros(len(self.names), dtype=np.int32)
+        frontier = np.unique(np.asarray(sources, dtype=np.int64))
+        distance[frontier] = 1
+        reached = [frontier]
+        depth = 0
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            neighbours, _ = gather(indptr, indices, frontier)
+            # Nodes already reached (including cycles back into the visited set) are dropped
+            frontier = np.unique(neighbours[distance[neighbours] == 0]).astype(np.int64)
+            depth += 1
+            distance[frontier] = depth + 1
+            reached.append(frontier)
+        node_ids = np.concatenate(reached)
+        return node_ids, distance[node_ids] - 1
+
+    # Every node reachable from any of the sources, excluding the sources themselves, sorted by id
+    def reachable(self, sources, direction='upstream', max_depth=None):
+        node_ids, depths = self.bfs(sources, direction, max_depth)
+        return np.sort(node_ids[depths > 0])
+
+    # Reachable sets of many sources at once: 64 sources share one pass, each owning a bit of a uint64 label
+    def reachable_batch(self, sources, direction='upstream'):
+        indptr, indices = self._adjacency(direction)
+        sources = np.asarray(sources, dtype=np.int64)
+        results = []
+        for batch_start in range(0, len(sources), 64):
+            batch = sources[batch_start:batch_start + 64]
+            bits = np.left_shift(np.uint64(1), np.arange(len(batch), dtype=np.uint64))
+            seen = np.zeros(len(self.names), dtype=np.uint64)
+            np.bitwise_or.at(seen, batch, bits)
+            frontier = np.unique(batch)
+            frontier_labels = seen[frontier]
+            touched = [frontier]
+            while len(frontier):
+                neighbours, counts = gather(indptr, indices, frontier)
+                if not len(neighbours):
+                    break
+                labels = np.repeat(frontier_labels, counts)
+                # OR together the labels arriving at each neighbour, then keep the bits it hasn't seen yet
+                order = np.argsort(neighbours, kind='stable')
+                neighbours, labels = neighbours[order], labels[order]
+                unique_neighbours, starts = np.unique(neighbours, return_index=True)
+                new_labels = np.bitwise_or.reduceat(labels, starts) & ~seen[unique_neighbours]
+                changed = new_labels != 0
+                frontier, frontier_labels = unique_neighbours[changed].astype(np.int64), new_labels[changed]
+                seen[frontier] |= frontier_labels
+                touched.append(frontier)
+            touched = np.unique(np.concatenate(touched))
+            touched_labels = seen[touched]
+            for position, source in enumerate(batch):
+                members = touched[(touched_labels & bits[position]) != 0]
+                results.append(members[members != source])
+        return results
+
+    def is_reachable(self, source, target, direction='upstream'):
+        node_ids, depths = self.bfs([source], direction)
+        return bool(np.any((node_ids == target) & (depths > 0)))
+
+# Build the store from the lineage CSV
+def build_lineage_store(csv_path='dbt_manifest_extracted_data_with_lineage.csv', df=None):
+    return LineageStore.from_lineage_index(build_lineage_index(read_csv_data(csv_path) if df is None else df))
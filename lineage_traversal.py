@@ -0,0 +1,107 @@
+import os
+
+# Shared depth-first traversal for the lineage trees and graphs. An explicit stack replaces Python recursion
+# so long chains can't hit RecursionError; a column that reappears on its own path (a lineage cycle, e.g. a
+# column listed as its own upstream) is cut, and the depth and fan-out caps bound the work on bad input.
+
+# Returned by a visit function: don't walk this item's children
+PRUNE = object()
+# Returned by a visit function: end the walk
+STOP = object()
+
+_EXIT = object()
+
+class TraversalStats:
+    def __init__(self):
+        self.nodes_visited = 0
+        self.cycles_cut = 0
+        self.depth_capped = 0
+        self.fanout_capped = 0
+
+    def truncated(self):
+        return bool(self.cycles_cut or self.depth_capped or self.fanout_capped)
+
+    def report(self, label):
+        print(f"{label}: {self.nodes_visited} nodes visited, {self.cycles_cut} cycles cut, "
+              f"{self.depth_capped} nodes at the depth cap, {self.fanout_capped} upstream links over the fan-out cap")
+
+# Depth and fan-out caps from the environment; 0 (the default) disables a cap. Cycles are cut either way,
+# so the caps only bound very deep or very wide lineage.
+def traversal_limits():
+    max_depth = int(os.getenv('lineage_max_depth', '0'))
+    max_fanout = int(os.getenv('lineage_max_fanout', '0'))
+    return {'max_depth': max_depth or None, 'max_fanout': max_fanout or None}
+
+# Pre-order depth-first walk, visiting items in the same order as the recursive code it replaces.
+#   children(item) -> the item's child items
+#   visit(item, parent, depth) -> value handed to the item's children as their parent, or PRUNE / STOP
+#   key(item) -> hashable identity used for cycle detection (default: the item itself)
+#   parent is handed to the roots; revisit=False visits each key once per walk instead of once per path
+#   leave(item, result, depth, cut) -> called once the item's children are done; cut is True when a cycle
+#     or the depth cap cut something at or below the item, i.e. when its subtree depends on the path to it.
+#     The fan-out cap keeps the same children wherever the item is reached, so it doesn't count as a cut.
+def walk(roots, children, visit, key=None, parent=None, revisit=True, max_depth=None, max_fanout=None, stats=None,
+         leave=None):
+    if stats is None:
+        stats = TraversalStats()
+    on_path = set()
+    seen = set()
+
+    # A frame is [item, result, depth, cut, parent frame]; frames are only kept when there is a leave function
+    def finish(frame):
+        if frame[3] and frame[4] is not None:
+            frame[4][3] = True
+        leave(frame[0], frame[1], frame[2], frame[3])
+
+    # Roots are taken one at a time, so a stream of roots (e.g. JSON Lines) is never held in memory whole
+    root_parent = parent
+    stack = []
+    for root in roots:
+        stack.append((root, root_parent, 0, None))
+        while stack:
+            item, parent, depth, parent_frame = stack.pop()
+            if item is _EXIT:
+                on_path.discard(parent)
+                if parent_frame is not None:
+                    finish(parent_frame)
+                continue
+
+            item_key = item if key is None else key(item)
+            if item_key in on_path:
+                stats.cycles_cut += 1
+                if parent_frame is not None:
+                    parent_frame[3] = True
+                continue
+            if not revisit:
+                if item_key in seen:
+                    continue
+                seen.add(item_key)
+
+            stats.nodes_visited += 1
+            result = visit(item, parent, depth)
+            if result is STOP:
+                return stats
+            if result is PRUNE:
+                continue
+
+            frame = None if leave is None else [item, result, depth, False, parent_frame]
+            child_items = list(children(item))
+            if not child_items:
+                if frame is not None:
+                    finish(frame)
+                continue
+            if max_depth is not None and depth >= max_depth:
+                stats.depth_capped += 1
+                if frame is not None:
+                    frame[3] = True
+                    finish(frame)
+                continue
+            if max_fanout is not None and len(child_items) > max_fanout:
+                stats.fanout_capped += len(child_items) - max_fanout
+                child_items = child_items[:max_fanout]
+
+            # The exit marker takes the item off the path once all of its children are done
+            on_path.add(item_key)
+            stack.append((_EXIT, item_key, depth, frame))
+            stack.extend((child, result, depth + 1, frame) for child in reversed(child_items))
+    return stats
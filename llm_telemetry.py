@@ -0,0 +1,148 @@
+import json
+import math
+import os
+import time
+
+# Per-call LLM telemetry: every API call (and every cache hit) becomes one event with latency, queue wait,
+# tokens, retry number, model id and cache status. Events are kept for the percentile summary written when
+# the run finishes, and optionally written to a JSONL trace (replaced each run) and a Prometheus textfile.
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+def percentile(sorted_values, quantile):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(quantile * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+class LLMTelemetry:
+    def __init__(self, trace_path=None, prometheus_path=None, prompt_cost_per_1k=0.00015,
+                 completion_cost_per_1k=0.0006):
+        self.trace_path = trace_path
+        self.prometheus_path = prometheus_path
+        self.prompt_cost_per_1k = prompt_cost_per_1k
+        self.completion_cost_per_1k = completion_cost_per_1k
+        self.trace = open(trace_path, 'w') if trace_path else None
+        # Cache status stamped on API calls; hits are recorded separately by record_cache_hits
+        self.cache_status = 'off'
+        self.events = []
+        self.started_at = time.perf_counter()
+
+    def record(self, label, model, latency=0.0, queue_wait=0.0, prompt_tokens=0, completion_tokens=0, attempt=0,
+               status='ok', error=None, cache=None, mode=None):
+        event = {
+            'ts': time.time(),
+            'label': label,
+            'model': model,
+            'mode': mode,
+            'latency_s': round(latency, 6),
+            'queue_wait_s': round(queue_wait, 6),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'attempt': attempt,
+            'status': status,
+            'error': error,
+            'cache': cache or self.cache_status,
+        }
+        self.events.append(event)
+        if self.trace is not None:
+            self.trace.write(json.dumps(event) + '\n')
+            self.trace.flush()
+
+    def record_cache_hits(self, labels, model):
+        for label in labels:
+            self.record(label, model, cache='hit')
+
+    def summary(self):
+        calls = [event for event in self.events if event['cache'] != 'hit']
+        latencies = sorted(event['latency_s'] for event in calls)
+        queue_waits = sorted(event['queue_wait_s'] for event in calls)
+        prompt_tokens = sum(event['prompt_tokens'] for event in calls)
+        completion_tokens = sum(event['completion_tokens'] for event in calls)
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            'calls': len(calls),
+            'errors': sum(1 for event in calls if event['status'] != 'ok'),
+            'retries': sum(1 for event in calls if event['attempt'] > 0),
+            'cache_hits': len(self.events) - len(calls),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cost_usd': (prompt_tokens * self.prompt_cost_per_1k + completion_tokens * self.completion_cost_per_1k) / 1000,
+            'latency_s': {quantile: percentile(latencies, quantile) for quantile in QUANTILES},
+            'queue_wait_s': {quantile: percentile(queue_waits, quantile) for quantile in QUANTILES},
+            'elapsed_s': elapsed,
+            'calls_per_s': len(calls) / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def report(self, summary):
+        def quantiles(values):
+            return ', '.join(f"p{int(quantile * 100)} {values[quantile]:.2f}s" for quantile in QUANTILES)
+
+        print(f"LLM calls: {summary['calls']} ({summary['errors']} errors, {summary['retries']} retries, "
+              f"{summary['cache_hits']} cache hits), {summary['calls_per_s']:.2f} calls/s")
+        print(f"LLM latency: {quantiles(summary['latency_s'])}; queue wait: {quantiles(summary['queue_wait_s'])}")
+        print(f"LLM tokens: {summary['prompt_tokens']} prompt, {summary['completion_tokens']} completion, "
+              f"estimated cost ${summary['cost_usd']:.4f}")
+
+    # Prometheus text exposition format, written atomically for the node_exporter textfile collector
+    def write_prometheus(self, summary):
+        lines = [
+            '# TYPE lineage_llm_calls_total counter',
+            f"lineage_llm_calls_total {summary['calls']}",
+            '# TYPE lineage_llm_errors_total counter',
+            f"lineage_llm_errors_total {summary['errors']}",
+            '# TYPE lineage_llm_retries_total counter',
+            f"lineage_llm_retries_total {summary['retries']}",
+            '# TYPE lineage_llm_cache_hits_total counter',
+            f"lineage_llm_cache_hits_total {summary['cache_hits']}",
+            '# TYPE lineage_llm_tokens_total counter',
+            f"lineage_llm_tokens_total{{type=\"prompt\"}} {summary['prompt_tokens']}",
+            f"lineage_llm_tokens_total{{type=\"completion\"}} {summary['completion_tokens']}",
+            '# TYPE lineage_llm_cost_usd_total counter',
+            f"lineage_llm_cost_usd_total {summary['cost_usd']:.6f}",
+            '# TYPE lineage_llm_latency_seconds summary',
+            *(f"lineage_llm_latency_seconds{{quantile=\"{quantile}\"}} {value:.6f}"
+              for quantile, value in summary['latency_s'].items()),
+            '# TYPE lineage_llm_queue_wait_seconds summary',
+            *(f"lineage_llm_queue_wait_seconds{{quantile=\"{quantile}\"}} {value:.6f}"
+              for quantile, value in summary['queue_wait_s'].items()),
+        ]
+        tmp_path = f"{self.prometheus_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prometheus_path)
+
+    def close(self):
+        summary = self.summary()
+        if summary['calls'] or summary['cache_hits']:
+            self.report(summary)
+        if self.prometheus_path:
+            self.write_prometheus(summary)
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+        return summary
+
+# One telemetry collector per run, configured from the environment
+_telemetry = None
+
+def get_telemetry():
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = LLMTelemetry(
+            # The trace is opt-in: set llm_trace_path to write one
+            trace_path=os.getenv('llm_trace_path') or None,
+            prometheus_path=os.getenv('llm_prometheus_textfile') or None,
+            prompt_cost_per_1k=float(os.getenv('llm_prompt_cost_per_1k', '0.00015')),
+            completion_cost_per_1k=float(os.getenv('llm_completion_cost_per_1k', '0.0006')),
+        )
+    return _telemetry
+
+def close_telemetry():
+    global _telemetry
+    if _telemetry is None:
+        return None
+    summary = _telemetry.close()
+    _telemetry = None
+    return summary
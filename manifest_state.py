@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+
+# Columns that make up a COLUMN_LINEAGE row; a change in any of them rewrites the row
+ROW_DIGEST_COLUMNS = ['unique_key', 'database', 'schema', 'table_name', 'column_name',
+                      'column_description', 'resource_type', 'name', 'sql', 'reference']
+
+# Load the per-node state saved by the previous run (empty if this is the first run)
+def load_state(file_path):
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+# Save the state atomically so an interrupted run never leaves a half-written file
+def save_state(file_path, state):
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file)
+    os.replace(tmp_path, file_path)
+
+# Forget the saved state, so the next incremental run starts with a full load
+def clear_state(file_path):
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+def row_digest(row):
+    # Stable digest of every loaded value of a row
+    payload = '\x1f'.join(str(row[column]) for column in ROW_DIGEST_COLUMNS)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+# Build {table_name: {"checksum": ..., "columns": {unique_key: row digest}}} from the lineage frame
+def build_state(df):
+    models = {}
+    for row in df.to_dict('records'):
+        model = models.setdefault(row['table_name'], {'checksum': row.get('checksum', ''), 'columns': {}})
+        model['columns'][row['unique_key']] = row_digest(row)
+    return {'models': models}
+
+# Compare two states and work out which models and columns were added, changed or removed
+def compute_delta(previous_state, current_state):
+    previous_models = previous_state.get('models', {})
+    current_models = current_state.get('models', {})
+
+    delta = {
+        'added_models': [],
+        'changed_models': [],
+        'removed_models': [],
+        'upsert_keys': [],
+        'delete_keys': [],
+    }
+
+    for table_name, model in current_models.items():
+        previous_model = previous_models.get(table_name)
+        if previous_model is None:
+            delta['added_models'].append(table_name)
+            delta['upsert_keys'].extend(model['columns'])
+            continue
+
+        previous_columns = previous_model['columns']
+        changed_keys = [
+            unique_key for unique_key, digest in model['columns'].items()
+            if previous_columns.get(unique_key) != digest
+        ]
+        removed_keys = [unique_key for unique_key in previous_columns if unique_key not in model['columns']]
+
+        # The node checksum flags SQL changes; column digests also catch catalog and reference changes
+        if model['checksum'] != previous_model['checksum'] or changed_keys or removed_keys:
+            delta['changed_models'].append(table_name)
+        delta['upsert_keys'].extend(changed_keys)
+        delta['delete_keys'].extend(removed_keys)
+
+    for table_name, previous_model in previous_models.items():
+        if table_name not in current_models:
+            delta['removed_models'].append(table_name)
+            delta['delete_keys'].extend(previous_model['columns'])
+
+    return delta
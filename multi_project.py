@@ -0,0 +1,113 @@
+import argparse
+import os
+import time
+from collections import ChainMap, Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from read_manifest_catalog import (build_dataframe_from_manifest, connect_to_snowflake, insert_data_to_snowflake,
+                                   load_catalog, load_manifest, peak_memory_mb)
+
+# Catalog of every project, shared with the frame-building workers once through the pool initializer
+_reference_catalog_nodes = None
+
+def _init_worker(reference_catalog_nodes):
+    global _reference_catalog_nodes
+    _reference_catalog_nodes = reference_catalog_nodes
+
+# Find manifest.json / catalog.json in a project directory or its dbt target/ folder
+def find_artifacts(project_dir):
+    for artifact_dir in (project_dir, os.path.join(project_dir, 'target')):
+        manifest_path = os.path.join(artifact_dir, 'manifest.json')
+        catalog_path = os.path.join(artifact_dir, 'catalog.json')
+        if os.path.exists(manifest_path) and os.path.exists(catalog_path):
+            return manifest_path, catalog_path
+    raise FileNotFoundError(f"No manifest.json and catalog.json found in {project_dir}")
+
+def project_name(project_dir):
+    return os.path.basename(os.path.normpath(project_dir))
+
+# Phase 1 (in a worker): stream both artifacts and keep only the projected nodes
+def parse_project(project_dir):
+    start = time.perf_counter()
+    manifest_path, catalog_path = find_artifacts(project_dir)
+    nodes = list(load_manifest(manifest_path))
+    catalog_nodes = load_catalog(catalog_path)
+    return project_dir, nodes, catalog_nodes, time.perf_counter() - start
+
+# Phase 2 (in a worker): build the project's rows, resolving refs against every project's catalog
+def build_project_frame(project_dir, nodes, catalog_nodes):
+    start = time.perf_counter()
+    # The project's own catalog wins when two projects share a package name
+    df = build_dataframe_from_manifest(nodes, catalog_nodes, ChainMap(catalog_nodes, _reference_catalog_nodes))
+
+    # Qualify keys with the project so identical database.schema.model names never collide
+    project = project_name(project_dir)
+    df.insert(0, 'project', project)
+    df['unique_key'] = project + '.' + df['unique_key']
+    return project_dir, df, time.perf_counter() - start
+
+# Parse and build every project in a process pool and merge the frames
+def build_multi_project_dataframe(project_dirs, max_workers=None):
+    parse_seconds = {}
+    build_seconds = {}
+    parsed = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for project_dir, nodes, catalog_nodes, seconds in pool.map(parse_project, project_dirs):
+            parsed[project_dir] = (nodes, catalog_nodes)
+            parse_seconds[project_dir] = seconds
+
+    # Node ids embed the package name, so the merged catalog resolves cross-project refs by key
+    reference_catalog_nodes = {}
+    for _, catalog_nodes in parsed.values():
+        reference_catalog_nodes.update(catalog_nodes)
+
+    frames = {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(reference_catalog_nodes,)) as pool:
+        futures = [pool.submit(build_project_frame, project_dir, *parsed.pop(project_dir))
+                   for project_dir in project_dirs]
+        for future in futures:
+            project_dir, df, seconds = future.result()
+            frames[project_dir] = df
+            build_seconds[project_dir] = seconds
+
+    # Per-project timing output
+    for project_dir in project_dirs:
+        print(f"{project_name(project_dir)}: {len(frames[project_dir])} rows, "
+              f"parse {parse_seconds[project_dir]:.2f}s, build {build_seconds[project_dir]:.2f}s")
+
+    return pd.concat([frames[project_dir] for project_dir in project_dirs], ignore_index=True)
+
+# Main Function to Execute the Process
+def main():
+    parser = argparse.ArgumentParser(description='Ingest several dbt projects into COLUMN_LINEAGE in one load')
+    parser.add_argument('project_dirs', nargs='+', help='directories holding manifest.json and catalog.json')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: CPU count)')
+    parser.add_argument('--no-load', action='store_true', help='build and report without loading Snowflake')
+    args = parser.parse_args()
+
+    name_counts = Counter(project_name(project_dir) for project_dir in args.project_dirs)
+    duplicate_names = [name for name, count in name_counts.items() if count > 1]
+    if duplicate_names:
+        parser.error(f"project directory names must be unique: {', '.join(sorted(duplicate_names))}")
+
+    start = time.perf_counter()
+    df = build_multi_project_dataframe(args.project_dirs, args.workers)
+    peak_mb = peak_memory_mb()
+    print(f"Built {len(df)} rows from {len(args.project_dirs)} projects in {time.perf_counter() - start:.2f}s"
+          + (f", peak memory {peak_mb:.1f} MB" if peak_mb is not None else ''))
+
+    if args.no_load:
+        return
+
+    # A single consolidated load for every project
+    conn = connect_to_snowflake()
+    insert_data_to_snowflake(conn, df)
+    conn.close()
+
+    print("Data has been successfully inserted into Snowflake.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import pandas as pd
+from lineage_sinks import get_sink, timed_load
+from read_manifest_catalog import (build_column_description_map, build_reference_columns, format_reference,
+                                   index_catalog_columns, sql_hash)
+
+# One row per catalog node: the SQL and model attributes are stored once per model
+MODEL_COLUMNS = ['table_name', 'database', 'schema', 'resource_type', 'name', 'sql', 'sql_hash', 'checksum']
+
+# One row per column, pointing at its model by table_name
+COLUMN_COLUMNS = ['unique_key', 'table_name', 'column_name', 'column_description']
+
+# One row per candidate upstream column of a model, in REFERENCE order
+UPSTREAM_COLUMNS = ['upstream_key', 'table_name', 'ordinal', 'ref_name', 'ref_column', 'ref_description']
+
+# Snowflake tables (see ddl_script.sql) for each normalized frame and its key column
+NORMALIZED_TABLES = {
+    'models': ('COLUMN_LINEAGE_MODEL', MODEL_COLUMNS, 'table_name'),
+    'columns': ('COLUMN_LINEAGE_COLUMN', COLUMN_COLUMNS, 'unique_key'),
+    'upstream_columns': ('COLUMN_LINEAGE_UPSTREAM', UPSTREAM_COLUMNS, 'upstream_key'),
+}
+
+# Build the normalized model, column and upstream-column frames from manifest and catalog nodes
+def build_normalized_tables(nodes, catalog_nodes):
+    models = {}
+    columns = []
+
+    for node_key, node_info in catalog_nodes.items():
+        metadata = node_info.get('metadata', {})
+        models[node_key] = {
+            'table_name': node_key,
+            'database': metadata.get('database', ''),
+            'schema': metadata.get('schema', ''),
+            'resource_type': '',
+            'name': '',
+            'sql': '',
+            'sql_hash': '',
+            'checksum': '',
+        }
+        for column_name in node_info.get('columns', {}):
+            columns.append({
+                'unique_key': f"{metadata.get('database', '')}.{metadata.get('schema', '')}.{node_key}.{column_name}",
+                'table_name': node_key,
+                'column_name': column_name,
+                'column_description': '',
+            })
+
+    rows_by_table = index_catalog_columns(columns)
+    upstream_by_table = {}
+
+    node_items = nodes.items() if isinstance(nodes, dict) else nodes
+    for node_key, node_info in node_items:
+        rows = rows_by_table.get(node_key.lower())
+        if not rows:
+            continue
+
+        sql = node_info.get('raw_code', '')
+        descriptions = build_column_description_map(node_info.get('columns', {}))
+        reference_columns = build_reference_columns(node_key, node_info.get('refs', []), catalog_nodes,
+                                                    node_info.get('package_name'))
+
+        # Case-insensitive matches can hit more than one catalog table; each gets the manifest attributes
+        for table_name in {item['table_name'] for item in rows}:
+            models[table_name].update({
+                'resource_type': node_info.get('resource_type', ''),
+                'name': node_info.get('name', ''),
+                'sql': sql,
+                'sql_hash': sql_hash(sql),
+                'checksum': node_info.get('checksum', {}).get('checksum', ''),
+            })
+            upstream_by_table[table_name] = [
+                {
+                    'upstream_key': f"{table_name}.{ordinal}",
+                    'table_name': table_name,
+                    'ordinal': ordinal,
+                    'ref_name': ref_name,
+                    'ref_column': ref_column,
+                    'ref_description': ref_description,
+                }
+                for ordinal, (ref_name, ref_column, ref_description) in enumerate(reference_columns)
+            ]
+
+        for item in rows:
+            column_description = descriptions.get(item['column_name'].lower())
+            if column_description is not None:
+                item['column_description'] = column_description
+
+    upstream_columns = [row for table_rows in upstream_by_table.values() for row in table_rows]
+    return {
+        'models': pd.DataFrame(list(models.values()), columns=MODEL_COLUMNS),
+        'columns': pd.DataFrame(columns, columns=COLUMN_COLUMNS),
+        'upstream_columns': pd.DataFrame(upstream_columns, columns=UPSTREAM_COLUMNS),
+    }
+
+# Reassemble the legacy one-row-per-column layout, optionally only for some models
+def denormalize(tables, table_names=None):
+    models = tables['models']
+    columns = tables['columns']
+    upstream_columns = tables['upstream_columns']
+
+    if table_names is not None:
+        table_names = set(table_names)
+        models = models[models['table_name'].isin(table_names)]
+        columns = columns[columns['table_name'].isin(table_names)]
+        upstream_columns = upstream_columns[upstream_columns['table_name'].isin(table_names)]
+
+    references = {
+        table_name: format_reference(
+            group.sort_values('ordinal')[['ref_name', 'ref_column', 'ref_description']].itertuples(index=False)
+        )
+        for table_name, group in upstream_columns.groupby('table_name', sort=False)
+    }
+
+    df = columns.merge(models, on='table_name', how='left', sort=False)
+    df['reference'] = df['table_name'].map(references).fillna('')
+    return df[['unique_key', 'database', 'schema', 'table_name', 'column_name', 'resource_type', 'name',
+               'sql', 'sql_hash', 'reference', 'column_description', 'checksum']]
+
+# Load every normalized frame into its Snowflake table through the configured sink
+def insert_normalized_to_snowflake(conn, tables):
+    for frame_name, (table, columns, key_column) in NORMALIZED_TABLES.items():
+        sink = get_sink(conn, table=table, columns=columns, key_column=key_column)
+        timed_load(sink, 'replace', tables[frame_name])
+        sink.close()
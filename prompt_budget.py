@@ -0,0 +1,110 @@
+import difflib
+import re
+
+from async_resolver import estimate_tokens
+from read_manifest_catalog import build_reference_columns, format_reference, load_catalog, load_manifest
+
+# Token-budgeted prompts: the REFERENCE string lists every column of every referenced model, which
+# dominates the prompt for wide marts. Candidate columns are pruned to the ones the SQL can reach or
+# whose name resembles the target column, and descriptions are dropped when the budget is still tight.
+
+# Entries of a REFERENCE string start with "ref_name.COLUMN: "; descriptions may contain commas. Column names
+# may be quoted ("Order Total") or contain other non-word characters, just not an unquoted ':' or ','.
+REFERENCE_ENTRY_PATTERN = re.compile(r'(?:^|, )([\w$]+)\.("(?:[^"]|"")*"|[^:,]+?): ')
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][\w$]*")
+
+# Fallback for models the ReferenceIndex doesn't know: split the rendered string back into entries
+def parse_reference(reference):
+    if not isinstance(reference, str) or not reference:
+        return []
+    matches = list(REFERENCE_ENTRY_PATTERN.finditer(reference))
+    reference_columns = []
+    for position, match in enumerate(matches):
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(reference)
+        reference_columns.append((match.group(1), match.group(2), reference[match.end():end].strip()))
+    return reference_columns
+
+# Structured reference columns straight from the manifest refs and catalog columns, the data
+# read_manifest_catalog renders into REFERENCE, so names never have to be recovered from the string
+class ReferenceIndex:
+    def __init__(self, manifest_path, catalog_path):
+        self.catalog_nodes = load_catalog(catalog_path)
+        self.refs = {node_key.lower(): (node_key, node_info.get('refs', []), node_info.get('package_name'))
+                     for node_key, node_info in load_manifest(manifest_path)}
+
+    # (ref_name, ref_column, description) of a model, or None when the model is unknown or its REFERENCE was
+    # rendered from a different manifest/catalog than the one loaded
+    def columns(self, table_name, reference):
+        node = self.refs.get(str(table_name).lower())
+        if node is None:
+            return None
+        reference_columns = build_reference_columns(node[0], node[1], self.catalog_nodes, node[2])
+        return reference_columns if format_reference(reference_columns) == (reference or '') else None
+
+def is_name_similar(column_name, target_column, threshold=0.8):
+    column_name, target_column = column_name.lower(), target_column.lower()
+    if column_name in target_column or target_column in column_name:
+        return True
+    # The cheap upper bounds rule out most pairs before the full ratio is computed
+    matcher = difflib.SequenceMatcher(None, column_name, target_column)
+    return (matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold
+            and matcher.ratio() >= threshold)
+
+# Keep the upstream columns textually reachable from the SQL or name-similar to the target column.
+# A column passed through a "select *" keeps its name, so it survives through the similarity check.
+def prune_reference_columns(reference_columns, sql, column_name):
+    identifiers = {identifier.lower() for identifier in IDENTIFIER_PATTERN.findall(sql or '')}
+    return [
+        (ref_name, ref_column, description) for ref_name, ref_column, description in reference_columns
+        if ref_column.lower() in identifiers or is_name_similar(ref_column, column_name)
+    ]
+
+# Longest prefix of items for which fits(prefix) holds (fits must be monotonic)
+def longest_fitting_prefix(items, fits):
+    low, high = 0, len(items)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(items[:middle]):
+            low = middle
+        else:
+            high = middle - 1
+    return items[:low]
+
+# Prune the reference and fit the prompt into the token budget; returns (prompt, prompt tokens before,
+# prompt tokens after). build_prompt is called as build_prompt(reference, sql) and renders the rest of the
+# prompt around them. reference_columns, when given, are the structured entries of reference.
+def fit_reference(build_prompt, reference, sql, column_name, token_budget, reference_columns=None):
+    def fits(prompt):
+        return estimate_tokens(prompt) <= token_budget
+
+    tokens_before = estimate_tokens(build_prompt(reference, sql))
+    if reference_columns is None:
+        reference_columns = parse_reference(reference)
+
+    reference_columns = prune_reference_columns(reference_columns, sql, column_name)
+    prompt = build_prompt(format_reference(reference_columns), sql)
+    if fits(prompt):
+        return prompt, tokens_before, estimate_tokens(prompt)
+
+    # Still over budget: names alone are enough to trace lineage
+    names = [f"{ref_name}.{ref_column}" for ref_name, ref_column, _ in reference_columns]
+    prompt = build_prompt(', '.join(names), sql)
+    if fits(prompt):
+        return prompt, tokens_before, estimate_tokens(prompt)
+
+    # Then as many candidate columns as fit, in reference order
+    if fits(build_prompt('', sql)):
+        names = longest_fitting_prefix(names, lambda prefix: fits(build_prompt(', '.join(prefix), sql)))
+        print(f"Prompt for {column_name}: kept {len(names)} of {len(reference_columns)} candidate columns "
+              f"to fit the {token_budget}-token budget")
+        prompt = build_prompt(', '.join(names), sql)
+        return prompt, tokens_before, estimate_tokens(prompt)
+
+    # The SQL alone is over budget: send its head, with no candidate columns
+    marker = '\n-- [SQL truncated to fit the prompt token budget]'
+    head = longest_fitting_prefix(sql or '', lambda prefix: fits(build_prompt('', prefix + marker)))
+    prompt = build_prompt('', head + marker)
+    overflow = estimate_tokens(prompt) - token_budget
+    print(f"Prompt for {column_name}: SQL truncated to {len(head)} of {len(sql or '')} characters to fit the "
+          f"{token_budget}-token budget" + (f", still {overflow} tokens over" if overflow > 0 else ''))
+    return prompt, tokens_before, estimate_tokens(prompt)
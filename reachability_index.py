@@ -0,0 +1,177 @@
+import pickle
+
+from iterate_lineage import build_lineage_index, column_node
+
+# Reachability index over the COLUMN_LINEAGE_GENAI edges: the ancestor set and root sources of every column
+# are precomputed, so "is A upstream of B" is a set lookup and "all root sources of B" a set read instead of
+# a fresh recursive walk. Cycles are condensed into strongly connected components, whose members share one
+# ancestor set. When the lineage of some columns changes, only those columns and their descendants are
+# recomputed.
+
+# {column: [upstream columns]} ("model.column" names) from a COLUMN_LINEAGE_GENAI frame (or its CSV export)
+def lineage_edges(df):
+    edges = {}
+    for (model_name, column_name), (_, _, upstream) in build_lineage_index(df).items():
+        name = column_node(model_name, column_name)
+        if name and name not in edges:
+            edges[name] = [upstream_name for upstream_name in
+                           (column_node(upstream_model, upstream_column) for upstream_model, upstream_column in upstream)
+                           if upstream_name]
+    return edges
+
+class ReachabilityIndex:
+    def __init__(self):
+        self.names = []
+        self.node_ids = {}
+        self.upstream = []     # node id -> tuple of upstream node ids
+        self.downstream = []   # node id -> set of downstream node ids
+        self.ancestors = []    # node id -> frozenset of ancestor node ids
+        self.roots = []        # node id -> frozenset of ancestors that have no upstream lineage
+
+    @classmethod
+    def build(cls, edges):
+        index = cls()
+        index.update(edges)
+        return index
+
+    def _node_id(self, name):
+        if name not in self.node_ids:
+            self.node_ids[name] = len(self.names)
+            self.names.append(name)
+            self.upstream.append(())
+            self.downstream.append(set())
+            self.ancestors.append(frozenset())
+            self.roots.append(frozenset())
+        return self.node_ids[name]
+
+    # Replace the upstream lineage of the given columns ({column: [upstream columns]}) and recompute the
+    # closure of those columns and everything downstream of them; returns the number of columns recomputed
+    def update(self, edges):
+        changed = []
+        for name, upstream_names in edges.items():
+            node_id = self._node_id(name)
+            upstream = tuple(dict.fromkeys(self._node_id(upstream_name) for upstream_name in upstream_names))
+            for upstream_id in self.upstream[node_id]:
+                self.downstream[upstream_id].discard(node_id)
+            for upstream_id in upstream:
+                self.downstream[upstream_id].add(node_id)
+            self.upstream[node_id] = upstream
+            changed.append(node_id)
+
+        affected = set(changed)
+        stack = list(changed)
+        while stack:
+            for downstream_id in self.downstream[stack.pop()]:
+                if downstream_id not in affected:
+                    affected.add(downstream_id)
+                    stack.append(downstream_id)
+
+        # Components come out upstream-first, so every external upstream closure is already up to date
+        for component in self._components(affected):
+            members = set(component)
+            ancestors = set()
+            roots = set()
+            for node_id in component:
+                for upstream_id in self.upstream[node_id]:
+                    if upstream_id in members:
+                        continue
+                    ancestors.add(upstream_id)
+                    ancestors |= self.ancestors[upstream_id]
+                    if self.upstream[upstream_id]:
+                        roots |= self.roots[upstream_id]
+                    else:
+                        roots.add(upstream_id)
+            # A cycle (or a column listed as its own upstream) makes every member an ancestor of the others
+            if len(component) > 1 or component[0] in self.upstream[component[0]]:
+                ancestors |= members
+            ancestors, roots = frozenset(ancestors), frozenset(roots)
+            for node_id in component:
+                self.ancestors[node_id] = ancestors
+                self.roots[node_id] = roots
+        return len(affected)
+
+    # Apply a full edge map, updating only the columns whose upstream lineage differs from the index
+    def sync(self, edges):
+        changed = {name: upstream_names for name, upstream_names in edges.items()
+                   if name not in self.node_ids
+                   or self.node_names(self.upstream[self.node_ids[name]]) != list(dict.fromkeys(upstream_names))}
+        # Columns that no longer have lineage rows lose their upstream edges
+        for name, node_id in self.node_ids.items():
+            if name not in edges and self.upstream[node_id]:
+                changed[name] = []
+        return self.update(changed) if changed else 0
+
+    # Strongly connected components of the nodes in subset (edges pointing upstream), iterative Tarjan.
+    # Components are returned in reverse topological order: a component comes after all of its upstreams.
+    def _components(self, subset):
+        index_of = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+        for start in subset:
+            if start in index_of:
+                continue
+            work = [(start, iter(self.upstream[start]))]
+            index_of[start] = lowlink[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                node_id, upstream = work[-1]
+                for upstream_id in upstream:
+                    if upstream_id not in subset:
+                        continue
+                    if upstream_id not in index_of:
+                        index_of[upstream_id] = lowlink[upstream_id] = counter
+                        counter += 1
+                        stack.append(upstream_id)
+                        on_stack.add(upstream_id)
+                        work.append((upstream_id, iter(self.upstream[upstream_id])))
+                        break
+                    if upstream_id in on_stack:
+                        lowlink[node_id] = min(lowlink[node_id], index_of[upstream_id])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node_id])
+                    if lowlink[node_id] == index_of[node_id]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node_id:
+                                break
+                        components.append(component)
+        return components
+
+    def node_names(self, node_ids):
+        return [self.names[node_id] for node_id in node_ids]
+
+    def is_ancestor(self, ancestor, column):
+        ancestor_id, column_id = self.node_ids.get(ancestor), self.node_ids.get(column)
+        return ancestor_id is not None and column_id is not None and ancestor_id in self.ancestors[column_id]
+
+    def ancestors_of(self, column):
+        node_id = self.node_ids.get(column)
+        return set() if node_id is None else set(self.node_names(self.ancestors[node_id]))
+
+    # Root sources: the ancestors that have no upstream lineage of their own
+    def root_sources(self, column):
+        node_id = self.node_ids.get(column)
+        return set() if node_id is None else set(self.node_names(self.roots[node_id]))
+
+    def save(self, file_path):
+        with open(file_path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'rb') as file:
+            index = pickle.load(file)
+        if not isinstance(index, cls):
+            raise ValueError(f"{file_path} is not a reachability index")
+        return index
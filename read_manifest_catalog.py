@@ -1,23 +1,99 @@
-import json
+import hashlib
+import ijson
 import pandas as pd
 import snowflake.connector
 import os
 from dotenv import load_dotenv
+from lineage_sinks import get_sink, timed_load
+from manifest_state import build_state, clear_state, compute_delta, load_state, save_state
+
+# resource is POSIX-only; peak memory isn't reported where it is missing (e.g. Windows)
+try:
+    import resource
+except ImportError:
+    resource = None
 
 load_dotenv()
 
+# Only the node fields the pipeline reads are kept while streaming
+MANIFEST_NODE_FIELDS = ('resource_type', 'name', 'package_name', 'raw_code', 'refs', 'columns', 'metadata', 'checksum')
+CATALOG_NODE_FIELDS = ('metadata', 'columns')
+
 # Step 1: Load JSON Files
+def stream_nodes(file_path, fields):
+    # Incrementally parse the file and yield (node_key, node_info) for each entry under
+    # the top-level "nodes" key, so macros, docs and compiled code are never held in memory
+    with open(file_path, 'rb') as file:
+        for node_key, node_info in ijson.kvitems(file, 'nodes', use_float=True):
+            yield node_key, {field: node_info[field] for field in fields if field in node_info}
+
 def load_manifest(file_path):
-    with open(file_path, 'r') as file:
-        manifest = json.load(file)
-    return manifest.get('nodes', {})
+    return stream_nodes(file_path, MANIFEST_NODE_FIELDS)
 
 def load_catalog(file_path):
-    with open(file_path, 'r') as file:
-        catalog = json.load(file)
-    return catalog.get('nodes', {})
+    # Catalog nodes are looked up by key when resolving refs, so keep the projected nodes
+    return dict(stream_nodes(file_path, CATALOG_NODE_FIELDS))
+
+def peak_memory_mb():
+    # Peak resident set size of this process (ru_maxrss is reported in KB on Linux); None without resource
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Step 2: Join manifest and catalog information
+def index_catalog_columns(data):
+    # Group the catalog column rows by lowercase node id so each manifest node
+    # finds its columns with a single dictionary lookup
+    index = {}
+    for item in data:
+        index.setdefault(item['table_name'].lower(), []).append(item)
+    return index
+
+def build_column_description_map(columns):
+    # Map lowercase column name -> description for a single manifest model
+    return {column_key.lower(): column_info.get('description', '') for column_key, column_info in columns.items()}
+
+def build_reference_columns(node_key, refs, catalog_nodes, package_name=None):
+    # Collect (ref_name, ref_column_name, ref_column_description) for every column of every referenced model
+    reference_columns = []
+    for ref in refs:
+        ref_name = ref.get('name', '')
+        if ref_name:
+            # Cross-project refs name their package; otherwise the ref lives in the node's own package
+            # (node_key is structured like "model.package_name.table_name" when package_name is unknown)
+            ref_package = ref.get('package') or package_name or node_key.split('.')[1]
+
+            # Construct the reference key dynamically
+            ref_key = f"model.{ref_package}.{ref_name}"
+
+            # Retrieve columns from catalog_nodes using the dynamically constructed key
+            ref_columns = catalog_nodes.get(ref_key, {}).get('columns', {})
+
+            for ref_column_name, ref_column_info in ref_columns.items():
+                reference_columns.append((ref_name, ref_column_name, ref_column_info.get('description', '')))
+
+    return reference_columns
+
+def format_reference(reference_columns):
+    # Render structured reference columns as the comma-joined REFERENCE string
+    return ', '.join(
+        f"{ref_name}.{ref_column_name}: {ref_column_description}"
+        for ref_name, ref_column_name, ref_column_description in reference_columns
+    )
+
+def build_reference(node_key, refs, catalog_nodes, package_name=None):
+    # Prepare reference information
+    return format_reference(build_reference_columns(node_key, refs, catalog_nodes, package_name))
+
+def sql_hash(sql):
+    # MD5 of the model SQL, stored with each row so change detection can compare hashes server-side
+    return hashlib.md5(sql.encode()).hexdigest() if sql else ''
+
+def build_dataframe_from_manifest(nodes, catalog_nodes, reference_catalog_nodes=None):
+    # Refs are resolved against reference_catalog_nodes when given (e.g. the catalogs of several projects)
+    if reference_catalog_nodes is None:
+        reference_catalog_nodes = catalog_nodes
 
-def build_dataframe_from_manifest(nodes, catalog_nodes):
     data = []
 
     # Build initial table and column list from catalog.json
@@ -40,56 +116,61 @@ def build_dataframe_from_manifest(nodes, catalog_nodes):
                 'resource_type': '',  # Initialize as empty
                 'name': '',  # Initialize as empty
                 'sql': '',  # Initialize as empty
+                'sql_hash': '',  # Initialize as empty
                 'reference': '',  # Initialize as empty
-                'column_description': ''  # Initialize as empty
+                'column_description': '',  # Initialize as empty
+                'checksum': ''  # Initialize as empty
             })
 
-    # Enrich data with information from manifest.json
-    for node_key, node_info in nodes.items():
-        table_name = node_key  # Use the full node_key from manifest.json
+    # Index the catalog rows once instead of scanning them for every manifest node
+    rows_by_table = index_catalog_columns(data)
+
+    # Enrich data with information from manifest.json; nodes may be a dict or a
+    # stream of (node_key, node_info) pairs from load_manifest
+    node_items = nodes.items() if isinstance(nodes, dict) else nodes
+    for node_key, node_info in node_items:
+        rows = rows_by_table.get(node_key.lower())
+        if not rows:
+            continue
+
         resource_type = node_info.get('resource_type', '')
         name = node_info.get('name', '')
         sql = node_info.get('raw_code', '')
-        refs = node_info.get('refs', [])
-        columns = node_info.get('columns', {})  # Get columns from manifest
-
-        table_name_lower = table_name.lower()  # Convert once for comparison
-
-        for item in data:
-            # Perform comparison without modifying original data
-            if item['table_name'].lower() == table_name_lower:
-                item['resource_type'] = resource_type
-                item['name'] = name
-                item['sql'] = sql
-
-                # Find column description in manifest
-                for column_key, column_info in columns.items():
-                    if item['column_name'].lower() == column_key.lower():
-                        item['column_description'] = column_info.get('description', '')
-
-                # Prepare reference information
-                reference_info = []
-                for ref in refs:
-                    ref_name = ref.get('name', '')
-                    if ref_name:
-                        # Dynamically extract package name from node_key
-                        package_name = node_key.split('.')[1]  # Assuming node_key is structured like "model.package_name.table_name"
-                        
-                        # Construct the reference key dynamically
-                        ref_key = f"model.{package_name}.{ref_name}"
-                        
-                        # Retrieve columns from catalog_nodes using the dynamically constructed key
-                        ref_columns = catalog_nodes.get(ref_key, {}).get('columns', {})
-                        
-                        for ref_column_name, ref_column_info in ref_columns.items():
-                            ref_column_description = ref_column_info.get('description', '')
-                            reference_info.append(f"{ref_name}.{ref_column_name}: {ref_column_description}")
-
-                item['reference'] = ', '.join(reference_info)
+        hashed_sql = sql_hash(sql)
+        checksum = node_info.get('checksum', {}).get('checksum', '')
+        descriptions = build_column_description_map(node_info.get('columns', {}))
+        reference = build_reference(node_key, node_info.get('refs', []), reference_catalog_nodes,
+                                    node_info.get('package_name'))
+
+        for item in rows:
+            item['resource_type'] = resource_type
+            item['name'] = name
+            item['sql'] = sql
+            item['sql_hash'] = hashed_sql
+            item['checksum'] = checksum
+
+            # Find column description in manifest
+            column_description = descriptions.get(item['column_name'].lower())
+            if column_description is not None:
+                item['column_description'] = column_description
+
+            item['reference'] = reference
 
     df = pd.DataFrame(data)
     return df
 
+def build_lineage_dataframe(manifest_path, catalog_path):
+    # Load the manifest and catalog files and join them into the COLUMN_LINEAGE layout.
+    # parse_backend=records streams the nodes into slotted records (lineage_records.py): a lower peak than
+    # the per-row dicts for a slightly slower build, so the dict path stays the default
+    if os.getenv('parse_backend', 'stream') == 'records':
+        from lineage_records import build_lineage_dataframe_from_records
+        return build_lineage_dataframe_from_records(manifest_path, catalog_path)
+
+    nodes = load_manifest(manifest_path)
+    catalog_nodes = load_catalog(catalog_path)
+    return build_dataframe_from_manifest(nodes, catalog_nodes)
+
 
 
 # Step 3: Connect to Snowflake and Load Data
@@ -107,53 +188,73 @@ def connect_to_snowflake():
     return conn
 
 def insert_data_to_snowflake(conn, df):
-    # Truncate the existing table
-    truncate_table_query = "TRUNCATE TABLE COLUMN_LINEAGE;"
-
-    # Insert data into Snowflake table
-    insert_query = """
-    INSERT INTO column_lineage (unique_key, database, schema, table_name, column_name, column_description, resource_type, name, sql, reference)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-
-    # Get environment variables
-    warehouse = os.getenv('warehouse')
-    database = os.getenv('database')
-    schema = os.getenv('schema')
-
-    cursor = conn.cursor()
-    # Use environment variables in SQL commands
-    cursor.execute(f"USE WAREHOUSE {warehouse};")  # Explicitly set the warehouse
-    cursor.execute(f"USE DATABASE {database};")
-    cursor.execute(f"USE SCHEMA {schema};")
-
-    # Truncate the table before inserting
-    cursor.execute(truncate_table_query)
-
-    # Convert DataFrame to list of tuples for insertion
-    data_to_insert = df[['unique_key', 'database', 'schema', 'table_name', 'column_name',
-                         'column_description', 'resource_type', 'name', 'sql', 'reference']].values.tolist()
-    cursor.executemany(insert_query, data_to_insert)
-    conn.commit()
-    cursor.close()
+    # Truncate COLUMN_LINEAGE and reload every row through the configured sink
+    sink = get_sink(conn)
+    rows_written = timed_load(sink, 'replace', df)
+    sink.close()
+    return rows_written
+
+def apply_delta_to_snowflake(conn, df, delta):
+    # Apply only the changed rows and the removed keys through the configured sink
+    upserts = df[df['unique_key'].isin(set(delta['upsert_keys']))]
+    sink = get_sink(conn)
+    rows_written = timed_load(sink, 'apply_delta', upserts, delta['delete_keys'])
+    sink.close()
+    return rows_written
 
 # Main Function to Execute the Process
 def main():
     # Load the manifest and catalog files
     manifest_path = 'manifest.json'  # Replace with your manifest.json path
     catalog_path = 'catalog.json'    # Replace with your catalog.json path
+    state_path = os.getenv('lineage_state_path', 'column_lineage_state.json')
 
-    nodes = load_manifest(manifest_path)
-    catalog_nodes = load_catalog(catalog_path)
+    # The normalized layout stores each model's SQL and references once (see normalized_lineage.py) and
+    # replaces the COLUMN_LINEAGE load: readers use the COLUMN_LINEAGE_V view over the normalized tables
+    if os.getenv('storage_layout', 'denormalized') == 'normalized':
+        from normalized_lineage import build_normalized_tables, insert_normalized_to_snowflake
+        tables = build_normalized_tables(load_manifest(manifest_path), load_catalog(catalog_path))
+        peak_mb = peak_memory_mb()
+        print(f"Built {len(tables['models'])} model and {len(tables['columns'])} column rows"
+              + (f", peak memory {peak_mb:.1f} MB" if peak_mb is not None else ''))
+
+        conn = connect_to_snowflake()
+        insert_normalized_to_snowflake(conn, tables)
+        conn.close()
+
+        # The state describes what COLUMN_LINEAGE holds, which this layout doesn't update; dropping it makes
+        # the next incremental run with the denormalized layout start over with a full load
+        clear_state(state_path)
+
+        print("Data has been successfully inserted into Snowflake.")
+        return
 
     # Build the DataFrame
-    df = build_dataframe_from_manifest(nodes, catalog_nodes)
+    df = build_lineage_dataframe(manifest_path, catalog_path)
+    peak_mb = peak_memory_mb()
+    print(f"Built {len(df)} column rows" + (f", peak memory {peak_mb:.1f} MB" if peak_mb is not None else ''))
 
     # Connect to Snowflake
     conn = connect_to_snowflake()
 
-    # Insert data into Snowflake
-    insert_data_to_snowflake(conn, df)
+    # Incremental mode applies only the delta against the state saved by the previous run
+    load_mode = os.getenv('load_mode', 'full')
+    current_state = build_state(df)
+    previous_state = load_state(state_path) if load_mode == 'incremental' else None
+
+    if previous_state is None:
+        # Insert data into Snowflake
+        insert_data_to_snowflake(conn, df)
+        print(f"Full load: {len(df)} rows written.")
+    else:
+        delta = compute_delta(previous_state, current_state)
+        rows_written = apply_delta_to_snowflake(conn, df, delta)
+        print(f"Incremental load: {len(delta['added_models'])} added, {len(delta['changed_models'])} changed, "
+              f"{len(delta['removed_models'])} removed models; {len(delta['upsert_keys'])} upserted and "
+              f"{len(delta['delete_keys'])} deleted columns ({rows_written} rows written).")
+
+    # Remember this manifest's per-node state for the next incremental run
+    save_state(state_path, current_state)
 
     # Close Snowflake connection
     conn.close()
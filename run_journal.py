@@ -0,0 +1,123 @@
+import sqlite3
+import time
+import uuid
+
+# Journal of a gen_column_lineage run: the planned keys grouped into batches, which batches are in flight
+# and which keys have been written back. A run that stops can be resumed by its run ID and only the keys
+# that were never written are fetched and resolved again.
+
+def new_run_id():
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+class RunJournal:
+    def __init__(self, path='lineage_runs.sqlite', run_id=None):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, created_at REAL, status TEXT);
+            CREATE TABLE IF NOT EXISTS run_batches (run_id TEXT, batch_no INTEGER, status TEXT, started_at REAL,
+                                                    PRIMARY KEY (run_id, batch_no));
+            CREATE TABLE IF NOT EXISTS run_keys (run_id TEXT, unique_key TEXT, batch_no INTEGER, completed_at REAL,
+                                                 PRIMARY KEY (run_id, unique_key));
+        """)
+        if run_id is None:
+            run_id = new_run_id()
+            self.conn.execute("INSERT INTO runs VALUES (?, ?, 'planning')", (run_id, time.time()))
+            self.conn.commit()
+        elif self.conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is None:
+            raise ValueError(f"Unknown run ID {run_id}")
+        self.run_id = run_id
+        self.started_at = time.perf_counter()
+        self.completed_this_session = 0
+
+    def is_planned(self):
+        status = self.conn.execute("SELECT status FROM runs WHERE run_id = ?", (self.run_id,)).fetchone()[0]
+        return status != 'planning'
+
+    # Record the planned work: an iterable of record frames, one per batch
+    def plan(self, batches):
+        for batch_no, batch in enumerate(batches):
+            self.conn.execute("INSERT INTO run_batches VALUES (?, ?, 'planned', NULL)", (self.run_id, batch_no))
+            self.conn.executemany("INSERT OR IGNORE INTO run_keys VALUES (?, ?, ?, NULL)",
+                                  [(self.run_id, unique_key, batch_no) for unique_key in batch['UNIQUE_KEY']])
+        self.conn.execute("UPDATE runs SET status = 'running' WHERE run_id = ?", (self.run_id,))
+        self.conn.commit()
+
+    def pending_keys(self):
+        return [unique_key for (unique_key,) in self.conn.execute(
+            "SELECT unique_key FROM run_keys WHERE run_id = ? AND completed_at IS NULL ORDER BY batch_no",
+            (self.run_id,))]
+
+    def in_flight_batches(self):
+        return [batch_no for (batch_no,) in self.conn.execute(
+            "SELECT batch_no FROM run_batches WHERE run_id = ? AND status = 'in_flight' ORDER BY batch_no",
+            (self.run_id,))]
+
+    # Split records back into their planned batches, pending batches only, in plan order
+    def batches(self, records):
+        batch_numbers = dict(self.conn.execute(
+            "SELECT unique_key, batch_no FROM run_keys WHERE run_id = ? AND completed_at IS NULL", (self.run_id,)))
+        pending = records[records['UNIQUE_KEY'].isin(batch_numbers)]
+        for batch_no, batch in pending.groupby(pending['UNIQUE_KEY'].map(batch_numbers), sort=True):
+            yield int(batch_no), batch
+
+    def start_batch(self, batch_no):
+        self.conn.execute(
+            "UPDATE run_batches SET status = 'in_flight', started_at = ? WHERE run_id = ? AND batch_no = ?",
+            (time.time(), self.run_id, batch_no)
+        )
+        self.conn.commit()
+
+    # Mark keys as written back; called after each write-back flush
+    def complete(self, unique_keys):
+        now = time.time()
+        updated = self.conn.executemany(
+            "UPDATE run_keys SET completed_at = ? WHERE run_id = ? AND unique_key = ? AND completed_at IS NULL",
+            [(now, self.run_id, unique_key) for unique_key in unique_keys]
+        ).rowcount
+        self.conn.execute("""
+            UPDATE run_batches SET status = 'done'
+            WHERE run_id = ? AND status != 'done' AND NOT EXISTS (
+                SELECT 1 FROM run_keys k
+                WHERE k.run_id = run_batches.run_id AND k.batch_no = run_batches.batch_no AND k.completed_at IS NULL
+            )
+        """, (self.run_id,))
+        self.conn.commit()
+        self.completed_this_session += updated
+
+    def progress(self):
+        completed, planned = self.conn.execute(
+            "SELECT COUNT(completed_at), COUNT(*) FROM run_keys WHERE run_id = ?", (self.run_id,)).fetchone()
+        return completed, planned
+
+    # Progress line with an ETA from the throughput observed in this session
+    def report_progress(self):
+        completed, planned = self.progress()
+        elapsed = time.perf_counter() - self.started_at
+        rate = self.completed_this_session / elapsed if elapsed > 0 else 0.0
+        eta = f"{(planned - completed) / rate:.0f}s" if rate > 0 else 'unknown'
+        print(f"Run {self.run_id}: {completed}/{planned} columns ({rate:.1f} columns/s, ETA {eta})")
+
+    def finish(self):
+        completed, planned = self.progress()
+        status = 'done' if completed == planned else 'incomplete'
+        self.conn.execute("UPDATE runs SET status = ? WHERE run_id = ?", (status, self.run_id))
+        self.conn.commit()
+        if status == 'incomplete':
+            print(f"Run {self.run_id} left {planned - completed} columns unresolved; "
+                  f"resume with --resume {self.run_id}")
+        else:
+            self.compact()
+        return status
+
+    # Drop every finished run, which has nothing left to resume, and give the space back to the filesystem;
+    # only incomplete runs stay in the journal
+    def compact(self):
+        finished_runs = "SELECT run_id FROM runs WHERE status = 'done'"
+        self.conn.execute(f"DELETE FROM run_keys WHERE run_id IN ({finished_runs})")
+        self.conn.execute(f"DELETE FROM run_batches WHERE run_id IN ({finished_runs})")
+        self.conn.execute("DELETE FROM runs WHERE status = 'done'")
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,172 @@
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.lineage import lineage
+from sqlglot.optimizer import qualify
+from sqlglot.optimizer.scope import build_scope
+
+# Deterministic column lineage with sqlglot, promoted from the exploration in sqlglot.ipynb.
+# dbt refs and sources are rendered to plain table names, catalog.json supplies the schema, and
+# each output column is traced through CTEs and aliases down to the ref/source tables it reads.
+
+DIALECT = 'snowflake'
+
+# Refs are rendered into this pseudo-database so models and sources share one two-level schema
+REF_DATABASE = 'dbt_ref'
+
+REF_PATTERN = re.compile(r"\{\{\s*ref\(\s*(?:'[^']*'\s*,\s*)?'([^']+)'\s*(?:,\s*v(?:ersion)?\s*=\s*[^)]*)?\)\s*\}\}")
+SOURCE_PATTERN = re.compile(r"\{\{\s*source\(\s*'([^']+)'\s*,\s*'([^']+)'\s*\)\s*\}\}")
+JINJA_EXPRESSION_PATTERN = re.compile(r"\{\{.*?\}\}", re.DOTALL)
+JINJA_BLOCK_PATTERN = re.compile(r"\{%.*?%\}|\{#.*?#\}", re.DOTALL)
+
+# Macro calls that can't be rendered become this function; columns reading it are left to the LLM
+UNRENDERED_FUNCTION = 'DBT_UNRENDERED_JINJA'
+
+# sqlglot logs a warning for every scope it can't trace; those columns simply fall back to the LLM
+@contextmanager
+def quiet_sqlglot():
+    logger = logging.getLogger('sqlglot')
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+# Build the sqlglot schema from catalog.json: {database: {table: {column: type}}}
+def build_schema(catalog):
+    schema = {REF_DATABASE: {}}
+    for node_key, node_info in catalog.get('nodes', {}).items():
+        columns = {column_name: column_info.get('type') or 'TEXT'
+                   for column_name, column_info in node_info.get('columns', {}).items()}
+        schema[REF_DATABASE][node_key.split('.')[-1].lower()] = columns
+    for source_key, source_info in catalog.get('sources', {}).items():
+        # source.<package>.<source_name>.<table_name>
+        source_name, table_name = source_key.split('.')[-2:]
+        columns = {column_name: column_info.get('type') or 'TEXT'
+                   for column_name, column_info in source_info.get('columns', {}).items()}
+        schema.setdefault(source_name.lower(), {})[table_name.lower()] = columns
+    return schema
+
+def load_schema(catalog_path):
+    with open(catalog_path, 'r') as file:
+        return build_schema(json.load(file))
+
+# Render refs and sources to table names; returns (sql, {qualified table: display name}) or (None, {})
+def render_dbt_sql(raw_code):
+    if JINJA_BLOCK_PATTERN.search(raw_code):
+        # Control flow and comments blocks can change the query shape; leave these models to the LLM
+        return None, {}
+
+    display_names = {}
+
+    def render_ref(match):
+        name = match.group(1)
+        display_names[f"{REF_DATABASE}.{name}".upper()] = name
+        return f"{REF_DATABASE}.{name}"
+
+    def render_source(match):
+        source_name, table_name = match.group(1), match.group(2)
+        display_names[f"{source_name}.{table_name}".upper()] = f"{source_name}.{table_name}"
+        return f"{source_name}.{table_name}"
+
+    sql = REF_PATTERN.sub(render_ref, raw_code)
+    sql = SOURCE_PATTERN.sub(render_source, sql)
+    sql = JINJA_EXPRESSION_PATTERN.sub(f"{UNRENDERED_FUNCTION}()", sql)
+    return sql, display_names
+
+def _is_passthrough(expression):
+    # A bare column (optionally aliased) carries the value through unchanged
+    return isinstance(expression.unalias(), exp.Column)
+
+def _transformation_sql(expression):
+    return expression.unalias().sql(dialect=DIALECT, comments=False)
+
+# Trace one output column to its upstream (table, column) pairs and describe the transformation
+def trace_column_lineage(column_name, expression, scope, schema, display_names):
+    node = lineage(column_name, expression, schema=schema, dialect=DIALECT, scope=scope, copy=False)
+
+    upstream = []
+    transformations = []
+    for current in node.walk():
+        if any(function.name.upper() == UNRENDERED_FUNCTION for function in current.expression.find_all(exp.Anonymous)):
+            return None
+        if isinstance(current.source, exp.Table) and not current.downstream:
+            table_key = '.'.join(part.upper() for part in (current.source.db, current.source.name) if part)
+            if table_key not in display_names:
+                # Reads from something that is neither a ref nor a source of this model
+                return None
+            pair = (display_names[table_key], current.name.split('.')[-1])
+            if pair not in upstream:
+                upstream.append(pair)
+        elif not _is_passthrough(current.expression):
+            transformation = _transformation_sql(current.expression)
+            if transformation not in transformations:
+                transformations.append(transformation)
+
+    if not upstream:
+        # Constants and expressions without column inputs are left to the LLM
+        return None
+    return upstream, transformations
+
+# Resolve every requested column of one model; unresolved columns map to None
+def resolve_model_columns(raw_code, column_names, schema):
+    results = {column_name: None for column_name in column_names}
+
+    sql, display_names = render_dbt_sql(raw_code or '')
+    if sql is None:
+        return results
+
+    try:
+        expression = qualify.qualify(sqlglot.parse_one(sql, dialect=DIALECT), dialect=DIALECT, schema=schema,
+                                     validate_qualify_columns=False, identify=False)
+        scope = build_scope(expression)
+    except sqlglot.errors.SqlglotError:
+        return results
+    if scope is None:
+        return results
+
+    output_columns = {select.alias_or_name.upper() for select in expression.selects}
+    for column_name in column_names:
+        if column_name.upper() not in output_columns:
+            continue
+        try:
+            traced = trace_column_lineage(column_name.upper(), expression, scope, schema, display_names)
+        except (sqlglot.errors.SqlglotError, KeyError, ValueError):
+            traced = None
+        if traced is not None:
+            results[column_name] = format_lineage(*traced)
+    return results
+
+# Render traced lineage as the UPSTREAM_TABLE, UPSTREAM_COLUMN and REASONING fields. Each table is listed
+# once, in first-use order; the columns are qualified by their table, so they still pair up unambiguously.
+def format_lineage(upstream, transformations):
+    upstream_tables = ', '.join(dict.fromkeys(table for table, _ in upstream))
+    upstream_columns = ', '.join(f"{table}.{column}" for table, column in upstream)
+    if transformations:
+        reasoning = f"Derived as {' <- '.join(transformations)}."
+    else:
+        reasoning = f"One to one mapping from {upstream_columns}."
+    return upstream_tables, upstream_columns, reasoning
+
+# Resolve records (a COLUMN_LINEAGE frame) model by model; returns one tuple or None per record, in order
+def resolve_records(records, schema):
+    start = time.perf_counter()
+    results = [None] * len(records)
+    positions_by_table = {}
+    for position, (table_name, column_name) in enumerate(zip(records['TABLE_NAME'], records['COLUMN_NAME'])):
+        positions_by_table.setdefault(table_name, []).append((position, column_name))
+
+    sql_by_table = dict(zip(records['TABLE_NAME'], records['SQL']))
+    with quiet_sqlglot():
+        for table_name, positions in positions_by_table.items():
+            resolved = resolve_model_columns(sql_by_table[table_name], [column for _, column in positions], schema)
+            for position, column_name in positions:
+                results[position] = resolved[column_name]
+
+    return results, time.perf_counter() - start
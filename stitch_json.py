@@ -1,34 +1,80 @@
+import gzip
 import json
+import os
+from lineage_store import LineageStore
+from lineage_traversal import STOP, TraversalStats, traversal_limits, walk
 
 # Load Tableau lineage
 with open('tableau_lineage.json', 'r') as f:
     tableau_data = json.load(f)
 
-# Load Database lineage
-with open('lineage.json', 'r') as f:
-    db_lineage_data = json.load(f)
+# Read the JSON Lines lineage written by iterate_lineage (lineage_output_format=jsonl), one root at a time
+def read_lineage_jsonl(file_path):
+    with (gzip.open(file_path, 'rt', encoding='utf-8') if file_path.endswith('.gz')
+          else open(file_path, 'r', encoding='utf-8')) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
 
-# Helper function to recursively find matching column and table in database lineage
-def find_matching_db_lineage(tableau_column, tableau_table, db_lineage):
+# Load Database lineage: lineage.json, or the JSON Lines output when db_lineage_path names a .jsonl(.gz) file.
+# JSON Lines roots are streamed through the single matching pass below and never held together.
+db_lineage_path = os.getenv('db_lineage_path', 'lineage.json')
+if db_lineage_path.endswith(('.jsonl', '.jsonl.gz')):
+    db_lineage_data = read_lineage_jsonl(db_lineage_path)
+else:
+    with open(db_lineage_path, 'r') as f:
+        db_lineage_data = json.load(f)
+
+# Columnar lineage store written next to lineage.json by iterate_lineage; columns it doesn't know can't be
+# in lineage.json, so they aren't searched for. A store saved with a different lineage file (or an older
+# version of this one) could skip columns that are there, so it is only used when the digests match.
+store_path = os.getenv('lineage_store_path', 'lineage_store')
+lineage_store = None
+if store_path and os.path.isdir(store_path):
+    lineage_store = LineageStore.load_for_source(store_path, db_lineage_path)
+    if lineage_store is None:
+        print(f"WARNING: Lineage store {store_path} wasn't built with {db_lineage_path}; searching every column")
+
+# Every (table, column) pair, lowercased, that the Tableau lineage has among its upstream columns
+def tableau_column_keys(tableau_data):
+    keys = set()
+    stack = [tableau_data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            for upstream_column in item.get("upstreamColumns", []):
+                for upstream_table in upstream_column.get("upstreamTables", []):
+                    keys.add((upstream_table["name"].lower(), upstream_column["name"].lower()))
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return keys
+
+# Helper function to find matching columns and tables in database lineage
+def find_db_lineage_matches(db_lineage, wanted, stats=None):
     """
-    Finds a matching column in the db_lineage based on both column and table name.
-    Recursively searches upstream models if no direct match is found.
+    Finds the first entry of each wanted (model, column) in the db_lineage, searching the roots and their
+    upstream models depth-first in a single pass. Only the matched entries are kept.
     """
-    for db_entry in db_lineage:
-        if tableau_column.lower() == db_entry["column"].lower() and tableau_table.lower() == db_entry["model"].lower():
-            return db_entry
-        
-        # If there are upstream models, recursively search them
-        upstream_models = db_entry.get("upstream_models", [])
-        if upstream_models:
-            matching_upstream = find_matching_db_lineage(tableau_column, tableau_table, upstream_models)
-            if matching_upstream:
-                return matching_upstream
-    
-    return None
+    matches = {}
+
+    def visit(db_entry, parent, depth):
+        entry_key = (db_entry["model"].lower(), db_entry["column"].lower())
+        if entry_key in wanted and entry_key not in matches:
+            matches[entry_key] = db_entry
+            if len(matches) == len(wanted):
+                return STOP
+
+    # lineage.json repeats the same subtree under every column that reaches it, so each (model, column)
+    # is searched once
+    if wanted:
+        walk(db_lineage, lambda db_entry: db_entry.get("upstream_models", []), visit,
+             key=lambda db_entry: (db_entry["model"].lower(), db_entry["column"].lower()),
+             revisit=False, stats=stats, **traversal_limits())
+    return matches
 
 # Recursive function to process upstream fields and match to database lineage
-def process_upstream_fields(upstream_fields, db_lineage_data, context=""):
+def process_upstream_fields(upstream_fields, db_matches, context=""):
     """
     Processes upstream fields recursively, comparing upstream columns and tables with database lineage.
     Handles nested upstreamTables inside upstreamColumns.
@@ -42,7 +88,7 @@ def process_upstream_fields(upstream_fields, db_lineage_data, context=""):
             
             for upstream_table in upstream_tables:
                 # Find matching database lineage using both the column and table
-                matching_db_lineage = find_matching_db_lineage(upstream_column["name"], upstream_table["name"], db_lineage_data)
+                matching_db_lineage = db_matches.get((upstream_table["name"].lower(), upstream_column["name"].lower()))
                 if matching_db_lineage:
                     # Add the matched DB lineage details to the Tableau upstream column
                     upstream_column["database_lineage"] = matching_db_lineage
@@ -55,19 +101,19 @@ def process_upstream_fields(upstream_fields, db_lineage_data, context=""):
         # Recursively process nested upstreamFields if present
         nested_upstream_fields = upstream_field.get("upstreamFields", [])
         if nested_upstream_fields:
-            process_upstream_fields(nested_upstream_fields, db_lineage_data, context=f"{context} -> Nested Field")
+            process_upstream_fields(nested_upstream_fields, db_matches, context=f"{context} -> Nested Field")
 
 # Function to process non-calculated columns
-def process_non_calculated_fields(datasource, db_lineage_data):
+def process_non_calculated_fields(datasource, db_matches):
     """
     Handles fields that are not part of calculations and ensures their upstream lineage is correctly processed.
     """
     for sheet in datasource["sheets"]:
         for upstream_field in sheet["upstreamFields"]:
-            process_upstream_fields([upstream_field], db_lineage_data, context=f"Sheet: {sheet['name']}")
+            process_upstream_fields([upstream_field], db_matches, context=f"Sheet: {sheet['name']}")
 
 # Function to merge database lineage into Tableau lineage
-def merge_lineage(tableau_data, db_lineage_data):
+def merge_lineage(tableau_data, db_matches):
     """
     Iterates over the Tableau lineage and matches it with the database lineage.
     """
@@ -75,7 +121,7 @@ def merge_lineage(tableau_data, db_lineage_data):
         for dashboard in workbook["dashboards"]:
             for datasource in dashboard["upstreamDatasources"]:
                 # Process non-calculated fields
-                process_non_calculated_fields(datasource, db_lineage_data)
+                process_non_calculated_fields(datasource, db_matches)
 
                 # Process referencedByCalculations if they exist
                 for sheet in datasource["sheets"]:
@@ -83,12 +129,17 @@ def merge_lineage(tableau_data, db_lineage_data):
                         if "referencedByCalculations" in upstream_field:
                             for calc in upstream_field["referencedByCalculations"]:
                                 # Process upstreamFields within referenced calculations
-                                process_upstream_fields(calc.get("upstreamFields", []), db_lineage_data, context=f"Calculation in Sheet: {sheet['name']}")
+                                process_upstream_fields(calc.get("upstreamFields", []), db_matches, context=f"Calculation in Sheet: {sheet['name']}")
 
     return tableau_data
 
-# Merge the lineages
-combined_lineage = merge_lineage(tableau_data, db_lineage_data)
+# Merge the lineages: one search of the database lineage for every column the Tableau lineage looks up
+traversal_stats = TraversalStats()
+wanted_columns = {column_key for column_key in tableau_column_keys(tableau_data)
+                  if lineage_store is None or lineage_store.node_id(".".join(column_key)) >= 0}
+db_matches = find_db_lineage_matches(db_lineage_data, wanted_columns, traversal_stats)
+traversal_stats.report('Database lineage search')
+combined_lineage = merge_lineage(tableau_data, db_matches)
 
 # Output the merged lineage to a file
 with open('combined_lineage.json', 'w') as f:
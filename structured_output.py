@@ -0,0 +1,85 @@
+import json
+
+# Structured lineage answers: a compact JSON schema (upstream pairs plus a short reasoning string) sent as the
+# OpenAI response_format, and a strict validator so malformed answers are caught instead of half-parsed.
+
+LINEAGE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'upstream': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'table': {'type': 'string'}, 'column': {'type': 'string'}},
+                'required': ['table', 'column'],
+                'additionalProperties': False,
+            },
+        },
+        'reasoning': {'type': 'string'},
+    },
+    'required': ['upstream', 'reasoning'],
+    'additionalProperties': False,
+}
+
+RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {'name': 'column_lineage', 'strict': True, 'schema': LINEAGE_SCHEMA},
+}
+
+JSON_RESPONSE_INSTRUCTIONS = (
+    "Respond with JSON only, matching this shape: "
+    "{\"upstream\": [{\"table\": \"upstream table\", \"column\": \"upstream column\"}], "
+    "\"reasoning\": \"short one-liner transformation rule, or one to one mapping\"}"
+)
+
+# The compact answer needs far fewer output tokens than the prose format
+JSON_MAX_TOKENS = 300
+
+# Validate an answer against LINEAGE_SCHEMA and return (upstream_tables, upstream_columns, reasoning);
+# raises ValueError on anything malformed
+def parse_json_lineage(text):
+    try:
+        answer = json.loads(text)
+    except (TypeError, json.JSONDecodeError) as error:
+        raise ValueError(f"response is not JSON: {error}") from error
+    if not isinstance(answer, dict) or set(answer) != {'upstream', 'reasoning'}:
+        raise ValueError("response must have exactly the keys upstream and reasoning")
+    if not isinstance(answer['reasoning'], str) or not isinstance(answer['upstream'], list):
+        raise ValueError("upstream must be a list and reasoning a string")
+
+    pairs = []
+    for pair in answer['upstream']:
+        if not isinstance(pair, dict) or set(pair) != {'table', 'column'}:
+            raise ValueError("each upstream entry must have exactly the keys table and column")
+        table, column = pair['table'], pair['column']
+        if not isinstance(table, str) or not isinstance(column, str) or not table.strip() or not column.strip():
+            raise ValueError("upstream table and column must be non-empty strings")
+        pairs.append((table.strip(), column.strip()))
+
+    # Same field layout as the static path (static_lineage.format_lineage): each table listed once, columns
+    # qualified by their table
+    upstream_tables = ', '.join(dict.fromkeys(table for table, _ in pairs))
+    upstream_columns = ', '.join(column if '.' in column else f"{table}.{column}" for table, column in pairs)
+    return upstream_tables, upstream_columns, answer['reasoning'].strip()
+
+# Output tokens, latency and parse failures of one response mode, for comparing the JSON and legacy paths
+class ResponseStats:
+    def __init__(self, mode):
+        self.mode = mode
+        self.calls = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+        self.parse_failures = 0
+        self.retries = 0
+
+    def record_call(self, seconds, completion_tokens):
+        self.calls += 1
+        self.seconds += seconds
+        self.completion_tokens += completion_tokens
+
+    def report(self):
+        if not self.calls:
+            return
+        print(f"{self.mode} responses: {self.calls} calls, {self.completion_tokens / self.calls:.0f} output tokens/call, "
+              f"{self.seconds / self.calls * 1000:.0f} ms/call, {self.parse_failures} parse failures "
+              f"({self.parse_failures / self.calls:.1%}), {self.retries} retries")
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Factory for lineage frames as read_csv_data leaves them, from (model, column, upstream tables, upstream columns)
+@pytest.fixture
+def lineage_frame():
+    def build(rows):
+        return pd.DataFrame({
+            'NAME': [row[0] for row in rows],
+            'COLUMN_NAME': [row[1] for row in rows],
+            'COLUMN_DESCRIPTION': [f'{row[0]}.{row[1]} description' for row in rows],
+            'REASONING': [f'{row[0]}.{row[1]} reasoning' for row in rows],
+            'UPSTREAM_TABLE': [row[2] for row in rows],
+            'UPSTREAM_COLUMN': [row[3] for row in rows],
+        })
+    return build
@@ -0,0 +1,16 @@
+from downstream_index import DownstreamIndex
+
+# a -> b -> c -> d plus the shortcut a -> c: c is one hop from a and d two
+def diamond_index():
+    index = DownstreamIndex()
+    for upstream_name, consumer_name in [('a.x', 'b.x'), ('b.x', 'c.x'), ('c.x', 'd.x'), ('a.x', 'c.x')]:
+        index.add_edge(upstream_name, 'column', consumer_name, 'column')
+    return index
+
+def test_downstream_depths_are_shortest_paths():
+    assert diamond_index().downstream('a.x') == [('b.x', 'column', 1), ('c.x', 'column', 1), ('d.x', 'column', 2)]
+
+def test_downstream_depth_cap_keeps_every_node_within_reach():
+    index = diamond_index()
+    assert index.downstream('a.x', max_depth=2) == [('b.x', 'column', 1), ('c.x', 'column', 1), ('d.x', 'column', 2)]
+    assert index.downstream('a.x', max_depth=1) == [('b.x', 'column', 1), ('c.x', 'column', 1)]
@@ -0,0 +1,56 @@
+from iterate_lineage import build_full_hierarchy, build_hierarchy, iter_full_hierarchy
+
+# Every root must be the hierarchy its column gets on its own, whichever roots were walked before it
+def assert_order_independent(lineage_frame, rows):
+    expected = {(row[0], row[1]): build_hierarchy(lineage_frame(rows), row[0], row[1]) for row in rows}
+    for ordered in (rows, rows[::-1]):
+        df = lineage_frame(ordered)
+        for hierarchies in (build_full_hierarchy(df), list(iter_full_hierarchy(df))):
+            assert hierarchies == [expected[(row[0], row[1])] for row in ordered]
+    return expected
+
+def upstream_names(hierarchy):
+    return [f"{upstream['model']}.{upstream['column']}" for upstream in hierarchy['upstream_models']]
+
+def test_two_cycle_is_cut_where_it_repeats_on_the_path(lineage_frame):
+    rows = [('a', 'x', 'b', 'y'), ('b', 'y', 'a', 'x')]
+    expected = assert_order_independent(lineage_frame, rows)
+    assert upstream_names(expected[('a', 'x')]) == ['b.y']
+    assert upstream_names(expected[('a', 'x')]['upstream_models'][0]) == []
+    assert upstream_names(expected[('b', 'y')]) == ['a.x']
+    assert upstream_names(expected[('b', 'y')]['upstream_models'][0]) == []
+
+def test_depth_capped_diamond_reuses_only_complete_subtrees(lineage_frame, monkeypatch):
+    monkeypatch.setenv('lineage_max_depth', '3')
+    # top reaches shared both directly and through mid, so shared sits at depth 1 and at depth 2
+    rows = [
+        ('top', 'c', 'mid,shared', 'c,c'),
+        ('mid', 'c', 'shared', 'c'),
+        ('shared', 'c', 'deep', 'c'),
+        ('deep', 'c', 'deeper', 'c'),
+        ('deeper', 'c', 'source', 'c'),
+    ]
+    expected = assert_order_independent(lineage_frame, rows)
+    through_mid, direct = expected[('top', 'c')]['upstream_models']
+    # Under mid, shared is one level deeper, so the cap cuts its chain one column earlier
+    assert upstream_names(direct['upstream_models'][0]) == ['deeper.c']
+    assert upstream_names(through_mid['upstream_models'][0]['upstream_models'][0]) == []
+
+# A NaN UPSTREAM_TABLE (read_csv) or None (pd.read_sql) names no model: every index built on the lineage
+# rows leaves it out instead of adding a "nan.<column>" or "none.none" node
+def test_null_upstream_values_add_no_nodes(lineage_frame):
+    from downstream_index import DownstreamIndex
+    from iterate_lineage import build_lineage_index
+    from lineage_store import LineageStore
+    from reachability_index import lineage_edges
+
+    df = lineage_frame([('orders', 'id', 'stg_orders', 'order_id'), ('payments', 'amount', None, 'stg.amount'),
+                        ('customers', 'id', float('nan'), 'id'), ('items', 'id', None, None)])
+    index = build_lineage_index(df)
+    expected = {'orders.id', 'stg_orders.order_id', 'payments.amount', 'stg.amount'}
+    assert set(DownstreamIndex.build(index).nodes) == expected
+    store = LineageStore.from_lineage_index(index)
+    assert set(store.node_names(range(len(store)))) == expected | {'customers.id', 'items.id'}
+    assert lineage_edges(df) == {'orders.id': ['stg_orders.order_id'], 'payments.amount': ['stg.amount'],
+                                 'customers.id': [], 'items.id': []}
+    assert build_hierarchy(df, 'items', 'id')['upstream_models'] == []
@@ -0,0 +1,23 @@
+import pytest
+
+from iterate_lineage import build_full_hierarchy, build_hierarchy
+from lineage_graph import LineageGraph, build_lineage_graph
+
+CYCLE = [('a', 'x', 'b', 'y'), ('b', 'y', 'a', 'x')]
+DIAMOND = [
+    ('top', 'c', 'mid,shared', 'c,c'),
+    ('mid', 'c', 'shared', 'c'),
+    ('shared', 'c', 'deep', 'c'),
+    ('deep', 'c', 'deeper', 'c'),
+    ('deeper', 'c', 'source', 'c'),
+]
+
+# The graph materializes the nested hierarchies of iterate_lineage, whichever roots are walked first
+@pytest.mark.parametrize('rows', [CYCLE, CYCLE[::-1], DIAMOND, DIAMOND[::-1]])
+def test_materialized_graph_matches_hierarchy(rows, lineage_frame, monkeypatch):
+    monkeypatch.setenv('lineage_max_depth', '3')
+    df = lineage_frame(rows)
+    graph = LineageGraph(build_lineage_graph(df))
+    assert graph.full_hierarchy() == build_full_hierarchy(df)
+    for row in rows:
+        assert graph.hierarchy(row[0], row[1]) == build_hierarchy(df, row[0], row[1])
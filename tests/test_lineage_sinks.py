@@ -0,0 +1,58 @@
+import glob
+import gzip
+import os
+
+import pandas as pd
+
+from lineage_sinks import LocalFileSink, SQLiteSink
+
+COLUMNS = ['unique_key', 'column_description', 'sql']
+
+# Parse staged CSV the way COPY INTO does with FIELD_OPTIONALLY_ENCLOSED_BY = '"' and EMPTY_FIELD_AS_NULL:
+# an unquoted empty field is NULL, a quoted one is an empty string
+def parse_copy_csv(text):
+    rows, row, position = [], [], 0
+    while position < len(text):
+        if text[position] == '"':
+            value, position = [], position + 1
+            while True:
+                quote = text.index('"', position)
+                value.append(text[position:quote])
+                if text[quote + 1:quote + 2] == '"':
+                    value.append('"')
+                    position = quote + 2
+                else:
+                    position = quote + 1
+                    break
+            row.append(''.join(value))
+        else:
+            end = min(index for index in (text.find(',', position), text.find('\n', position), len(text)) if index >= 0)
+            row.append(text[position:end] or None)
+            position = end
+        separator = text[position:position + 1]
+        position += 1
+        if separator != ',':
+            rows.append(row)
+            row = []
+    return rows
+
+def test_copy_chunks_load_nulls_like_insert(tmp_path):
+    df = pd.DataFrame({
+        'unique_key': ['a', 'b', 'c', 'd'],
+        'column_description': [None, '', float('nan'), 'has "quotes", commas'],
+        'sql': ['select 1', 'select\n2', None, ''],
+    })
+
+    insert_sink = SQLiteSink(os.path.join(tmp_path, 'lineage.db'), columns=COLUMNS)
+    insert_sink.replace(df)
+    inserted = [list(row) for row in insert_sink.conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM COLUMN_LINEAGE ORDER BY unique_key")]
+    insert_sink.close()
+
+    LocalFileSink(str(tmp_path), columns=COLUMNS).replace(df)
+    copied = []
+    for path in sorted(glob.glob(os.path.join(tmp_path, 'COLUMN_LINEAGE', '*.csv.gz'))):
+        copied.extend(parse_copy_csv(gzip.decompress(open(path, 'rb').read()).decode('utf-8')))
+
+    assert copied == inserted
+    assert inserted[0][1] is None and inserted[1][1] == '' and inserted[2][1] is None
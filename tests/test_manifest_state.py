@@ -0,0 +1,46 @@
+import pandas as pd
+
+from manifest_state import ROW_DIGEST_COLUMNS, build_state, clear_state, compute_delta, load_state, save_state
+
+# COLUMN_LINEAGE rows: (table_name, checksum, column_name, column_description)
+def lineage_rows(rows):
+    return pd.DataFrame([
+        {**{column: '' for column in ROW_DIGEST_COLUMNS}, 'unique_key': f'{table_name}.{column_name}',
+         'table_name': table_name, 'checksum': checksum, 'column_name': column_name, 'column_description': description}
+        for table_name, checksum, column_name, description in rows
+    ])
+
+def test_compute_delta_finds_added_changed_and_removed():
+    previous = build_state(lineage_rows([
+        ('orders', 'c1', 'id', 'order id'),
+        ('orders', 'c1', 'status', 'order status'),
+        ('customers', 'c2', 'id', 'customer id'),
+        ('payments', 'c3', 'id', 'payment id'),
+        ('legacy', 'c4', 'id', 'legacy id'),
+    ]))
+    current = build_state(lineage_rows([
+        # A column description changed and a column was dropped
+        ('orders', 'c1', 'id', 'primary key'),
+        ('customers', 'c2', 'id', 'customer id'),
+        # New SQL, same columns
+        ('payments', 'c3b', 'id', 'payment id'),
+        ('refunds', 'c5', 'id', 'refund id'),
+    ]))
+    assert compute_delta(previous, current) == {
+        'added_models': ['refunds'],
+        'changed_models': ['orders', 'payments'],
+        'removed_models': ['legacy'],
+        'upsert_keys': ['orders.id', 'refunds.id'],
+        'delete_keys': ['orders.status', 'legacy.id'],
+    }
+    assert compute_delta(current, current) == {'added_models': [], 'changed_models': [], 'removed_models': [],
+                                               'upsert_keys': [], 'delete_keys': []}
+
+def test_cleared_state_starts_over(tmp_path):
+    state_path = str(tmp_path / 'state.json')
+    state = build_state(lineage_rows([('orders', 'c1', 'id', 'order id')]))
+    save_state(state_path, state)
+    assert load_state(state_path) == state
+    clear_state(state_path)
+    clear_state(state_path)
+    assert load_state(state_path) is None
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from reachability_index import ReachabilityIndex, lineage_edges
+
+# pd.read_sql returns object columns holding None for NULL; read_csv gives NaN instead
+def test_null_upstream_values_add_no_columns():
+    df = pd.DataFrame({
+        'NAME': ['orders', 'customers', 'payments', None],
+        'COLUMN_NAME': ['id', 'id', 'amount', 'id'],
+        'COLUMN_DESCRIPTION': ['', '', '', ''],
+        'REASONING': ['', '', '', ''],
+        'UPSTREAM_TABLE': ['stg_orders', None, None, 'stg_orders'],
+        'UPSTREAM_COLUMN': ['order_id', None, 'stg_payments.amount', 'order_id'],
+    }, dtype=object)
+    expected = {'orders.id': ['stg_orders.order_id'], 'customers.id': [], 'payments.amount': ['stg_payments.amount']}
+    assert lineage_edges(df) == expected
+    assert lineage_edges(df.replace({None: np.nan})) == expected
+    assert 'none.none' not in ReachabilityIndex.build(lineage_edges(df)).node_ids